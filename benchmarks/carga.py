@@ -0,0 +1,251 @@
+"""Teste de carga do app Streamlit com várias sessões simultâneas, sem rede
+
+Cada sessão simulada (streamlit.testing.v1.AppTest, que executa o script real
+com seu próprio session_state) percorre as abas da interface: CEP, coordenadas
+e cidade, gerando recomendações. As APIs externas são os stubs de
+benchmarks/servidor_stub.py. Para cada nível de carga são informados os
+percentis de duração de uma execução do script, o tempo de CPU por execução e a
+memória por sessão (tamanho do session_state e crescimento do RSS do processo).
+O RSS inclui a árvore de elementos que o AppTest guarda por sessão, então é um
+limite superior do custo de uma sessão no servidor real.
+
+Uso:
+    python benchmarks/carga.py --sessoes 1,8,32 --repeticoes 2
+    python benchmarks/carga.py --perfil lento --salvar carga.json
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import pickle
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from executar import percentil
+from servidor_stub import PERFIS, ConfiguracaoStub, configuracao_app, iniciar_servidor
+
+ARQUIVO_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+# CEPs e pontos distintos por jornada, para que as consultas não venham só do cache
+_sequencia = itertools.count()
+
+
+def memoria_rss_mb():
+    """RSS atual do processo (Linux); nas demais plataformas, o pico informado pelo SO"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def tamanho_estado_kb(app_teste):
+    """Tamanho serializado do session_state da sessão (clima, recomendações, entradas...)"""
+    return len(pickle.dumps(app_teste.session_state.to_dict())) / 1024
+
+
+def permitir_sessoes_simultaneas():
+    """Deixa várias instâncias de AppTest executarem ao mesmo tempo em threads
+
+    Cada execução do AppTest instala um Runtime simulado global e o remove ao
+    terminar, o que derrubaria as sessões ainda em execução em outras threads.
+    Aqui o último Runtime simulado instalado continua disponível entre execuções.
+    O bytecode do script também passa a ser compilado uma vez e compartilhado,
+    como no servidor real (compilar em várias threads ao mesmo tempo falha no
+    Python 3.11).
+    """
+    import streamlit.testing.v1.app_test as modulo_app_test
+    import streamlit.testing.v1.local_script_runner as modulo_executor
+    from streamlit.runtime import Runtime
+
+    cache_script = modulo_app_test.ScriptCache()
+    modulo_app_test.ScriptCache = modulo_executor.ScriptCache = lambda: cache_script
+
+    instancia_original = Runtime.instance.__func__
+    ultima = [None]
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultima[0] = cls._instance
+        return ultima[0] if ultima[0] is not None else instancia_original(cls)
+
+    Runtime.instance = classmethod(instance)
+
+
+class Sessao:
+    """Uma sessão de usuário: cada passo é uma execução completa do script"""
+
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(ARQUIVO_APP, default_timeout=timeout)
+        self.duracoes = {}
+        self.erros = 0
+        self.primeiro_erro = None
+
+    def _executar(self, passo, acao=None):
+        inicio = time.perf_counter()
+        try:
+            if acao:
+                acao()
+            self.app.run()
+            if self.app.exception:
+                self._registrar_erro(passo, self.app.exception[0].message)
+        except Exception as e:
+            self._registrar_erro(passo, repr(e))
+        self.duracoes.setdefault(passo, []).append(time.perf_counter() - inicio)
+
+    def _registrar_erro(self, passo, mensagem):
+        self.erros += 1
+        self.primeiro_erro = self.primeiro_erro or f"{passo}: {mensagem}"
+
+    def _gerar_recomendacoes(self):
+        botao = next(b for b in self.app.button if "Gerar Recomendações" in b.label)
+        botao.click()
+
+    def jornada(self, cidades):
+        n = next(_sequencia)
+        if not self.duracoes:
+            self._executar("abrir")
+
+        self._executar("cep", lambda: (
+            self.app.text_input(key="cep_input").input(f"{10000000 + n:08d}"),
+            self.app.button(key="search_cep").click()
+        ))
+        self._executar("recomendacoes", self._gerar_recomendacoes)
+
+        self._executar("coordenadas", lambda: (
+            self.app.text_input(key="lat_input").input(f"{-30 + (n % 400) * 0.1:.4f}"),
+            self.app.text_input(key="lon_input").input(f"{-55 + (n // 400) * 0.1:.4f}"),
+            self.app.button(key="search_coords").click()
+        ))
+
+        self._executar("cidade", lambda: (
+            self.app.selectbox(key="cidade_select").select(cidades[n % len(cidades)]),
+            self.app.button(key="search_cidade").click()
+        ))
+        self._executar("recomendacoes", self._gerar_recomendacoes)
+
+
+def executar_nivel(quantidade, repeticoes, cidades, timeout):
+    """Roda `quantidade` sessões ao mesmo tempo e devolve as medidas do nível"""
+    gc.collect()
+    rss_inicial = memoria_rss_mb()
+    cpu_inicial = time.process_time()
+    inicio = time.perf_counter()
+
+    sessoes = []
+    lock = threading.Lock()
+
+    def simular(_):
+        sessao = Sessao(timeout)
+        with lock:
+            sessoes.append(sessao)
+        for _ in range(repeticoes):
+            sessao.jornada(cidades)
+
+    with ThreadPoolExecutor(max_workers=quantidade) as executor:
+        list(executor.map(simular, range(quantidade)))
+
+    duracao = time.perf_counter() - inicio
+    cpu = time.process_time() - cpu_inicial
+    gc.collect()
+    # Sessões ainda vivas: o crescimento do RSS é o custo de mantê-las abertas
+    rss_final = memoria_rss_mb()
+
+    todas = [d for sessao in sessoes for duracoes in sessao.duracoes.values() for d in duracoes]
+    por_passo = {}
+    for sessao in sessoes:
+        for passo, duracoes in sessao.duracoes.items():
+            por_passo.setdefault(passo, []).extend(duracoes)
+
+    resultado = {
+        "sessoes": quantidade,
+        "execucoes": len(todas),
+        "erros": sum(sessao.erros for sessao in sessoes),
+        "exemplo_erro": next((sessao.primeiro_erro for sessao in sessoes if sessao.primeiro_erro), None),
+        "p50_ms": round(percentil(todas, 0.50) * 1000, 1),
+        "p95_ms": round(percentil(todas, 0.95) * 1000, 1),
+        "p99_ms": round(percentil(todas, 0.99) * 1000, 1),
+        "execucoes_por_s": round(len(todas) / duracao, 2),
+        "cpu_ms_por_execucao": round(cpu / len(todas) * 1000, 1),
+        "uso_cpu": round(cpu / duracao, 2),
+        "estado_sessao_kb": round(sum(tamanho_estado_kb(s.app) for s in sessoes) / quantidade, 1),
+        "rss_mb": round(rss_final, 1),
+        "rss_por_sessao_mb": round(max(0.0, rss_final - rss_inicial) / quantidade, 2),
+        "passos": {
+            passo: {"p50_ms": round(percentil(d, 0.50) * 1000, 1), "p95_ms": round(percentil(d, 0.95) * 1000, 1)}
+            for passo, d in sorted(por_passo.items())
+        },
+    }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do Smart Clima com sessões simuladas")
+    parser.add_argument("--sessoes", default="1,8,32", help="Sessões simultâneas por nível, separadas por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=2, help="Jornadas completas por sessão")
+    parser.add_argument("--perfil", choices=sorted(PERFIS), default="normal", help="Perfil de falhas dos stubs")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Limite de uma execução do script (s)")
+    parser.add_argument("--salvar", help="Grava os resultados neste JSON")
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(ConfiguracaoStub(args.perfil, args.semente, atraso_timeout=2.0))
+    os.environ.update(configuracao_app(servidor))
+    os.environ.setdefault("HTTP_TIMEOUT_LEITURA", "1.0")
+    os.environ.setdefault("OPENAI_TIMEOUT", "1.5")
+    os.environ.setdefault("METRICAS_PORTA", "0")
+    # Respostas dos stubs nunca podem ir para os caches e o histórico reais, que os usuários consultam
+    diretorio = tempfile.TemporaryDirectory(prefix="smart_clima_carga_")
+    for variavel, arquivo in (("CEP_CACHE_PATH", "cep.sqlite3"), ("REC_CACHE_PATH", "rec.sqlite3"),
+                              ("HISTORICO_PATH", "historico.sqlite3")):
+        os.environ[variavel] = os.path.join(diretorio.name, arquivo)
+
+    import streamlit.logger
+    from streamlit_app import COORDENADAS_CIDADES
+    streamlit.logger.set_log_level("error")
+
+    permitir_sessoes_simultaneas()
+
+    cidades = sorted(COORDENADAS_CIDADES)
+    # Aquecimento descartado: importações, bytecode e recursos compartilhados não entram na conta da 1ª sessão
+    Sessao(args.timeout).jornada(cidades)
+
+    resultados = []
+    for quantidade in (int(nivel) for nivel in args.sessoes.split(",")):
+        resultado = executar_nivel(quantidade, args.repeticoes, cidades, args.timeout)
+        resultados.append(resultado)
+        print(
+            f"{quantidade:>4} sessões  p50 {resultado['p50_ms']:>8.1f} ms  p95 {resultado['p95_ms']:>8.1f} ms  "
+            f"p99 {resultado['p99_ms']:>8.1f} ms  {resultado['execucoes_por_s']:>7.2f} exec/s  "
+            f"CPU {resultado['cpu_ms_por_execucao']:>6.1f} ms/exec ({resultado['uso_cpu']:.0%})  "
+            f"estado {resultado['estado_sessao_kb']:.1f} KB  RSS +{resultado['rss_por_sessao_mb']:.2f} MB/sessão  "
+            f"erros {resultado['erros']}"
+        )
+        if resultado["exemplo_erro"]:
+            print(f"       exemplo de erro: {resultado['exemplo_erro']}")
+        for passo, medida in resultado["passos"].items():
+            print(f"       {passo:<14} p50 {medida['p50_ms']:>8.1f} ms  p95 {medida['p95_ms']:>8.1f} ms")
+    servidor.shutdown()
+    diretorio.cleanup()
+
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as arquivo:
+            json.dump({"perfil": args.perfil, "repeticoes": args.repeticoes, "niveis": resultados},
+                      arquivo, ensure_ascii=False, indent=2)
+            arquivo.write("\n")
+
+
+if __name__ == "__main__":
+    main()
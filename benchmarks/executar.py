@@ -0,0 +1,253 @@
+"""Benchmarks do Smart Clima contra os servidores locais de benchmarks/servidor_stub.py
+
+Mede latência (p50/p95/p99) e vazão de safe_request, buscar_cep_completo,
+get_weather_fallback, get_weather_lote (50 pontos por chamada), interpretar_clima
+e do fluxo completo em vários níveis de concorrência, sem acessar a rede. Os
+resultados podem ser gravados como linha de base e comparados em execuções
+futuras (código de saída 1 se houver regressão).
+
+Uso:
+    python benchmarks/executar.py --concorrencia 1,8,32 --requisicoes 64
+    python benchmarks/executar.py --salvar benchmarks/baseline.json
+    python benchmarks/executar.py --comparar benchmarks/baseline.json --tolerancia 0.3
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from servidor_stub import PERFIS, ConfiguracaoStub, configuracao_app, iniciar_servidor
+
+# Diferenças de p95 abaixo disso (ms) são ruído e não contam como regressão
+PISO_RUIDO_MS = 5.0
+
+# Numeração global para que consultas "frias" nunca repitam CEP, ponto ou prompt
+_sequencia = itertools.count()
+
+
+def percentil(valores, q):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    posicao = (len(ordenados) - 1) * q
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def criar_cenarios(app):
+    """Cada cenário recebe nada e retorna (sucesso, primeiro_token_s ou None)"""
+
+    def clima_variado():
+        n = next(_sequencia)
+        return {
+            "temperatura": 10 + (n % 300) / 10, "sensacao": 12.0, "umidade": 60,
+            "vento_kmh": 10.0, "descricao": "Parcialmente nublado", "cidade": "Stub", "pais": "Brasil"
+        }
+
+    def safe_request():
+        return app.safe_request(app.CEP_APIS[0].format("01310100"), silencioso=True) is not None, None
+
+    def cep_frio():
+        cep = f"{10000000 + next(_sequencia):08d}"
+        return buscar_cep(cep)
+
+    def cep_quente():
+        return buscar_cep("01310100")
+
+    def buscar_cep(cep):
+        lat, lon, endereco_info, erro = app.buscar_cep_completo(cep)
+        return not erro and "offline" not in (endereco_info or {}).get("complemento", ""), None
+
+    def clima_frio():
+        n = next(_sequencia)
+        # Pontos a ~11 km de distância caem em células diferentes do cache de clima
+        clima = app.get_weather_fallback(-30 + (n % 400) * 0.1, -60 + (n // 400) * 0.1)
+        return not clima["fallback"], None
+
+    def clima_quente():
+        return not app.get_weather_fallback(-23.5505, -46.6333)["fallback"], None
+
+    def clima_lote():
+        # 50 pontos frios por chamada: uma única requisição em lote à WeatherAPI
+        pontos = []
+        for _ in range(50):
+            n = next(_sequencia)
+            pontos.append((-30 + (n % 400) * 0.1, -60 + (n // 400) * 0.1))
+        return not any(clima["fallback"] for clima in app.get_weather_lote(pontos)), None
+
+    def recomendacoes():
+        metricas = {}
+        "".join(app.gerar_recomendacoes(clima_variado(), usar_cache=False, streaming=False, metricas=metricas))
+        return metricas["origem"] == "openai", None
+
+    def recomendacoes_streaming():
+        metricas = {}
+        for _ in app.gerar_recomendacoes(clima_variado(), usar_cache=False, metricas=metricas):
+            pass
+        return metricas["origem"] == "openai", metricas.get("primeiro_token_s")
+
+    def fim_a_fim():
+        lat, lon, _, erro = app.buscar_cep_completo(f"{10000000 + next(_sequencia):08d}")
+        if erro:
+            return False, None
+        clima = app.get_weather_fallback(lat, lon)
+        clima["temperatura"] = clima_variado()["temperatura"]
+        metricas = {}
+        "".join(app.gerar_recomendacoes(clima, usar_cache=False, streaming=False, metricas=metricas))
+        return not clima["fallback"] and metricas["origem"] == "openai", None
+
+    return {
+        "safe_request": (safe_request, None),
+        "cep_frio": (cep_frio, None),
+        "cep_quente": (cep_quente, cep_quente),
+        "clima_frio": (clima_frio, None),
+        "clima_quente": (clima_quente, clima_quente),
+        "clima_lote": (clima_lote, None),
+        "interpretar_clima": (recomendacoes, None),
+        "recomendacoes_streaming": (recomendacoes_streaming, None),
+        "fim_a_fim": (fim_a_fim, None),
+    }
+
+
+def reiniciar_estado(app, diretorio):
+    """Caches, circuitos e métricas zerados: cada cenário começa do mesmo ponto"""
+    os.environ["CEP_CACHE_PATH"] = os.path.join(diretorio, f"cep_{next(_sequencia)}.sqlite3")
+    os.environ["REC_CACHE_PATH"] = os.path.join(diretorio, f"rec_{next(_sequencia)}.sqlite3")
+    # Observações dos stubs nunca podem ir para o histórico real, que serve o fallback offline
+    os.environ["HISTORICO_PATH"] = os.path.join(diretorio, f"historico_{next(_sequencia)}.sqlite3")
+    for recurso in (app.obter_cache_cep, app.obter_cache_recomendacoes, app.obter_cache_clima,
+                    app.obter_cache_previsao, app.obter_historico_observacoes,
+                    app.obter_saude_provedores, app.obter_metricas, app.obter_chamadas_openai):
+        recurso.clear()
+
+
+def medir_cenario(cenario, concorrencia, requisicoes):
+    duracoes, primeiros_tokens, falhas = [], [], 0
+
+    def executar_uma(_):
+        inicio = time.perf_counter()
+        try:
+            sucesso, primeiro_token = cenario()
+        except Exception:
+            sucesso, primeiro_token = False, None
+        return time.perf_counter() - inicio, sucesso, primeiro_token
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for duracao, sucesso, primeiro_token in executor.map(executar_uma, range(requisicoes)):
+            duracoes.append(duracao)
+            falhas += not sucesso
+            if primeiro_token is not None:
+                primeiros_tokens.append(primeiro_token)
+    total = time.perf_counter() - inicio
+
+    resultado = {
+        "p50_ms": round(percentil(duracoes, 0.50) * 1000, 2),
+        "p95_ms": round(percentil(duracoes, 0.95) * 1000, 2),
+        "p99_ms": round(percentil(duracoes, 0.99) * 1000, 2),
+        "vazao_rps": round(requisicoes / total, 2),
+        "falhas": falhas,
+    }
+    if primeiros_tokens:
+        resultado["primeiro_token_p50_ms"] = round(percentil(primeiros_tokens, 0.50) * 1000, 2)
+    return resultado
+
+
+def comparar(resultados, base, tolerancia):
+    """Lista as regressões de p95 e vazão em relação à linha de base"""
+    regressoes = []
+    for nome, niveis in base["cenarios"].items():
+        for nivel, referencia in niveis.items():
+            atual = resultados["cenarios"].get(nome, {}).get(nivel)
+            if not atual:
+                continue
+            limite_p95 = referencia["p95_ms"] * (1 + tolerancia)
+            if atual["p95_ms"] > limite_p95 and atual["p95_ms"] - referencia["p95_ms"] > PISO_RUIDO_MS:
+                regressoes.append(f"{nome} (concorrência {nivel}): p95 {referencia['p95_ms']} -> {atual['p95_ms']} ms")
+            # Cenários abaixo do piso (caches em memória) medem mais o pool de threads que o app
+            if referencia["p95_ms"] > PISO_RUIDO_MS and atual["vazao_rps"] < referencia["vazao_rps"] * (1 - tolerancia):
+                regressoes.append(f"{nome} (concorrência {nivel}): vazão {referencia['vazao_rps']} -> {atual['vazao_rps']} req/s")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline do Smart Clima")
+    parser.add_argument("--perfil", choices=sorted(PERFIS), default="normal", help="Perfil de falhas dos stubs")
+    parser.add_argument("--concorrencia", default="1,8,32", help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--requisicoes", type=int, default=64, help="Chamadas por cenário e nível")
+    parser.add_argument("--cenarios", help="Subconjunto de cenários, separados por vírgula")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--salvar", help="Grava os resultados neste JSON (ex.: nova linha de base)")
+    parser.add_argument("--comparar", help="JSON de linha de base para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.3, help="Piora relativa aceita (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    # Os timeouts injetados precisam estourar o timeout de leitura do app
+    configuracao = ConfiguracaoStub(args.perfil, args.semente, atraso_timeout=2.0)
+    servidor = iniciar_servidor(configuracao)
+    os.environ.update(configuracao_app(servidor))
+    os.environ.setdefault("HTTP_TIMEOUT_LEITURA", "1.0")
+    os.environ.setdefault("OPENAI_TIMEOUT", "1.5")
+    os.environ.setdefault("METRICAS_PORTA", "0")
+
+    # Importado só depois das variáveis: CEP_APIS e WEATHERAPI_URL são lidas na importação
+    import streamlit.logger
+    import streamlit_app as app
+    # Fora do `streamlit run` cada chamada avisaria que não há ScriptRunContext
+    streamlit.logger.set_log_level("error")
+
+    cenarios = criar_cenarios(app)
+    nomes = args.cenarios.split(",") if args.cenarios else list(cenarios)
+    niveis = [int(nivel) for nivel in args.concorrencia.split(",")]
+
+    resultados = {
+        "perfil": args.perfil,
+        "requisicoes": args.requisicoes,
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "cenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome in nomes:
+            cenario, aquecimento = cenarios[nome]
+            resultados["cenarios"][nome] = {}
+            for nivel in niveis:
+                reiniciar_estado(app, diretorio)
+                if aquecimento:
+                    aquecimento()
+                medida = medir_cenario(cenario, nivel, args.requisicoes)
+                resultados["cenarios"][nome][str(nivel)] = medida
+                print(
+                    f"{nome:<24} c={nivel:<3} p50 {medida['p50_ms']:>9.2f} ms  p95 {medida['p95_ms']:>9.2f} ms  "
+                    f"p99 {medida['p99_ms']:>9.2f} ms  {medida['vazao_rps']:>8.2f} req/s  falhas {medida['falhas']}"
+                )
+    servidor.shutdown()
+
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+            arquivo.write("\n")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        if base.get("perfil") != args.perfil:
+            print(f"⚠️ Linha de base gravada com o perfil {base.get('perfil')}")
+        regressoes = comparar(resultados, base, args.tolerancia)
+        if regressoes:
+            print("❌ Regressões em relação à linha de base:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("✅ Sem regressões em relação à linha de base")
+
+
+if __name__ == "__main__":
+    main()
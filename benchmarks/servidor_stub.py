@@ -0,0 +1,339 @@
+"""Servidor local que imita ViaCEP, BrasilAPI, AwesomeAPI, WeatherAPI e OpenAI
+
+Reproduz as respostas de benchmarks/respostas/ (no formato de cada API) com
+latência, erros 5xx e timeouts injetados conforme o perfil escolhido, sem
+acessar a rede. CEPs começando com "000" são respondidos como inexistentes.
+
+Rotas (um único servidor; o prefixo identifica o serviço):
+    GET  /viacep/ws/{cep}/json/
+    GET  /brasilapi/api/cep/v1/{cep}
+    GET  /awesomeapi/json/{cep}
+    GET  /weatherapi/v1/current.json?q=lat,lon
+    POST /weatherapi/v1/current.json?q=bulk  (até 50 locais em {"locations": [...]})
+    GET  /weatherapi/v1/forecast.json?q=lat,lon&days=N  (previsão por hora a partir de hoje)
+    POST /openai/v1/chat/completions   (com ou sem "stream": true)
+    GET  /openai/v1/models
+
+Uso:
+    python benchmarks/servidor_stub.py --perfil instavel --porta 8900
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DIRETORIO_RESPOSTAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "respostas")
+
+# Latência base por serviço, em ms: (média, variação uniforme ±)
+LATENCIAS = {
+    "viacep": (40, 15),
+    "brasilapi": (90, 30),
+    "awesomeapi": (60, 20),
+    "weatherapi": (120, 40),
+    "openai": (350, 100),  # até o primeiro token
+}
+
+# Intervalo entre tokens do streaming da OpenAI, em ms
+INTERVALO_TOKEN_MS = 2
+
+# Locais por requisição em lote da WeatherAPI e custo extra de cada um, em ms
+LOTE_MAXIMO_WEATHERAPI = 50
+LATENCIA_POR_LOCAL_MS = 1
+
+# Perfis de falha: multiplicador de latência, taxa de erro 5xx e taxa de timeout
+PERFIS = {
+    "normal": {"fator_latencia": 1.0, "taxa_erro": 0.0, "taxa_timeout": 0.0},
+    "lento": {"fator_latencia": 5.0, "taxa_erro": 0.0, "taxa_timeout": 0.0},
+    "instavel": {"fator_latencia": 1.0, "taxa_erro": 0.2, "taxa_timeout": 0.05},
+}
+
+
+def carregar_resposta(nome):
+    with open(os.path.join(DIRETORIO_RESPOSTAS, f"{nome}.json"), encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+class ConfiguracaoStub:
+    """Perfil de falhas e gerador aleatório com semente (execuções reproduzíveis)"""
+
+    def __init__(self, perfil="normal", semente=42, atraso_timeout=30.0, servicos=None):
+        self.perfil = PERFIS[perfil]
+        # Só estes serviços sofrem erros e timeouts (todos, se None)
+        self.servicos = servicos
+        self.atraso_timeout = atraso_timeout
+        self.respostas = {
+            nome[:-5]: carregar_resposta(nome[:-5])
+            for nome in os.listdir(DIRETORIO_RESPOSTAS) if nome.endswith(".json")
+        }
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def sortear(self, servico):
+        """Retorna (latencia_s, falha), com falha None, "erro" ou "timeout" """
+        media, variacao = LATENCIAS[servico]
+        with self._lock:
+            latencia = (media + self._aleatorio.uniform(-variacao, variacao)) * self.perfil["fator_latencia"] / 1000
+            sorteio = self._aleatorio.random()
+        if self.servicos is None or servico in self.servicos:
+            if sorteio < self.perfil["taxa_timeout"]:
+                return latencia, "timeout"
+            if sorteio < self.perfil["taxa_timeout"] + self.perfil["taxa_erro"]:
+                return latencia, "erro"
+        return latencia, None
+
+
+class ManipuladorStub(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que o pool de conexões dos clientes seja exercitado como em produção
+    protocol_version = "HTTP/1.1"
+    # Cabeçalhos e corpo no mesmo segmento TCP: sem a espera de ~40 ms do ACK atrasado
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    ROTAS_CEP = [
+        ("viacep", re.compile(r"^/viacep/ws/(\d{8})/json/?$")),
+        ("brasilapi", re.compile(r"^/brasilapi/api/cep/v1/(\d{8})$")),
+        ("awesomeapi", re.compile(r"^/awesomeapi/json/(\d{8})$")),
+    ]
+
+    @property
+    def configuracao(self):
+        return self.server.configuracao
+
+    def _responder_json(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _aplicar_falha(self, servico):
+        """Dorme a latência sorteada; retorna True se a requisição já foi respondida com falha"""
+        latencia, falha = self.configuracao.sortear(servico)
+        if falha == "timeout":
+            time.sleep(self.configuracao.atraso_timeout)
+            self.close_connection = True
+            return True
+        time.sleep(latencia)
+        if falha == "erro":
+            self._responder_json(503, {"erro": "falha injetada"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        for servico, padrao in self.ROTAS_CEP:
+            encontrado = padrao.match(url.path)
+            if encontrado:
+                self._responder_cep(servico, encontrado.group(1))
+                return
+        if url.path == "/weatherapi/v1/current.json":
+            self._responder_clima(parse_qs(url.query))
+            return
+        if url.path == "/weatherapi/v1/forecast.json":
+            self._responder_previsao(parse_qs(url.query))
+            return
+        if url.path == "/openai/v1/models":
+            modelo = self.configuracao.respostas["openai_chat"]["model"]
+            self._responder_json(200, {"object": "list", "data": [{"id": modelo, "object": "model", "owned_by": "stub"}]})
+            return
+        self._responder_json(404, {"erro": "rota desconhecida"})
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        url = urlparse(self.path)
+        if url.path == "/openai/v1/chat/completions":
+            self._responder_openai(corpo)
+            return
+        if url.path == "/weatherapi/v1/current.json" and parse_qs(url.query).get("q") == ["bulk"]:
+            self._responder_clima_lote(corpo)
+            return
+        self._responder_json(404, {"erro": "rota desconhecida"})
+
+    def _responder_cep(self, servico, cep):
+        if self._aplicar_falha(servico):
+            return
+        respostas = self.configuracao.respostas
+        if cep.startswith("000"):
+            # ViaCEP responde 200 com {"erro": ...}; as demais, 404
+            status = 200 if servico == "viacep" else 404
+            self._responder_json(status, respostas[f"{servico}_nao_encontrado"])
+            return
+        dados = copy.deepcopy(respostas[servico])
+        dados["cep"] = f"{cep[:5]}-{cep[5:]}" if servico == "viacep" else cep
+        self._responder_json(200, dados)
+
+    def _clima_ponto(self, consulta):
+        """Resposta de current.json para "lat,lon", ou None se a consulta não for um ponto"""
+        try:
+            lat, lon = (float(valor) for valor in consulta.split(","))
+        except (AttributeError, ValueError):
+            return None
+        dados = copy.deepcopy(self.configuracao.respostas["weatherapi_current"])
+        dados["location"]["lat"], dados["location"]["lon"] = round(lat, 2), round(lon, 2)
+        # Varia a temperatura com a latitude para não devolver sempre o mesmo clima
+        dados["current"]["temp_c"] = round(30 + lat / 3, 1)
+        dados["current"]["feelslike_c"] = dados["current"]["temp_c"]
+        return dados
+
+    def _responder_clima(self, parametros):
+        if self._aplicar_falha("weatherapi"):
+            return
+        dados = self._clima_ponto(parametros.get("q", [""])[0])
+        if dados is None:
+            self._responder_json(400, {"error": {"code": 1006, "message": "No matching location found."}})
+            return
+        self._responder_json(200, dados)
+
+    def _responder_previsao(self, parametros):
+        if self._aplicar_falha("weatherapi"):
+            return
+        dados = self._clima_ponto(parametros.get("q", [""])[0])
+        if dados is None:
+            self._responder_json(400, {"error": {"code": 1006, "message": "No matching location found."}})
+            return
+        atual = dados["current"]
+        dias = max(1, min(14, int(parametros.get("days", ["1"])[0])))
+        # Dias alinhados à meia-noite (UTC) de hoje, com ciclo diário de ±5 °C em torno do clima atual
+        inicio = int(time.time()) // 86400 * 86400
+        previsao = []
+        for dia in range(dias):
+            horas = []
+            for hora in range(24):
+                epoch = inicio + (dia * 24 + hora) * 3600
+                variacao = 5 * math.sin((hora - 9) * math.pi / 12)
+                horas.append({
+                    "time_epoch": epoch,
+                    "time": time.strftime("%Y-%m-%d %H:%M", time.gmtime(epoch)),
+                    "temp_c": round(atual["temp_c"] + variacao, 1),
+                    "feelslike_c": round(atual["feelslike_c"] + variacao * 1.2, 1),
+                    "humidity": int(min(100, max(0, atual["humidity"] - 3 * variacao))),
+                    "wind_kph": atual["wind_kph"],
+                    "chance_of_rain": (hora * 7 + dia * 13) % 100,
+                    "condition": atual["condition"],
+                })
+            previsao.append({"date": horas[0]["time"][:10], "date_epoch": inicio + dia * 86400, "hour": horas})
+        dados["forecast"] = {"forecastday": previsao}
+        self._responder_json(200, dados)
+
+    def _responder_clima_lote(self, corpo):
+        locais = corpo.get("locations") or []
+        if self._aplicar_falha("weatherapi"):
+            return
+        if len(locais) > LOTE_MAXIMO_WEATHERAPI:
+            self._responder_json(400, {"error": {"code": 2010, "message": "Bulk request exceeds maximum locations."}})
+            return
+        time.sleep(len(locais) * LATENCIA_POR_LOCAL_MS / 1000)
+        itens = []
+        for local in locais:
+            consulta = {"custom_id": local.get("custom_id"), "q": local.get("q")}
+            dados = self._clima_ponto(local.get("q"))
+            if dados is None:
+                consulta["error"] = {"code": 1006, "message": "No matching location found."}
+            else:
+                consulta.update(dados)
+            itens.append({"query": consulta})
+        self._responder_json(200, {"bulk": itens})
+
+    def _responder_openai(self, corpo):
+        if self._aplicar_falha("openai"):
+            return
+        resposta = copy.deepcopy(self.configuracao.respostas["openai_chat"])
+        conteudo = resposta["choices"][0]["message"]["content"]
+        tokens = re.findall(r"\S+\s*", conteudo)
+
+        if not corpo.get("stream"):
+            time.sleep(len(tokens) * INTERVALO_TOKEN_MS / 1000)
+            self._responder_json(200, resposta)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for indice, token in enumerate(tokens + [None]):
+            pedaco = {
+                "id": resposta["id"],
+                "object": "chat.completion.chunk",
+                "created": resposta["created"],
+                "model": resposta["model"],
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": token} if token else {},
+                    "finish_reason": None if token else "stop"
+                }]
+            }
+            if indice == 0:
+                pedaco["choices"][0]["delta"]["role"] = "assistant"
+            self.wfile.write(f"data: {json.dumps(pedaco, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if token:
+                time.sleep(INTERVALO_TOKEN_MS / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorStub(ThreadingHTTPServer):
+    daemon_threads = True
+    # A fila padrão (5) descarta conexões sob concorrência e soma ~1 s de retransmissão
+    request_queue_size = 256
+
+
+def iniciar_servidor(configuracao, host="127.0.0.1", porta=0):
+    """Sobe o servidor em uma thread de apoio; porta 0 escolhe uma porta livre"""
+    servidor = ServidorStub((host, porta), ManipuladorStub)
+    servidor.configuracao = configuracao
+    threading.Thread(target=servidor.serve_forever, name="stub", daemon=True).start()
+    return servidor
+
+
+def configuracao_app(servidor):
+    """Variáveis de ambiente que apontam o Smart Clima para o servidor local"""
+    base = "http://{}:{}".format(*servidor.server_address[:2])
+    return {
+        "CEP_APIS": ",".join([
+            f"{base}/viacep/ws/{{}}/json/",
+            f"{base}/brasilapi/api/cep/v1/{{}}",
+            f"{base}/awesomeapi/json/{{}}",
+        ]),
+        "WEATHERAPI_URL": f"{base}/weatherapi/v1",
+        "OPENAI_BASE_URL": f"{base}/openai/v1",
+        "WEATHER_API_KEY": "stub",
+        "OPENAI_API_KEY": "stub",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local com as APIs externas do Smart Clima")
+    parser.add_argument("--perfil", choices=sorted(PERFIS), default="normal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8900)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--atraso-timeout", type=float, default=30.0, help="Segundos sem resposta nos timeouts")
+    args = parser.parse_args()
+
+    configuracao = ConfiguracaoStub(args.perfil, args.semente, args.atraso_timeout)
+    servidor = iniciar_servidor(configuracao, args.host, args.porta)
+    print(f"Stubs no ar (perfil {args.perfil}). Configure o app com:")
+    for nome, valor in configuracao_app(servidor).items():
+        print(f"  export {nome}='{valor}'")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
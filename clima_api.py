@@ -0,0 +1,197 @@
+"""API JSON do Smart Clima, com a mesma lógica de busca da interface Streamlit
+
+Endpoints:
+    GET  /cep/{cep}                  endereço e coordenadas do CEP
+    GET  /weather?lat=&lon=          clima atual
+    POST /weather                    clima atual de vários pontos ({"pontos": [{"lat": , "lon": }, ...]})
+    POST /reverse                    município e UF de vários pontos, sem rede (mesmo corpo de POST /weather)
+    GET  /recommendations?lat=&lon=  clima atual + recomendações
+    POST /recommendations            recomendações para um clima enviado no corpo
+    GET  /health                     ?dependencias=1 inclui a conectividade com as APIs externas
+    GET  /metrics                    métricas no formato do Prometheus
+
+As mensagens de status que a interface mostraria viram o campo `diagnosticos`.
+
+Uso:
+    python clima_api.py --port 8000 --workers 4
+"""
+import argparse
+import math
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from streamlit_app import (
+    buscar_cep_completo,
+    coletar_mensagens,
+    exportar_metricas,
+    get_weather_fallback,
+    get_weather_lote,
+    iniciar_aquecedor_clima,
+    obter_diagnostico_conectividade,
+    interpretar_clima_async,
+    municipios_por_coordenadas,
+    validate_cep,
+)
+
+CAMPOS_CLIMA = ("temperatura", "sensacao", "umidade", "vento_kmh", "descricao")
+CAMPOS_NUMERICOS_CLIMA = ("temperatura", "sensacao", "umidade", "vento_kmh")
+
+
+def _com_diagnosticos(funcao, *args):
+    """Executa a função coletando as mensagens de status (roda em thread do pool)"""
+    with coletar_mensagens() as mensagens:
+        return funcao(*args), mensagens
+
+
+def _clima_do_corpo(corpo):
+    """Valida o clima enviado no corpo: números finitos e descrição em texto"""
+    clima = {campo: float(corpo[campo]) for campo in CAMPOS_NUMERICOS_CLIMA}
+    if not all(math.isfinite(valor) for valor in clima.values()):
+        raise ValueError("Valores numéricos precisam ser finitos")
+    if not isinstance(corpo["descricao"], str):
+        raise TypeError("descricao precisa ser texto")
+    clima["descricao"] = corpo["descricao"]
+    return clima
+
+
+def _coordenadas(request):
+    """Lê e valida lat/lon da query string; retorna (lat, lon, erro)"""
+    try:
+        lat = float(request.query_params["lat"])
+        lon = float(request.query_params["lon"])
+    except (KeyError, ValueError):
+        return None, None, "Informe lat e lon numéricos"
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        return None, None, "Coordenadas inválidas. Latitude: -90 a 90, Longitude: -180 a 180"
+    return lat, lon, None
+
+
+async def cep(request):
+    cep_informado = request.path_params["cep"]
+    if not validate_cep(cep_informado):
+        return JSONResponse({"erro": "CEP inválido. Use formato: 12345678"}, status_code=400)
+
+    (lat, lon, endereco_info, erro), mensagens = await run_in_threadpool(
+        _com_diagnosticos, buscar_cep_completo, cep_informado
+    )
+    if erro:
+        return JSONResponse({"erro": erro, "diagnosticos": mensagens}, status_code=404)
+    return JSONResponse({"lat": lat, "lon": lon, "endereco": endereco_info, "diagnosticos": mensagens})
+
+
+async def weather(request):
+    if request.method == "POST":
+        return await weather_lote(request)
+    lat, lon, erro = _coordenadas(request)
+    if erro:
+        return JSONResponse({"erro": erro}, status_code=400)
+
+    clima, mensagens = await run_in_threadpool(_com_diagnosticos, get_weather_fallback, lat, lon)
+    return JSONResponse({"clima": clima, "diagnosticos": mensagens})
+
+
+async def _pontos(request):
+    """Lê e valida {"pontos": [{"lat": , "lon": }, ...]} do corpo; retorna (pontos, erro)"""
+    try:
+        corpo = await request.json()
+        pontos = [(float(ponto["lat"]), float(ponto["lon"])) for ponto in corpo["pontos"]]
+    except (ValueError, KeyError, TypeError):
+        return None, 'Envie um JSON com "pontos": [{"lat": ..., "lon": ...}, ...]'
+    if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in pontos):
+        return None, "Coordenadas inválidas. Latitude: -90 a 90, Longitude: -180 a 180"
+    return pontos, None
+
+
+async def weather_lote(request):
+    pontos, erro = await _pontos(request)
+    if erro:
+        return JSONResponse({"erro": erro}, status_code=400)
+
+    climas, mensagens = await run_in_threadpool(_com_diagnosticos, get_weather_lote, pontos)
+    return JSONResponse({"climas": climas, "diagnosticos": mensagens})
+
+
+async def reverse(request):
+    pontos, erro = await _pontos(request)
+    if erro:
+        return JSONResponse({"erro": erro}, status_code=400)
+
+    municipios = await run_in_threadpool(municipios_por_coordenadas, pontos)
+    return JSONResponse({"municipios": municipios})
+
+
+async def recommendations(request):
+    mensagens = []
+    if request.method == "POST":
+        try:
+            corpo = await request.json()
+            clima = _clima_do_corpo(corpo)
+        except (ValueError, KeyError, TypeError):
+            return JSONResponse(
+                {"erro": f"Envie um JSON com {', '.join(CAMPOS_NUMERICOS_CLIMA)} numéricos e descricao em texto"},
+                status_code=400
+            )
+    else:
+        lat, lon, erro = _coordenadas(request)
+        if erro:
+            return JSONResponse({"erro": erro}, status_code=400)
+        clima, mensagens = await run_in_threadpool(_com_diagnosticos, get_weather_fallback, lat, lon)
+
+    usar_cache = request.query_params.get("regenerar") not in ("1", "true")
+    with coletar_mensagens() as mensagens_llm:
+        recomendacoes = await interpretar_clima_async(clima, usar_cache=usar_cache)
+    return JSONResponse({
+        "clima": clima,
+        "recomendacoes": recomendacoes,
+        "diagnosticos": mensagens + mensagens_llm
+    })
+
+
+async def health(request):
+    if request.query_params.get("dependencias") not in ("1", "true"):
+        return JSONResponse({"status": "ok"})
+    # Estado em cache (DIAGNOSTICO_TTL): só sonda as APIs quando o último resultado expirou
+    diagnostico = await run_in_threadpool(obter_diagnostico_conectividade().obter)
+    return JSONResponse({"status": "ok" if diagnostico["conectado"] else "degradado", "dependencias": diagnostico})
+
+
+async def metrics(request):
+    # Métricas do processo que atendeu a requisição (um conjunto por worker)
+    return PlainTextResponse(exportar_metricas(), media_type="text/plain; version=0.0.4")
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    # Clima das cidades e capitais embutidas atualizado em segundo plano, como na interface
+    iniciar_aquecedor_clima()
+    obter_diagnostico_conectividade().iniciar()
+    yield
+
+
+app = Starlette(lifespan=ciclo_de_vida, routes=[
+    Route("/cep/{cep}", cep),
+    Route("/weather", weather, methods=["GET", "POST"]),
+    Route("/recommendations", recommendations, methods=["GET", "POST"]),
+    Route("/reverse", reverse, methods=["POST"]),
+    Route("/health", health),
+    Route("/metrics", metrics),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API JSON do Smart Clima")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Processos (um por núcleo)")
+    args = parser.parse_args()
+    uvicorn.run("clima_api:app", host=args.host, port=args.port, workers=args.workers, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
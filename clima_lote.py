@@ -0,0 +1,285 @@
+"""Modo em lote do Smart Clima: CEP/coordenadas -> clima -> recomendações, sem interface
+
+Lê um CSV ou JSONL com uma coluna `cep` ou as colunas `lat`/`lon` (também aceita
+`latitude`/`longitude`) e grava os resultados à medida que ficam prontos.
+
+Uso:
+    python clima_lote.py entrada.csv saida.jsonl --concorrencia 8 --taxa-cep 5
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from streamlit_app import (
+    CEP_APIS,
+    WEATHERAPI_URL,
+    buscar_cep_completo,
+    coletar_mensagens,
+    definir_limite_taxa,
+    get_weather_lote,
+    recomendacoes_fallback,
+)
+
+COLUNAS_SAIDA = [
+    "linha", "cep", "lat", "lon", "cidade", "uf", "endereco",
+    "temperatura", "sensacao", "umidade", "vento_kmh", "descricao", "fallback",
+    "recomendacoes", "erro", "diagnosticos"
+]
+
+
+class LinhaInvalida(str):
+    """Linha da entrada que não pôde ser lida: vira erro só dela, sem interromper o lote"""
+
+
+def ler_entrada(caminho):
+    """Gera as linhas de entrada (dicts) sem carregar o arquivo inteiro"""
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        if caminho.endswith(".jsonl"):
+            for texto in arquivo:
+                if not texto.strip():
+                    continue
+                try:
+                    linha = json.loads(texto)
+                except json.JSONDecodeError as e:
+                    yield LinhaInvalida(f"JSON inválido: {e.msg} (coluna {e.colno})")
+                    continue
+                yield linha if isinstance(linha, dict) else LinhaInvalida("Linha JSON não é um objeto")
+        else:
+            yield from csv.DictReader(arquivo)
+
+
+def resolver_linha(numero, entrada):
+    """Resolve a localização de uma linha; retorna (resultado com lat/lon ou erro, mensagens)"""
+    resultado = dict.fromkeys(COLUNAS_SAIDA, "")
+    resultado["linha"] = numero
+
+    with coletar_mensagens() as mensagens:
+        if isinstance(entrada, LinhaInvalida):
+            resultado["erro"] = entrada
+            return resultado, mensagens
+        try:
+            cep = str(entrada.get("cep") or "").strip()
+            if cep:
+                resultado["cep"] = cep
+                lat, lon, endereco_info, erro = buscar_cep_completo(cep)
+                if erro:
+                    resultado["erro"] = erro
+                    return resultado, mensagens
+                if endereco_info:
+                    resultado["cidade"] = endereco_info.get("cidade", "")
+                    resultado["uf"] = endereco_info.get("uf", "")
+                    resultado["endereco"] = " ".join(
+                        filter(None, [endereco_info.get("rua"), endereco_info.get("bairro")])
+                    )
+            else:
+                lat = float(entrada.get("lat", entrada.get("latitude")))
+                lon = float(entrada.get("lon", entrada.get("longitude")))
+                if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+                    resultado["erro"] = "Coordenadas inválidas"
+                    return resultado, mensagens
+
+            resultado["lat"], resultado["lon"] = lat, lon
+        except (TypeError, ValueError):
+            resultado["erro"] = "Linha sem CEP nem coordenadas numéricas"
+        except Exception as e:
+            resultado["erro"] = str(e)
+
+    return resultado, mensagens
+
+
+def completar_linha(resultado, clima, com_recomendacoes=True):
+    """Preenche o clima e as recomendações de uma linha já localizada"""
+    try:
+        resultado["cidade"] = resultado["cidade"] or clima["cidade"]
+        for campo in ("temperatura", "sensacao", "umidade", "vento_kmh", "descricao", "fallback"):
+            resultado[campo] = clima[campo]
+
+        if com_recomendacoes:
+            resultado["recomendacoes"] = recomendacoes_fallback(
+                clima["temperatura"], clima["umidade"], clima["vento_kmh"], clima["descricao"]
+            ).strip()
+    except Exception as e:
+        resultado["erro"] = str(e)
+
+
+def processar_bloco(executor, bloco, com_recomendacoes=True):
+    """Localiza as linhas do bloco em paralelo e busca o clima de todas numa consulta em lote"""
+    resolvidas = list(executor.map(lambda item: resolver_linha(*item), bloco))
+    localizadas = [resultado for resultado, _ in resolvidas if not resultado["erro"]]
+
+    with coletar_mensagens() as mensagens_clima:
+        try:
+            climas = get_weather_lote([(resultado["lat"], resultado["lon"]) for resultado in localizadas])
+        except Exception as e:
+            climas = None
+            for resultado in localizadas:
+                resultado["erro"] = str(e)
+    if climas:
+        for resultado, clima in zip(localizadas, climas):
+            completar_linha(resultado, clima, com_recomendacoes)
+
+    for resultado, mensagens in resolvidas:
+        # Os avisos da consulta de clima valem para todas as linhas que chegaram até ela
+        if resultado["lat"] != "":
+            mensagens = mensagens + mensagens_clima
+        resultado["diagnosticos"] = " | ".join(m["mensagem"] for m in mensagens)
+    return [resultado for resultado, _ in resolvidas]
+
+
+class EscritorCSV:
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, "w", encoding="utf-8", newline="")
+        self.escritor = csv.DictWriter(self.arquivo, fieldnames=COLUNAS_SAIDA)
+        self.escritor.writeheader()
+
+    def escrever(self, linha):
+        self.escritor.writerow(linha)
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class EscritorJSONL:
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, "w", encoding="utf-8")
+
+    def escrever(self, linha):
+        self.arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class EscritorParquet:
+    """Grava em grupos de linhas para manter a memória constante (requer pyarrow)"""
+
+    TAMANHO_GRUPO = 1000
+
+    def __init__(self, caminho):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("❌ Saída Parquet requer o pacote pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.esquema = pa.schema([
+            (coluna, pa.float64() if coluna in ("lat", "lon", "temperatura", "sensacao", "umidade", "vento_kmh")
+             else pa.int64() if coluna == "linha"
+             else pa.bool_() if coluna == "fallback"
+             else pa.string())
+            for coluna in COLUNAS_SAIDA
+        ])
+        self.escritor = pq.ParquetWriter(caminho, self.esquema)
+        self.buffer = []
+
+    def escrever(self, linha):
+        self.buffer.append({coluna: (None if linha[coluna] == "" else linha[coluna]) for coluna in COLUNAS_SAIDA})
+        if len(self.buffer) >= self.TAMANHO_GRUPO:
+            self._descarregar()
+
+    def _descarregar(self):
+        if self.buffer:
+            self.escritor.write_table(self.pa.Table.from_pylist(self.buffer, schema=self.esquema))
+            self.buffer = []
+
+    def fechar(self):
+        self._descarregar()
+        self.escritor.close()
+
+
+ESCRITORES = {"csv": EscritorCSV, "jsonl": EscritorJSONL, "parquet": EscritorParquet}
+
+
+def ler_blocos(entrada, tamanho):
+    """Agrupa as linhas de entrada, numeradas a partir de 1, em blocos de `tamanho`"""
+    bloco = []
+    for item in enumerate(ler_entrada(entrada), start=1):
+        bloco.append(item)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def executar_lote(entrada, saida, formato, concorrencia, com_recomendacoes=True, tamanho_bloco=50):
+    """Processa a entrada em blocos de `tamanho_bloco` linhas, gravando na ordem original
+
+    Dentro de um bloco, até `concorrencia` linhas são localizadas em paralelo e o
+    clima de todas vem de uma só requisição em lote. Dois blocos ficam em
+    andamento ao mesmo tempo, para que a leitura e a gravação não esperem a rede.
+    """
+    escritor = ESCRITORES[formato](saida)
+    total = erros = 0
+    try:
+        with ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="lote") as executor, \
+                ThreadPoolExecutor(max_workers=2, thread_name_prefix="bloco") as executor_blocos:
+            pendentes = deque()
+
+            def gravar_proximo():
+                nonlocal total, erros
+                for resultado in pendentes.popleft().result():
+                    escritor.escrever(resultado)
+                    total += 1
+                    erros += bool(resultado["erro"])
+
+            for bloco in ler_blocos(entrada, tamanho_bloco):
+                pendentes.append(executor_blocos.submit(processar_bloco, executor, bloco, com_recomendacoes))
+                # Janela limitada: memória constante independentemente do tamanho da entrada
+                if len(pendentes) >= 2:
+                    gravar_proximo()
+            while pendentes:
+                gravar_proximo()
+    finally:
+        escritor.fechar()
+    return total, erros
+
+
+def inteiro_positivo(texto):
+    """Tipo do argparse para opções que precisam ser >= 1"""
+    try:
+        valor = int(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"número inteiro inválido: {texto!r}")
+    if valor < 1:
+        raise argparse.ArgumentTypeError(f"deve ser pelo menos 1 (recebido {valor})")
+    return valor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart Clima em lote (sem interface)")
+    parser.add_argument("entrada", help="Arquivo .csv ou .jsonl com coluna cep ou lat/lon")
+    parser.add_argument("saida", help="Arquivo de saída (.csv, .jsonl ou .parquet)")
+    parser.add_argument("--formato", choices=sorted(ESCRITORES), help="Formato da saída (padrão: pela extensão)")
+    parser.add_argument("--concorrencia", type=inteiro_positivo, default=8, help="Linhas processadas em paralelo")
+    parser.add_argument("--taxa-cep", type=float, default=0, help="Máximo de requisições/s por API de CEP")
+    parser.add_argument("--taxa-clima", type=float, default=0, help="Máximo de requisições/s à WeatherAPI")
+    parser.add_argument("--bloco", type=inteiro_positivo, default=50, help="Linhas por consulta de clima em lote")
+    parser.add_argument("--sem-recomendacoes", action="store_true", help="Não calcula as recomendações")
+    args = parser.parse_args()
+
+    formato = args.formato or os.path.splitext(args.saida)[1].lstrip(".").lower()
+    if formato not in ESCRITORES:
+        parser.error("Informe --formato ou use a extensão .csv, .jsonl ou .parquet na saída")
+
+    if args.taxa_cep > 0:
+        for api_url in CEP_APIS:
+            definir_limite_taxa(urlparse(api_url).hostname, args.taxa_cep)
+    if args.taxa_clima > 0:
+        definir_limite_taxa(urlparse(WEATHERAPI_URL).hostname, args.taxa_clima)
+
+    total, erros = executar_lote(
+        args.entrada, args.saida, formato, args.concorrencia, not args.sem_recomendacoes, args.bloco
+    )
+    print(f"✅ {total} linhas processadas ({erros} com erro) -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Gera a grade de normais climatológicas usada nas estimativas offline do Smart Clima
+
+Sem argumentos, gera a grade semente: normais aproximadas de janeiro e julho
+(temperatura média, umidade relativa, amplitude diária e vento) das capitais,
+interpoladas por inverso da distância numa grade de 2° sobre o Brasil, com ciclo
+anual e diário parametrizados. É uma aproximação para substituir as constantes
+do modo offline, não um produto de reanálise.
+
+Com um CSV de normais em grade regular (colunas lat, lon, mes, hora, temperatura,
+umidade e vento_kmh, como as exportadas de reanálises ou das normais do INMET),
+grava a grade completa com a resolução e os horários do arquivo.
+
+Uso:
+    python scripts/gerar_climatologia.py
+    python scripts/gerar_climatologia.py normais.csv
+"""
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streamlit_app import ARQUIVO_CLIMATOLOGIA, ARQUIVO_META_CLIMATOLOGIA, VARIAVEIS_CLIMATOLOGIA
+
+# Capital: (lat, lon, temp. média jan, temp. média jul, UR jan, UR jul, amplitude diária °C, vento km/h)
+NORMAIS_CAPITAIS = {
+    "Porto Velho": (-8.76, -63.90, 26.0, 25.0, 88, 75, 9, 4),
+    "Rio Branco": (-9.97, -67.81, 26.0, 23.5, 88, 80, 10, 4),
+    "Manaus": (-3.10, -60.02, 26.8, 27.3, 86, 79, 8, 6),
+    "Boa Vista": (2.82, -60.67, 28.3, 26.3, 68, 83, 9, 10),
+    "Belém": (-1.46, -48.49, 26.3, 26.9, 90, 84, 8, 7),
+    "Macapá": (0.03, -51.07, 26.5, 27.0, 88, 82, 8, 9),
+    "Palmas": (-10.18, -48.33, 26.5, 26.5, 82, 55, 11, 7),
+    "São Luís": (-2.53, -44.30, 26.8, 26.8, 86, 84, 7, 11),
+    "Teresina": (-5.09, -42.80, 27.2, 27.5, 78, 62, 11, 6),
+    "Fortaleza": (-3.72, -38.54, 27.5, 26.5, 77, 76, 6, 15),
+    "Natal": (-5.79, -35.21, 27.3, 25.0, 76, 79, 6, 14),
+    "João Pessoa": (-7.12, -34.86, 27.5, 24.8, 76, 80, 6, 12),
+    "Recife": (-8.05, -34.88, 27.3, 24.9, 75, 82, 6, 11),
+    "Maceió": (-9.67, -35.74, 27.0, 24.3, 76, 82, 6, 12),
+    "Aracaju": (-10.91, -37.07, 27.2, 24.6, 75, 80, 5, 12),
+    "Salvador": (-12.97, -38.50, 27.0, 24.2, 79, 81, 5, 11),
+    "Belo Horizonte": (-19.92, -43.94, 23.5, 19.2, 71, 63, 9, 7),
+    "Vitória": (-20.32, -40.34, 27.0, 22.3, 77, 77, 7, 12),
+    "Rio de Janeiro": (-22.91, -43.17, 26.8, 21.8, 78, 77, 7, 9),
+    "São Paulo": (-23.55, -46.63, 22.9, 16.8, 76, 70, 8, 8),
+    "Curitiba": (-25.43, -49.27, 21.0, 13.5, 81, 80, 9, 10),
+    "Florianópolis": (-27.60, -48.55, 25.0, 16.5, 81, 82, 7, 12),
+    "Porto Alegre": (-30.03, -51.23, 25.2, 14.8, 72, 81, 9, 9),
+    "Campo Grande": (-20.44, -54.65, 25.6, 20.6, 75, 55, 11, 10),
+    "Cuiabá": (-15.60, -56.10, 27.3, 24.2, 80, 55, 11, 6),
+    "Goiânia": (-16.68, -49.25, 24.8, 21.5, 75, 45, 12, 7),
+    "Brasília": (-15.78, -47.93, 22.3, 19.8, 76, 49, 11, 9),
+}
+
+# Grade semente: 2° de -34 a 6 (lat) e de -74 a -34 (lon), horários a cada 3 h
+LATITUDES_SEMENTE = np.arange(-34.0, 6.0 + 1e-9, 2.0)
+LONGITUDES_SEMENTE = np.arange(-74.0, -34.0 + 1e-9, 2.0)
+HORAS_SEMENTE = list(range(0, 24, 3))
+
+
+def interpolar_capitais(latitudes, longitudes, potencia=2):
+    """Parâmetros das capitais interpolados por inverso da distância em cada ponto da grade"""
+    normais = np.array(list(NORMAIS_CAPITAIS.values()))
+    lat_grade, lon_grade = np.meshgrid(latitudes, longitudes, indexing="ij")
+    escala = np.cos(np.radians(lat_grade))[..., None]
+    distancias = np.hypot(lat_grade[..., None] - normais[:, 0], (lon_grade[..., None] - normais[:, 1]) * escala)
+    pesos = 1.0 / np.maximum(distancias, 0.1) ** potencia
+    pesos /= pesos.sum(axis=-1, keepdims=True)
+    return pesos @ normais[:, 2:]
+
+
+def gerar_semente():
+    """Grade (lat, lon, mês, horário, variável) a partir das normais das capitais"""
+    parametros = interpolar_capitais(LATITUDES_SEMENTE, LONGITUDES_SEMENTE)
+    temp_jan, temp_jul, ur_jan, ur_jul, amplitude, vento = (parametros[..., i, None, None] for i in range(6))
+
+    # Ciclo anual com máximo em janeiro e mínimo em julho; ciclo diário com máximo às 15 h
+    meses = np.arange(12)[:, None]
+    horas = np.array(HORAS_SEMENTE)[None, :]
+    anual = np.cos(2 * np.pi * meses / 12)
+    diario = np.cos(2 * np.pi * (horas - 15) / 24)
+
+    temp_mes = (temp_jan + temp_jul) / 2 + (temp_jan - temp_jul) / 2 * anual
+    temperatura = temp_mes + amplitude / 2 * diario
+    # A umidade relativa cai ~2,5 pontos por °C acima da média do dia
+    umidade = np.clip((ur_jan + ur_jul) / 2 + (ur_jan - ur_jul) / 2 * anual - 2.5 * (temperatura - temp_mes), 15, 100)
+    vento_kmh = vento * (1 + 0.3 * diario) * np.ones_like(anual)
+
+    grade = np.stack([temperatura, umidade, vento_kmh], axis=-1)
+    meta = {
+        "lat_inicial": float(LATITUDES_SEMENTE[0]),
+        "lon_inicial": float(LONGITUDES_SEMENTE[0]),
+        "passo": 2.0,
+        "horas": HORAS_SEMENTE,
+        "variaveis": list(VARIAVEIS_CLIMATOLOGIA),
+        "fonte": "semente: normais aproximadas das capitais (jan/jul) interpoladas",
+        # Não são normais observadas em grade: a interface apresenta como estimativa aproximada
+        "aproximada": True,
+    }
+    return grade, meta
+
+
+def ler_csv(caminho_csv):
+    """Grade a partir de um CSV de normais em grade regular (todas as combinações presentes)"""
+    with open(caminho_csv, encoding="utf-8-sig", newline="") as arquivo:
+        linhas = [
+            (float(linha["lat"]), float(linha["lon"]), int(linha["mes"]), int(linha["hora"]),
+             *(float(linha[variavel]) for variavel in VARIAVEIS_CLIMATOLOGIA))
+            for linha in csv.DictReader(arquivo)
+        ]
+    latitudes = sorted({linha[0] for linha in linhas})
+    longitudes = sorted({linha[1] for linha in linhas})
+    horas = sorted({linha[3] for linha in linhas})
+    passos = set(np.round(np.diff(latitudes), 6)) | set(np.round(np.diff(longitudes), 6))
+    if len(passos) != 1:
+        raise ValueError(f"A grade precisa ter o mesmo passo em latitude e longitude (passos: {sorted(passos)})")
+
+    grade = np.full((len(latitudes), len(longitudes), 12, len(horas), len(VARIAVEIS_CLIMATOLOGIA)), np.nan)
+    posicao_lat = {valor: i for i, valor in enumerate(latitudes)}
+    posicao_lon = {valor: i for i, valor in enumerate(longitudes)}
+    posicao_hora = {valor: i for i, valor in enumerate(horas)}
+    for lat, lon, mes, hora, *valores in linhas:
+        grade[posicao_lat[lat], posicao_lon[lon], mes - 1, posicao_hora[hora]] = valores
+    if np.isnan(grade).any():
+        raise ValueError("O CSV não cobre todas as combinações de ponto, mês e horário da grade")
+
+    meta = {
+        "lat_inicial": latitudes[0],
+        "lon_inicial": longitudes[0],
+        "passo": float(passos.pop()),
+        "horas": horas,
+        "variaveis": list(VARIAVEIS_CLIMATOLOGIA),
+        "fonte": os.path.basename(caminho_csv),
+        "aproximada": False,
+    }
+    return grade, meta
+
+
+def gravar_grade(grade, meta, caminho_grade=ARQUIVO_CLIMATOLOGIA, caminho_meta=ARQUIVO_META_CLIMATOLOGIA):
+    os.makedirs(os.path.dirname(caminho_grade), exist_ok=True)
+    np.save(caminho_grade, np.ascontiguousarray(grade, dtype="<f2"))
+    with open(caminho_meta, "w", encoding="utf-8") as arquivo:
+        json.dump(meta, arquivo, ensure_ascii=False, indent=2)
+        arquivo.write("\n")
+
+
+def main():
+    if len(sys.argv) > 2:
+        print(__doc__)
+        sys.exit(1)
+    grade, meta = ler_csv(sys.argv[1]) if len(sys.argv) == 2 else gerar_semente()
+    gravar_grade(grade, meta)
+    print(f"✅ Grade {grade.shape[0]}×{grade.shape[1]} ({meta['passo']}°) gravada em {ARQUIVO_CLIMATOLOGIA}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Gera a tabela compacta de faixas de CEP por município usada pelo Smart Clima
+
+Entrada: CSV com as colunas cep_inicial, cep_final e codigo_ibge (faixas de CEP
+dos Correios por localidade, com o código IBGE do município).
+
+Uso:
+    python scripts/gerar_faixas_cep.py faixas_cep.csv
+"""
+import csv
+import os
+import re
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streamlit_app import ARQUIVO_FAIXAS_CEP, DTYPE_FAIXAS_CEP
+
+
+def ler_faixas(caminho_csv):
+    """Lê o CSV de origem e retorna as faixas ordenadas, rejeitando sobreposições"""
+    with open(caminho_csv, encoding='utf-8-sig', newline='') as arquivo:
+        faixas = sorted(
+            (int(re.sub(r'\D', '', linha['cep_inicial'])),
+             int(re.sub(r'\D', '', linha['cep_final'])),
+             int(linha['codigo_ibge']))
+            for linha in csv.DictReader(arquivo)
+        )
+    for anterior, atual in zip(faixas, faixas[1:]):
+        if atual[0] <= anterior[1]:
+            raise ValueError(f"Faixas sobrepostas: {anterior} e {atual}")
+    return faixas
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    faixas = ler_faixas(sys.argv[1])
+    os.makedirs(os.path.dirname(ARQUIVO_FAIXAS_CEP), exist_ok=True)
+    np.save(ARQUIVO_FAIXAS_CEP, np.array(faixas, dtype=DTYPE_FAIXAS_CEP))
+    print(f"✅ {len(faixas)} faixas de CEP gravadas em {ARQUIVO_FAIXAS_CEP}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Gera os limites municipais usados na geocodificação reversa do Smart Clima
+
+Sem argumentos, gera os limites semente: contornos grosseiros, traçados à mão
+com poucos vértices, de três municípios (o retângulo do Distrito Federal, São
+Paulo e Rio de Janeiro). As bordas erram por quilômetros; servem para exercitar
+o teste ponto-em-polígono, não substituem a malha do IBGE. Os demais municípios
+continuam na sede mais próxima.
+
+Entrada: GeoJSON (FeatureCollection) com um Polygon ou MultiPolygon por município
+e o código IBGE em uma das propriedades codarea, CD_MUN, cod_ibge ou id (por
+exemplo, a malha municipal da API de malhas do IBGE:
+https://servicodados.ibge.gov.br/api/v3/malhas/paises/BR?intrarregiao=municipio&formato=application/vnd.geo+json).
+
+Uso:
+    python scripts/gerar_limites_municipios.py
+    python scripts/gerar_limites_municipios.py municipios.geojson
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streamlit_app import ARQUIVO_LIMITES_MUNICIPIOS, ARQUIVO_VERTICES_LIMITES, DTYPE_LIMITES_MUNICIPIOS
+
+PROPRIEDADES_CODIGO = ("codarea", "CD_MUN", "cod_ibge", "id")
+
+# Contornos semente (lon, lat) por código IBGE, em sentido horário a partir do noroeste
+CONTORNOS_SEMENTE = {
+    # Distrito Federal: retângulo da demarcação, entre os rios Descoberto e Preto
+    5300108: [(-48.285, -15.50), (-47.31, -15.50), (-47.31, -16.05), (-48.285, -16.05)],
+    3550308: [  # São Paulo
+        (-46.80, -23.40), (-46.74, -23.36), (-46.64, -23.36), (-46.57, -23.39), (-46.56, -23.46),
+        (-46.48, -23.50), (-46.37, -23.50), (-46.37, -23.58), (-46.45, -23.62), (-46.57, -23.60),
+        (-46.62, -23.65), (-46.64, -23.75), (-46.60, -23.85), (-46.62, -24.00), (-46.72, -23.96),
+        (-46.78, -23.85), (-46.76, -23.72), (-46.78, -23.64), (-46.75, -23.58), (-46.76, -23.54),
+        (-46.74, -23.50), (-46.80, -23.47),
+    ],
+    3304557: [  # Rio de Janeiro
+        (-43.79, -22.88), (-43.70, -22.84), (-43.55, -22.81), (-43.42, -22.82), (-43.35, -22.81),
+        (-43.28, -22.82), (-43.22, -22.78), (-43.15, -22.80), (-43.15, -22.95), (-43.18, -22.99),
+        (-43.36, -23.02), (-43.56, -23.08), (-43.75, -23.05), (-43.80, -22.97),
+    ],
+}
+
+
+def codigo_feature(feature):
+    """Código IBGE de 7 dígitos nas propriedades (ou no id) da feature"""
+    propriedades = feature.get("properties") or {}
+    for nome in PROPRIEDADES_CODIGO:
+        valor = propriedades.get(nome, feature.get(nome))
+        if valor not in (None, ""):
+            return int(valor)
+    raise ValueError(f"Feature sem código IBGE (propriedades: {sorted(propriedades)})")
+
+
+def aneis_geometria(geometria):
+    """Todos os anéis (externos e buracos) de um Polygon ou MultiPolygon"""
+    if geometria["type"] == "Polygon":
+        return list(geometria["coordinates"])
+    if geometria["type"] == "MultiPolygon":
+        return [anel for poligono in geometria["coordinates"] for anel in poligono]
+    raise ValueError(f"Geometria não suportada: {geometria['type']}")
+
+
+def fechar_anel(vertices):
+    """Anel fechado (1º vértice repetido no fim), como manda o GeoJSON"""
+    vertices = np.asarray(vertices, dtype=np.float64)[:, :2]
+    if not np.array_equal(vertices[0], vertices[-1]):
+        vertices = np.vstack([vertices, vertices[:1]])
+    return vertices
+
+
+def gerar_semente():
+    """Anéis dos contornos semente, ordenados por código"""
+    return [(codigo, fechar_anel(contorno)) for codigo, contorno in sorted(CONTORNOS_SEMENTE.items())]
+
+
+def ler_geojson(caminho_geojson):
+    """Lista de (código IBGE, vértices do anel) ordenada por código"""
+    with open(caminho_geojson, encoding="utf-8-sig") as arquivo:
+        colecao = json.load(arquivo)
+    aneis = []
+    for feature in colecao["features"]:
+        codigo = codigo_feature(feature)
+        for anel in aneis_geometria(feature["geometry"]):
+            vertices = fechar_anel(anel)
+            if len(vertices) >= 4:
+                aneis.append((codigo, vertices))
+    aneis.sort(key=lambda item: item[0])
+    return aneis
+
+
+def gravar_limites(aneis, caminho_limites=ARQUIVO_LIMITES_MUNICIPIOS, caminho_vertices=ARQUIVO_VERTICES_LIMITES):
+    """Grava a tabela de anéis e o vetor de vértices (lon, lat) concatenados"""
+    limites = np.zeros(len(aneis), dtype=DTYPE_LIMITES_MUNICIPIOS)
+    inicio = 0
+    for posicao, (codigo, vertices) in enumerate(aneis):
+        fim = inicio + len(vertices)
+        (lon_min, lat_min), (lon_max, lat_max) = vertices.min(axis=0), vertices.max(axis=0)
+        limites[posicao] = (codigo, inicio, fim, lon_min, lat_min, lon_max, lat_max)
+        inicio = fim
+    os.makedirs(os.path.dirname(caminho_limites), exist_ok=True)
+    np.save(caminho_limites, limites)
+    np.save(caminho_vertices, np.concatenate([vertices for _, vertices in aneis]).astype("<f4"))
+
+
+def main():
+    if len(sys.argv) > 2:
+        print(__doc__)
+        sys.exit(1)
+    aneis = ler_geojson(sys.argv[1]) if len(sys.argv) == 2 else gerar_semente()
+    gravar_limites(aneis)
+    municipios = len({codigo for codigo, _ in aneis})
+    print(f"✅ {municipios} municípios ({len(aneis)} anéis) gravados em {ARQUIVO_LIMITES_MUNICIPIOS}")
+
+
+if __name__ == "__main__":
+    main()
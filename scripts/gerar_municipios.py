@@ -0,0 +1,49 @@
+"""Gera a base compacta de municípios usada pelo Smart Clima
+
+Entrada: CSV com as colunas codigo_ibge, nome, latitude e longitude (por exemplo,
+o municipios.csv do projeto kelvins/municipios-brasileiros, derivado do IBGE).
+
+Uso:
+    python scripts/gerar_municipios.py municipios.csv
+"""
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streamlit_app import ARQUIVO_MUNICIPIOS, ARQUIVO_NOMES_MUNICIPIOS, DTYPE_MUNICIPIOS
+
+
+def ler_municipios(caminho_csv):
+    """Lê o CSV de origem e retorna as linhas ordenadas por código IBGE"""
+    with open(caminho_csv, encoding='utf-8-sig', newline='') as arquivo:
+        linhas = [
+            (int(linha['codigo_ibge']), linha['nome'].strip(), float(linha['latitude']), float(linha['longitude']))
+            for linha in csv.DictReader(arquivo)
+        ]
+    linhas.sort()
+    return linhas
+
+
+def gravar_base(linhas, caminho_registros=ARQUIVO_MUNICIPIOS, caminho_nomes=ARQUIVO_NOMES_MUNICIPIOS):
+    """Grava os registros binários e o arquivo de nomes na mesma ordem"""
+    registros = np.array([(codigo, lat, lon) for codigo, _, lat, lon in linhas], dtype=DTYPE_MUNICIPIOS)
+    os.makedirs(os.path.dirname(caminho_registros), exist_ok=True)
+    np.save(caminho_registros, registros)
+    with open(caminho_nomes, 'w', encoding='utf-8') as arquivo:
+        arquivo.write("\n".join(nome for _, nome, _, _ in linhas) + "\n")
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    linhas = ler_municipios(sys.argv[1])
+    gravar_base(linhas)
+    print(f"✅ {len(linhas)} municípios gravados em {ARQUIVO_MUNICIPIOS}")
+
+
+if __name__ == "__main__":
+    main()
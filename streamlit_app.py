@@ -1,23 +1,35 @@
 import streamlit as st
 import requests
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from http.cookiejar import DefaultCookiePolicy
+from openai import OpenAI, AsyncOpenAI
 import os
+import asyncio
+import hashlib
+import math
+import random
+import contextvars
+from contextlib import contextmanager
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 import re
 import unicodedata
-
-# Configuração da página
-st.set_page_config(
-    page_title="Smart Clima",
-    page_icon="🌡️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+from bisect import bisect_right
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # CSS customizado para UX único
-st.markdown("""
+CSS_APP = """
 <style>
     .main-header {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -87,7 +99,7 @@ st.markdown("""
         border-left: 4px solid #ffeaa7;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # Base de dados de coordenadas das cidades brasileiras
 COORDENADAS_CIDADES = {
@@ -161,6 +173,40 @@ COORDENADAS_ESTADOS = {
     'RO': (-8.7619, -63.9039),
 }
 
+# Código IBGE das unidades da federação (dois primeiros dígitos do código do município)
+UF_POR_CODIGO_IBGE = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL',
+    28: 'SE', 29: 'BA', 31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP', 41: 'PR',
+    42: 'SC', 43: 'RS', 50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF'
+}
+
+# Base de municípios: registros de 12 bytes ordenados por código IBGE + arquivo de nomes
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+ARQUIVO_MUNICIPIOS = os.path.join(DIRETORIO_DADOS, "municipios.npy")
+ARQUIVO_NOMES_MUNICIPIOS = os.path.join(DIRETORIO_DADOS, "municipios_nomes.txt")
+# Municípios do Brasil (IBGE); a base incluída no repositório cobre só as cidades embutidas
+TOTAL_MUNICIPIOS_IBGE = 5570
+DTYPE_MUNICIPIOS = np.dtype([('ibge', '<i4'), ('lat', '<f4'), ('lon', '<f4')])
+
+# Faixas de CEP por município: (CEP inicial, CEP final, código IBGE), ordenadas e sem sobreposição
+ARQUIVO_FAIXAS_CEP = os.path.join(DIRETORIO_DADOS, "faixas_cep.npy")
+DTYPE_FAIXAS_CEP = np.dtype([('inicio', '<u4'), ('fim', '<u4'), ('ibge', '<i4')])
+
+# Limites municipais: anéis de polígonos (código IBGE, faixa de vértices, caixa envolvente) + vértices (lon, lat),
+# cada anel fechado (o 1º vértice repetido no fim)
+ARQUIVO_LIMITES_MUNICIPIOS = os.path.join(DIRETORIO_DADOS, "limites_municipios.npy")
+ARQUIVO_VERTICES_LIMITES = os.path.join(DIRETORIO_DADOS, "limites_vertices.npy")
+DTYPE_LIMITES_MUNICIPIOS = np.dtype([
+    ('ibge', '<i4'), ('inicio', '<i4'), ('fim', '<i4'),
+    ('lon_min', '<f4'), ('lat_min', '<f4'), ('lon_max', '<f4'), ('lat_max', '<f4')
+])
+
+# Normais climatológicas em grade: float16 (lat, lon, mês, horário, variável) + metadados da grade
+ARQUIVO_CLIMATOLOGIA = os.path.join(DIRETORIO_DADOS, "climatologia.npy")
+ARQUIVO_META_CLIMATOLOGIA = os.path.join(DIRETORIO_DADOS, "climatologia.json")
+VARIAVEIS_CLIMATOLOGIA = ("temperatura", "umidade", "vento_kmh")
+
 # Mapeamento de CEP para estados
 CEP_PARA_ESTADO = {
     '01': 'SP', '02': 'SP', '03': 'SP', '04': 'SP', '05': 'SP',
@@ -186,13 +232,354 @@ CEP_PARA_ESTADO = {
     '99': 'RS'
 }
 
-# APIs de CEP para fallback
+# APIs de CEP para fallback (substituíveis pela configuração CEP_APIS, separadas por vírgula)
 CEP_APIS = [
     'https://viacep.com.br/ws/{}/json/',
     'https://brasilapi.com.br/api/cep/v1/{}',
     'https://cep.awesomeapi.com.br/json/{}'
 ]
 
+# Base da WeatherAPI (substituível pela configuração WEATHERAPI_URL)
+WEATHERAPI_URL = "http://api.weatherapi.com/v1"
+
+# Diretório dos caches persistentes (compartilhados entre sessões e processos)
+DIRETORIO_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+def obter_config(nome, padrao):
+    """Lê uma configuração de st.secrets ou variável de ambiente"""
+    try:
+        valor = st.secrets[nome]
+    except:
+        valor = os.environ.get(nome)
+    
+    if valor is None or padrao is None:
+        return valor if valor is not None else padrao
+    if isinstance(padrao, bool):
+        return str(valor).strip().lower() in ("1", "true", "sim", "yes", "on")
+    try:
+        return type(padrao)(valor)
+    except (TypeError, ValueError):
+        return padrao
+
+# Endpoints alternativos (ex.: servidores locais dos benchmarks)
+if obter_config("CEP_APIS", ""):
+    CEP_APIS = [api_url.strip() for api_url in obter_config("CEP_APIS", "").split(",") if api_url.strip()]
+WEATHERAPI_URL = obter_config("WEATHERAPI_URL", WEATHERAPI_URL).rstrip("/")
+
+class CachePersistente:
+    """Cache chave/valor em SQLite com TTL, limite de tamanho (LRU) e cache negativo"""
+    
+    # Só regrava o horário de acesso se o último registro for mais antigo que isso
+    INTERVALO_TOQUE = 60
+    
+    def __init__(self, caminho, tabela, ttl, ttl_negativo=0, max_entradas=10000):
+        self.tabela = tabela
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._escritas = 0
+        self.acertos = 0
+        self.faltas = 0
+        
+        try:
+            if os.path.dirname(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            self._conn = self._conectar(caminho)
+        except (OSError, sqlite3.Error):
+            # Diretório sem permissão de escrita: mantém o cache apenas em memória
+            self._conn = self._conectar(":memory:")
+    
+    def _conectar(self, caminho):
+        conn = sqlite3.connect(caminho, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.tabela} (
+            chave TEXT PRIMARY KEY,
+            valor TEXT,
+            negativo INTEGER NOT NULL DEFAULT 0,
+            expira_em REAL NOT NULL,
+            acessado_em REAL NOT NULL
+        )""")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.tabela}_acesso ON {self.tabela}(acessado_em)")
+        return conn
+    
+    def obter(self, chave):
+        """Retorna (encontrado, valor); valor None indica entrada negativa"""
+        agora = time.time()
+        try:
+            with self._lock:
+                linha = self._conn.execute(
+                    f"SELECT valor, negativo, expira_em, acessado_em FROM {self.tabela} WHERE chave = ?",
+                    (chave,)
+                ).fetchone()
+                if linha is None:
+                    self.faltas += 1
+                    return False, None
+                
+                valor, negativo, expira_em, acessado_em = linha
+                if expira_em <= agora:
+                    self._conn.execute(f"DELETE FROM {self.tabela} WHERE chave = ?", (chave,))
+                    self.faltas += 1
+                    return False, None
+                
+                self.acertos += 1
+                
+                if agora - acessado_em > self.INTERVALO_TOQUE:
+                    self._conn.execute(
+                        f"UPDATE {self.tabela} SET acessado_em = ? WHERE chave = ?", (agora, chave)
+                    )
+        except sqlite3.Error:
+            return False, None
+        
+        if negativo:
+            return True, None
+        return True, json.loads(valor)
+    
+    def guardar(self, chave, valor, ttl=None):
+        """Armazena um valor serializável em JSON (ttl substitui o padrão da tabela)"""
+        self._gravar(chave, json.dumps(valor, ensure_ascii=False), False, self.ttl if ttl is None else ttl)
+    
+    def guardar_negativo(self, chave):
+        """Registra que a chave não existe na origem"""
+        if self.ttl_negativo > 0:
+            self._gravar(chave, None, True, self.ttl_negativo)
+    
+    def _gravar(self, chave, valor, negativo, ttl):
+        agora = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.tabela} (chave, valor, negativo, expira_em, acessado_em) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chave, valor, int(negativo), agora + ttl, agora)
+                )
+                self._escritas += 1
+                if self._escritas % 100 == 0:
+                    self._podar(agora)
+        except sqlite3.Error:
+            pass
+    
+    def estatisticas(self):
+        """Resumo para diagnóstico: entradas, acertos, faltas e taxa de acerto"""
+        try:
+            with self._lock:
+                entradas = self._conn.execute(f"SELECT COUNT(*) FROM {self.tabela}").fetchone()[0]
+        except sqlite3.Error:
+            entradas = 0
+        total = self.acertos + self.faltas
+        return {
+            "entradas": entradas,
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "taxa_acerto": self.acertos / total if total else 0.0
+        }
+    
+    def _podar(self, agora):
+        """Remove entradas expiradas e as menos acessadas acima do limite"""
+        self._conn.execute(f"DELETE FROM {self.tabela} WHERE expira_em <= ?", (agora,))
+        total = self._conn.execute(f"SELECT COUNT(*) FROM {self.tabela}").fetchone()[0]
+        if total > self.max_entradas:
+            # Remove um pouco além do limite para não podar a cada escrita
+            excesso = total - int(self.max_entradas * 0.9)
+            self._conn.execute(
+                f"DELETE FROM {self.tabela} WHERE chave IN "
+                f"(SELECT chave FROM {self.tabela} ORDER BY acessado_em LIMIT ?)",
+                (excesso,)
+            )
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_cep():
+    """Cache de CEPs compartilhado por todas as sessões"""
+    return CachePersistente(
+        caminho=obter_config("CEP_CACHE_PATH", os.path.join(DIRETORIO_CACHE, "cep.sqlite3")),
+        tabela="cep",
+        ttl=obter_config("CEP_CACHE_TTL", 30 * 24 * 3600),
+        ttl_negativo=obter_config("CEP_CACHE_TTL_NEGATIVO", 24 * 3600),
+        max_entradas=obter_config("CEP_CACHE_MAX_ENTRADAS", 50000)
+    )
+
+# Lista que recebe as mensagens de status quando as funções rodam fora da interface
+_coletor_mensagens = contextvars.ContextVar("coletor_mensagens", default=None)
+
+def notificar(nivel, mensagem):
+    """Exibe uma mensagem de status (info/success/warning/error) ou a registra no coletor ativo"""
+    coletor = _coletor_mensagens.get()
+    if coletor is not None:
+        coletor.append({"nivel": nivel, "mensagem": mensagem})
+    else:
+        getattr(st, nivel)(mensagem)
+
+@contextmanager
+def coletar_mensagens():
+    """Captura as mensagens de status em uma lista em vez de exibi-las (uso sem Streamlit)"""
+    mensagens = []
+    token = _coletor_mensagens.set(mensagens)
+    try:
+        yield mensagens
+    finally:
+        _coletor_mensagens.reset(token)
+
+# Limites (em segundos) dos histogramas de latência por etapa
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Resultados que indicam falha ou caminho de fallback, somados no resumo da barra lateral
+RESULTADOS_DEGRADADOS = {
+    "erro", "erro_http", "conexao", "timeout", "circuito_aberto",
+    "nao_encontrado", "capital", "faixa", "regiao", "sede", "fallback", "historico", "climatologia", "regras", "interrompida"
+}
+
+def rotulo_prometheus(valor):
+    """Escapa o valor de um rótulo do Prometheus (barra invertida, aspas e quebra de linha)"""
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class RegistroMetricas:
+    """Histogramas de latência por etapa e resultado, exportados no formato texto do Prometheus"""
+    
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = limites
+        # (etapa, resultado, provedor) -> [contagens por limite..., +Inf], soma
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observar(self, etapa, segundos, resultado="ok", provedor=""):
+        chave = (etapa, resultado, provedor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0]
+            indice = next((i for i, limite in enumerate(self.limites) if segundos <= limite), len(self.limites))
+            serie[0][indice] += 1
+            serie[1] += segundos
+    
+    def _copiar(self):
+        with self._lock:
+            return {chave: (list(contagens), soma) for chave, (contagens, soma) in self._series.items()}
+    
+    def _quantil(self, contagens, q):
+        """Estimativa por interpolação linear dentro do balde, como o histogram_quantile"""
+        total = sum(contagens)
+        alvo, acumulado = q * total, 0
+        for indice, contagem in enumerate(contagens):
+            if contagem and acumulado + contagem >= alvo:
+                if indice == len(self.limites):
+                    return self.limites[-1]
+                inferior = self.limites[indice - 1] if indice else 0.0
+                return inferior + (self.limites[indice] - inferior) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return 0.0
+    
+    def resumo(self):
+        """Por etapa: total, proporção de falhas/fallbacks e p50/p95/p99 estimados em ms"""
+        etapas = {}
+        for (etapa, resultado, _), (contagens, _) in self._copiar().items():
+            item = etapas.setdefault(etapa, {"contagens": [0] * len(contagens), "falhas": 0})
+            item["contagens"] = [a + b for a, b in zip(item["contagens"], contagens)]
+            if resultado in RESULTADOS_DEGRADADOS:
+                item["falhas"] += sum(contagens)
+        resumo = []
+        for etapa, item in sorted(etapas.items()):
+            total = sum(item["contagens"])
+            resumo.append({
+                "etapa": etapa,
+                "total": total,
+                "taxa_degradada": item["falhas"] / total,
+                **{f"p{q}_ms": round(self._quantil(item["contagens"], q / 100) * 1000, 1) for q in (50, 95, 99)}
+            })
+        return resumo
+    
+    def exportar(self, caches=None):
+        """Texto de exposição do Prometheus; caches é {nome: estatisticas()} dos caches a incluir"""
+        linhas = [
+            "# HELP smart_clima_etapa_segundos Duração de cada etapa (CEP, geocodificação, clima, LLM, HTTP)",
+            "# TYPE smart_clima_etapa_segundos histogram"
+        ]
+        for (etapa, resultado, provedor), (contagens, soma) in sorted(self._copiar().items()):
+            rotulos = f'etapa="{rotulo_prometheus(etapa)}",resultado="{rotulo_prometheus(resultado)}"'
+            if provedor:
+                rotulos += f',provedor="{rotulo_prometheus(provedor)}"'
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), contagens):
+                acumulado += contagem
+                linhas.append(f'smart_clima_etapa_segundos_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+            linhas.append(f"smart_clima_etapa_segundos_sum{{{rotulos}}} {soma:.6f}")
+            linhas.append(f"smart_clima_etapa_segundos_count{{{rotulos}}} {acumulado}")
+        
+        if caches:
+            linhas += [
+                "# HELP smart_clima_cache_consultas_total Consultas aos caches por resultado",
+                "# TYPE smart_clima_cache_consultas_total counter"
+            ]
+            for nome, estatisticas in caches.items():
+                nome = rotulo_prometheus(nome)
+                linhas.append(f'smart_clima_cache_consultas_total{{cache="{nome}",resultado="acerto"}} {estatisticas["acertos"]}')
+                linhas.append(f'smart_clima_cache_consultas_total{{cache="{nome}",resultado="falta"}} {estatisticas["faltas"]}')
+            linhas += [
+                "# HELP smart_clima_cache_taxa_acerto Proporção de acertos de cada cache",
+                "# TYPE smart_clima_cache_taxa_acerto gauge"
+            ]
+            for nome, estatisticas in caches.items():
+                linhas.append(f'smart_clima_cache_taxa_acerto{{cache="{rotulo_prometheus(nome)}"}} {estatisticas["taxa_acerto"]:.4f}')
+        
+        return "\n".join(linhas) + "\n"
+
+@st.cache_resource(show_spinner=False)
+def obter_metricas():
+    """Registro de métricas compartilhado pelo processo"""
+    return RegistroMetricas()
+
+@contextmanager
+def medir(etapa, provedor=""):
+    """Mede a duração de uma etapa; o bloco pode trocar etapa_medida["resultado"] (padrão "ok")"""
+    etapa_medida = {"resultado": "ok", "provedor": provedor}
+    inicio = time.perf_counter()
+    try:
+        yield etapa_medida
+    except Exception:
+        etapa_medida["resultado"] = "erro"
+        raise
+    finally:
+        obter_metricas().observar(etapa, time.perf_counter() - inicio, **etapa_medida)
+
+def exportar_metricas():
+    """Métricas do processo, incluindo as taxas de acerto dos caches, no formato do Prometheus"""
+    return obter_metricas().exportar({
+        "cep": obter_cache_cep().estatisticas(),
+        "clima": obter_cache_clima().estatisticas(),
+        "previsao": obter_cache_previsao().estatisticas(),
+        "recomendacoes": obter_cache_recomendacoes().estatisticas()
+    })
+
+class ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = exportar_metricas().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def log_message(self, formato, *args):
+        pass
+
+@st.cache_resource(show_spinner=False)
+def iniciar_servidor_metricas():
+    """Sobe o endpoint /metrics em segundo plano (uma vez por processo; porta 0 desativa)"""
+    porta = obter_config("METRICAS_PORTA", 9464)
+    if not porta:
+        return None
+    try:
+        servidor = ThreadingHTTPServer((obter_config("METRICAS_HOST", "127.0.0.1"), porta), ManipuladorMetricas)
+    except OSError:
+        # Porta ocupada (ex.: outra instância do app): segue sem o endpoint
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
 def normalizar_texto(texto):
     """Remove acentos e normaliza texto para comparação"""
     if not texto:
@@ -202,102 +589,943 @@ def normalizar_texto(texto):
     texto_sem_acento = texto_normalizado.encode('ascii', 'ignore').decode('ascii')
     return texto_sem_acento.lower().strip()
 
+class IndiceCidades:
+    """Índice de cidades construído uma vez, com trie de nomes normalizados
+    
+    Cada nó da trie guarda as primeiras cidades (na ordem da base) que têm uma
+    palavra começando pelo prefixo percorrido, o que permite buscas por prefixo de
+    palavra em O(tamanho da consulta). Trechos no meio de uma palavra ("aulo")
+    ainda são encontrados por varredura, como na busca original.
+    """
+    
+    MAX_SUGESTOES = 10
+    
+    def __init__(self, cidades):
+        self.coordenadas = dict(cidades)
+        self.ordem = {cidade: i for i, cidade in enumerate(self.coordenadas)}
+        self.exatos = {cidade.strip(): cidade for cidade in self.coordenadas}
+        self.normalizados = {}
+        self.nomes = [(normalizar_texto(cidade), cidade) for cidade in self.coordenadas]
+        # Nó da trie: [filhos, candidatos, cidade cujo nome completo termina aqui]
+        self.raiz = [{}, [], None]
+        
+        for nome, cidade in self.nomes:
+            self.normalizados.setdefault(nome, cidade)
+            for inicio in self._inicios_de_palavra(nome):
+                no = self.raiz
+                for caractere in nome[inicio:]:
+                    no = no[0].setdefault(caractere, [{}, [], None])
+                    if len(no[1]) < self.MAX_SUGESTOES and cidade not in no[1]:
+                        no[1].append(cidade)
+                if inicio == 0 and no[2] is None:
+                    no[2] = cidade
+    
+    @staticmethod
+    def _inicios_de_palavra(texto):
+        return [i for i in range(len(texto)) if i == 0 or texto[i - 1] == ' ']
+    
+    def _no_do_prefixo(self, prefixo):
+        no = self.raiz
+        for caractere in prefixo:
+            no = no[0].get(caractere)
+            if no is None:
+                return None
+        return no
+    
+    def localizar(self, nome_cidade):
+        """Retorna (cidade, coordenadas, tipo_de_busca) ou None, sem efeitos na interface"""
+        if not nome_cidade:
+            return None
+        
+        # 1. Busca exata
+        cidade = self.exatos.get(nome_cidade.strip())
+        if cidade:
+            return cidade, self.coordenadas[cidade], "exata"
+        
+        nome_normalizado = normalizar_texto(nome_cidade)
+        if not nome_normalizado:
+            return None
+        
+        # 2. Busca sem acentos
+        cidade = self.normalizados.get(nome_normalizado)
+        if cidade:
+            return cidade, self.coordenadas[cidade], "sem acentos"
+        
+        # 3. Busca por prefixo de palavra (substring)
+        no = self._no_do_prefixo(nome_normalizado)
+        if no and no[1]:
+            cidade = no[1][0]
+            return cidade, self.coordenadas[cidade], "substring"
+        
+        # 3b. Substring no meio de uma palavra, fora do alcance da trie
+        cidade = next((cidade for nome, cidade in self.nomes if nome_normalizado in nome), None)
+        if cidade:
+            return cidade, self.coordenadas[cidade], "substring"
+        
+        # 4. Busca reversa (nome de cidade contido na consulta)
+        encontradas = []
+        for inicio in self._inicios_de_palavra(nome_normalizado):
+            no = self.raiz
+            for caractere in nome_normalizado[inicio:]:
+                no = no[0].get(caractere)
+                if no is None:
+                    break
+                if no[2]:
+                    encontradas.append(no[2])
+        if encontradas:
+            cidade = min(encontradas, key=self.ordem.get)
+            return cidade, self.coordenadas[cidade], "reversa"
+        
+        return None
+    
+    def sugerir(self, prefixo, limite=MAX_SUGESTOES):
+        """Cidades com alguma palavra começando pelo prefixo, para autocompletar"""
+        prefixo = normalizar_texto(prefixo)
+        if not prefixo:
+            return []
+        no = self._no_do_prefixo(prefixo)
+        return list(no[1][:limite]) if no else []
+
+@st.cache_resource(show_spinner=False)
+def obter_indice_cidades():
+    """Índice de cidades compartilhado, construído uma única vez por processo"""
+    return IndiceCidades(COORDENADAS_CIDADES)
+
+def localizar_cidade(nome_cidade):
+    """Busca pura de coordenadas por nome: (cidade, coordenadas, tipo_de_busca) ou None"""
+    return obter_indice_cidades().localizar(nome_cidade)
+
 def buscar_coordenadas_por_nome(nome_cidade):
     """Busca coordenadas por nome da cidade com algoritmo robusto"""
     if not nome_cidade:
         return None
     
     # Debug
-    st.info(f"🔍 Buscando coordenadas para: '{nome_cidade}'")
-    
-    # Normaliza o nome de entrada
-    nome_normalizado = normalizar_texto(nome_cidade)
-    
-    # 1. Busca exata primeiro
-    for cidade, coords in COORDENADAS_CIDADES.items():
-        if nome_cidade.strip() == cidade.strip():
-            st.success(f"✅ Encontrou cidade exata: {cidade}")
-            return coords
-    
-    # 2. Busca sem acentos
-    for cidade, coords in COORDENADAS_CIDADES.items():
-        if nome_normalizado == normalizar_texto(cidade):
-            st.success(f"✅ Encontrou cidade (sem acentos): {cidade}")
-            return coords
-    
-    # 3. Busca por substring
-    for cidade, coords in COORDENADAS_CIDADES.items():
-        if nome_normalizado in normalizar_texto(cidade):
-            st.success(f"✅ Encontrou cidade (substring): {cidade}")
-            return coords
-    
-    # 4. Busca reversa (nome contido na cidade)
-    for cidade, coords in COORDENADAS_CIDADES.items():
-        if normalizar_texto(cidade) in nome_normalizado:
-            st.success(f"✅ Encontrou cidade (reversa): {cidade}")
-            return coords
+    notificar("info", f"🔍 Buscando coordenadas para: '{nome_cidade}'")
+    
+    with medir("geocodificacao", "indice_cidades") as etapa:
+        resultado = localizar_cidade(nome_cidade)
+        if not resultado:
+            etapa["resultado"] = "nao_encontrado"
+    if resultado:
+        cidade, coords, tipo = resultado
+        if tipo == "exata":
+            notificar("success", f"✅ Encontrou cidade exata: {cidade}")
+        else:
+            notificar("success", f"✅ Encontrou cidade ({tipo}): {cidade}")
+        return coords
     
     # Se não encontrou, retorna None
-    st.warning(f"⚠️ Cidade '{nome_cidade}' não encontrada")
+    notificar("warning", f"⚠️ Cidade '{nome_cidade}' não encontrada")
     return None
 
-def test_connectivity():
-    """Testa conectividade básica"""
-    test_urls = [
-        "https://httpbin.org/status/200",
-        "https://www.google.com",
-        "https://api.github.com"
-    ]
+def chave_municipio(nome):
+    """Normaliza nome de município ignorando acentos, hífens e apóstrofos"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", normalizar_texto(nome)).split())
+
+class BaseMunicipios:
+    """Municípios do IBGE (código, nome, UF, lat/lon) carregados de arquivo compacto
+    
+    Os registros ficam mapeados em memória (np.load com mmap_mode) e apenas o
+    índice nome+UF -> linha é mantido em dicionário.
+    """
+    
+    def __init__(self, caminho_registros, caminho_nomes):
+        self.registros = np.load(caminho_registros, mmap_mode='r')
+        self.codigos = np.asarray(self.registros['ibge'])
+        with open(caminho_nomes, encoding='utf-8') as arquivo:
+            self.nomes = arquivo.read().splitlines()
+        
+        self.indice = {}
+        for linha, (nome, codigo) in enumerate(zip(self.nomes, self.codigos.tolist())):
+            uf = UF_POR_CODIGO_IBGE.get(codigo // 100000, '')
+            self.indice.setdefault((chave_municipio(nome), uf), linha)
+    
+    def __len__(self):
+        return len(self.nomes)
     
-    working_urls = []
-    for url in test_urls:
+    def _municipio(self, linha):
+        registro = self.registros[linha]
+        codigo = int(registro['ibge'])
+        return {
+            'codigo_ibge': codigo,
+            'nome': self.nomes[linha],
+            'uf': UF_POR_CODIGO_IBGE.get(codigo // 100000, ''),
+            'lat': round(float(registro['lat']), 4),
+            'lon': round(float(registro['lon']), 4)
+        }
+    
+    def por_codigo(self, codigo_ibge):
+        """Busca binária pelo código IBGE"""
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                working_urls.append(url)
-        except:
-            continue
+            codigo = int(codigo_ibge)
+        except (TypeError, ValueError):
+            return None
+        linha = int(np.searchsorted(self.codigos, codigo))
+        if linha < len(self.codigos) and self.codigos[linha] == codigo:
+            return self._municipio(linha)
+        return None
+    
+    def por_nome(self, nome, uf):
+        """Busca pelo nome normalizado e UF"""
+        linha = self.indice.get((chave_municipio(nome), (uf or '').upper()))
+        return self._municipio(linha) if linha is not None else None
+
+@st.cache_resource(show_spinner=False)
+def obter_base_municipios():
+    """Carrega a base de municípios no primeiro uso (None se os arquivos não existirem)"""
+    try:
+        return BaseMunicipios(ARQUIVO_MUNICIPIOS, ARQUIVO_NOMES_MUNICIPIOS)
+    except (OSError, ValueError):
+        return None
+
+def localizar_municipio(nome, uf, codigo_ibge=None):
+    """Coordenadas reais de um município pelo código IBGE ou nome+UF, sem rede"""
+    base = obter_base_municipios()
+    if base is None:
+        return None
+    with medir("geocodificacao", "ibge") as etapa:
+        municipio = base.por_codigo(codigo_ibge) if codigo_ibge else None
+        municipio = municipio or base.por_nome(nome, uf)
+        if not municipio:
+            etapa["resultado"] = "nao_encontrado"
+    return municipio
+
+class IndiceFaixasCep:
+    """Tabela ordenada de faixas de CEP -> município, consultada por busca binária"""
+    
+    def __init__(self, caminho):
+        faixas = np.load(caminho, mmap_mode='r')
+        self.inicios = np.asarray(faixas['inicio'])
+        self.fins = np.asarray(faixas['fim'])
+        self.codigos = np.asarray(faixas['ibge'])
+    
+    def __len__(self):
+        return len(self.inicios)
+    
+    def codigo_ibge(self, cep_clean):
+        """Código IBGE do município do CEP (8 dígitos) ou None se fora das faixas"""
+        cep_numero = int(cep_clean)
+        posicao = int(np.searchsorted(self.inicios, cep_numero, side='right')) - 1
+        if posicao >= 0 and cep_numero <= self.fins[posicao]:
+            return int(self.codigos[posicao])
+        return None
+
+@st.cache_resource(show_spinner=False)
+def obter_indice_faixas_cep():
+    """Carrega as faixas de CEP no primeiro uso (None se o arquivo não existir)"""
+    try:
+        return IndiceFaixasCep(ARQUIVO_FAIXAS_CEP)
+    except (OSError, ValueError):
+        return None
+
+def localizar_municipio_por_cep(cep_clean):
+    """Município do CEP pela tabela offline de faixas, sem rede"""
+    indice = obter_indice_faixas_cep()
+    base = obter_base_municipios()
+    if indice is None or base is None:
+        return None
+    codigo = indice.codigo_ibge(cep_clean)
+    return base.por_codigo(codigo) if codigo else None
+
+class IndiceGrade:
+    """Índice espacial em grade regular: célula -> itens cuja caixa envolvente a toca
+    
+    As listas por célula ficam concatenadas em um único vetor (formato CSR), com
+    o deslocamento de cada célula em `inicio`.
+    """
+    
+    def __init__(self, lon_min, lat_min, lon_max, lat_max, passo):
+        self.passo = passo
+        self.lon_inicial = float(np.min(lon_min))
+        self.lat_inicial = float(np.min(lat_min))
+        self.colunas = int((float(np.max(lon_max)) - self.lon_inicial) // passo) + 1
+        self.linhas = int((float(np.max(lat_max)) - self.lat_inicial) // passo) + 1
+        
+        coluna_min, coluna_max = self._coluna(lon_min), self._coluna(lon_max)
+        linha_min, linha_max = self._linha(lat_min), self._linha(lat_max)
+        larguras = coluna_max - coluna_min + 1
+        quantidades = larguras * (linha_max - linha_min + 1)
+        
+        # Uma entrada (célula, item) para cada célula coberta pela caixa do item
+        itens = np.repeat(np.arange(len(quantidades)), quantidades)
+        deslocamentos = np.arange(int(quantidades.sum())) - np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+        larguras = np.repeat(larguras, quantidades)
+        celulas = (np.repeat(linha_min, quantidades) + deslocamentos // larguras) * self.colunas
+        celulas += np.repeat(coluna_min, quantidades) + deslocamentos % larguras
+        
+        ordem = np.argsort(celulas, kind='stable')
+        self.itens = itens[ordem]
+        self.inicio = np.searchsorted(celulas[ordem], np.arange(self.linhas * self.colunas + 1))
+    
+    def _coluna(self, lon):
+        return np.clip(((np.asarray(lon, dtype=np.float64) - self.lon_inicial) // self.passo).astype(np.int64), 0, self.colunas - 1)
+    
+    def _linha(self, lat):
+        return np.clip(((np.asarray(lat, dtype=np.float64) - self.lat_inicial) // self.passo).astype(np.int64), 0, self.linhas - 1)
+    
+    def celulas(self, latitudes, longitudes):
+        """Célula de cada ponto (-1 fora da grade)"""
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        dentro = (
+            (latitudes >= self.lat_inicial) & (latitudes < self.lat_inicial + self.linhas * self.passo) &
+            (longitudes >= self.lon_inicial) & (longitudes < self.lon_inicial + self.colunas * self.passo)
+        )
+        return np.where(dentro, self._linha(latitudes) * self.colunas + self._coluna(longitudes), -1)
+    
+    def celula(self, latitude, longitude):
+        """Célula de um ponto (-1 fora da grade)"""
+        linha = int((latitude - self.lat_inicial) // self.passo)
+        coluna = int((longitude - self.lon_inicial) // self.passo)
+        if 0 <= linha < self.linhas and 0 <= coluna < self.colunas:
+            return linha * self.colunas + coluna
+        return -1
+    
+    def candidatos(self, celula):
+        return self.itens[self.inicio[celula]:self.inicio[celula + 1]]
+
+def pontos_no_anel(vertices, longitudes, latitudes):
+    """Teste de paridade (ray casting) de vários pontos contra um anel fechado de vértices (lon, lat)"""
+    vertices = vertices.astype(np.float64)
+    x1, y1 = vertices[:-1, 0], vertices[:-1, 1]
+    x2, y2 = vertices[1:, 0], vertices[1:, 1]
+    px = np.asarray(longitudes, dtype=np.float64)[:, None]
+    py = np.asarray(latitudes, dtype=np.float64)[:, None]
+    cruza = (y1 > py) != (y2 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cruzamento = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(cruza & (px < x_cruzamento), axis=1) % 2 == 1
+
+class GeocodificadorReverso:
+    """Coordenada -> município e UF, sem rede
+    
+    Com os limites municipais (anéis de polígonos mapeados em memória), o ponto
+    é testado só contra os anéis indexados na sua célula da grade; anéis do mesmo
+    município se combinam por paridade, o que trata buracos e ilhas. Municípios
+    sem limites no arquivo (todos, sem o arquivo) caem na sede mais próxima a até
+    `distancia_maxima_km`, marcada como aproximada.
+    """
+    
+    def __init__(self, base, limites=None, vertices=None, passo=0.25, distancia_maxima_km=30.0):
+        self.base = base
+        self.distancia_maxima_km = distancia_maxima_km
+        
+        self.indice_limites = None
+        sem_limites = np.ones(len(base.codigos), dtype=bool)
+        if limites is not None and len(limites):
+            # ndarray comum sobre o mesmo mapeamento: fatiar np.memmap custa caro por consulta
+            self.vertices = np.asarray(vertices)
+            self.aneis_ibge = np.asarray(limites['ibge'])
+            self.aneis_inicio = np.asarray(limites['inicio'])
+            self.aneis_fim = np.asarray(limites['fim'])
+            self.caixas = np.stack([np.asarray(limites[campo], dtype=np.float64)
+                                    for campo in ('lon_min', 'lat_min', 'lon_max', 'lat_max')], axis=1)
+            self.indice_limites = IndiceGrade(*self.caixas.T, passo)
+            sem_limites = ~np.isin(base.codigos, self.aneis_ibge)
+        
+        # Só as sedes de municípios sem limites entram no fallback; cada uma nas células a até
+        # `distancia_maxima_km` dela, então uma consulta só mede as sedes da célula do ponto
+        self.sedes = np.flatnonzero(sem_limites)
+        self.sedes_lat = np.asarray(base.registros['lat'], dtype=np.float64)[self.sedes]
+        self.sedes_lon = np.asarray(base.registros['lon'], dtype=np.float64)[self.sedes]
+        self.indice_sedes = None
+        if len(self.sedes):
+            margem_lat = distancia_maxima_km / 111.2
+            margem_lon = margem_lat / np.maximum(np.cos(np.radians(np.abs(self.sedes_lat) + margem_lat)), 0.1)
+            self.indice_sedes = IndiceGrade(
+                self.sedes_lon - margem_lon, self.sedes_lat - margem_lat,
+                self.sedes_lon + margem_lon, self.sedes_lat + margem_lat, passo
+            )
+    
+    def _codigos_por_limites(self, latitudes, longitudes, celula):
+        """Código IBGE de cada ponto da mesma célula pelos polígonos (0 se nenhum contém)"""
+        paridades = {}
+        for anel in self.indice_limites.candidatos(celula):
+            lon_min, lat_min, lon_max, lat_max = self.caixas[anel]
+            na_caixa = (longitudes >= lon_min) & (longitudes <= lon_max) & (latitudes >= lat_min) & (latitudes <= lat_max)
+            if not na_caixa.any():
+                continue
+            vertices = self.vertices[self.aneis_inicio[anel]:self.aneis_fim[anel]]
+            paridade = paridades.setdefault(int(self.aneis_ibge[anel]), np.zeros(len(latitudes), dtype=bool))
+            paridade[na_caixa] ^= pontos_no_anel(vertices, longitudes[na_caixa], latitudes[na_caixa])
+        
+        codigos = np.zeros(len(latitudes), dtype=np.int64)
+        for codigo, paridade in paridades.items():
+            codigos[paridade & (codigos == 0)] = codigo
+        return codigos
+    
+    def _codigo_por_limites(self, latitude, longitude, celula):
+        """Versão de um ponto de _codigos_por_limites: só os anéis cuja caixa contém o ponto"""
+        candidatos = self.indice_limites.candidatos(celula)
+        caixas = self.caixas[candidatos]
+        candidatos = candidatos[
+            (caixas[:, 0] <= longitude) & (longitude <= caixas[:, 2]) & (caixas[:, 1] <= latitude) & (latitude <= caixas[:, 3])
+        ]
+        paridades = {}
+        for anel in candidatos.tolist():
+            vertices = self.vertices[self.aneis_inicio[anel]:self.aneis_fim[anel]]
+            if pontos_no_anel(vertices, (longitude,), (latitude,))[0]:
+                codigo = int(self.aneis_ibge[anel])
+                paridades[codigo] = not paridades.get(codigo, False)
+        return next((codigo for codigo, dentro in paridades.items() if dentro), 0)
+    
+    def _sedes_proximas(self, latitudes, longitudes, celula):
+        """Linha na base e distância (km) da sede mais próxima de cada ponto da mesma célula"""
+        linhas = np.full(len(latitudes), -1, dtype=np.int64)
+        distancias = np.full(len(latitudes), np.nan)
+        candidatos = self.indice_sedes.candidatos(celula)
+        if len(candidatos) == 0:
+            return linhas, distancias
+        
+        escala = np.cos(np.radians(latitudes))[:, None]
+        distancias_candidatos = 111.2 * np.hypot(
+            self.sedes_lat[candidatos] - latitudes[:, None],
+            (self.sedes_lon[candidatos] - longitudes[:, None]) * escala
+        )
+        mais_proxima = distancias_candidatos.argmin(axis=1)
+        distancias_minimas = distancias_candidatos[np.arange(len(latitudes)), mais_proxima]
+        perto = distancias_minimas <= self.distancia_maxima_km
+        linhas[perto] = self.sedes[candidatos[mais_proxima[perto]]]
+        distancias[perto] = distancias_minimas[perto]
+        return linhas, distancias
+    
+    def localizar_lote(self, latitudes, longitudes):
+        """Município de muitos pontos de uma vez (ex.: trajetos de GPS)
+        
+        Retorna dois vetores alinhados com a entrada: o código IBGE (0 se nenhum
+        município foi encontrado) e a distância em km até a sede quando a resposta
+        é aproximada (0 dentro dos limites, NaN sem município).
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64).ravel()
+        longitudes = np.asarray(longitudes, dtype=np.float64).ravel()
+        codigos = np.zeros(len(latitudes), dtype=np.int64)
+        distancias = np.full(len(latitudes), np.nan)
+        
+        # Pontos agrupados por célula: cada grupo consulta os candidatos da célula uma só vez
+        if self.indice_limites is not None:
+            for celula, pontos in self._agrupar(self.indice_limites.celulas(latitudes, longitudes)):
+                codigos[pontos] = self._codigos_por_limites(latitudes[pontos], longitudes[pontos], celula)
+            distancias[codigos != 0] = 0.0
+        
+        if self.indice_sedes is None:
+            return codigos, distancias
+        restantes = np.flatnonzero(codigos == 0)
+        celulas = self.indice_sedes.celulas(latitudes[restantes], longitudes[restantes])
+        for celula, grupo in self._agrupar(celulas):
+            pontos = restantes[grupo]
+            linhas, distancias_grupo = self._sedes_proximas(latitudes[pontos], longitudes[pontos], celula)
+            encontrados = linhas >= 0
+            codigos[pontos[encontrados]] = self.base.codigos[linhas[encontrados]]
+            distancias[pontos] = distancias_grupo
+        return codigos, distancias
+    
+    @staticmethod
+    def _agrupar(celulas):
+        """(célula, índices dos pontos) para cada célula válida"""
+        ordem = np.argsort(celulas, kind='stable')
+        valores, inicios = np.unique(celulas[ordem], return_index=True)
+        for celula, pontos in zip(valores.tolist(), np.split(ordem, inicios[1:])):
+            if celula >= 0:
+                yield celula, pontos
+    
+    def localizar(self, latitude, longitude):
+        """Município do ponto (dict como BaseMunicipios, + aproximado/distancia_km) ou None"""
+        codigo, distancia = 0, 0.0
+        if self.indice_limites is not None:
+            celula = self.indice_limites.celula(latitude, longitude)
+            if celula >= 0:
+                codigo = self._codigo_por_limites(latitude, longitude, celula)
+        
+        if not codigo:
+            celula = self.indice_sedes.celula(latitude, longitude) if self.indice_sedes is not None else -1
+            if celula < 0:
+                return None
+            linhas, distancias = self._sedes_proximas(np.array([latitude]), np.array([longitude]), celula)
+            if linhas[0] < 0:
+                return None
+            codigo, distancia = int(self.base.codigos[linhas[0]]), float(distancias[0])
+        
+        municipio = self.base.por_codigo(codigo) or {
+            'codigo_ibge': codigo, 'nome': None, 'uf': UF_POR_CODIGO_IBGE.get(codigo // 100000, '')
+        }
+        municipio.update({'aproximado': distancia > 0, 'distancia_km': round(distancia, 1)})
+        return municipio
+
+@st.cache_resource(show_spinner=False)
+def obter_geocodificador_reverso():
+    """Carrega o geocodificador reverso no primeiro uso (None sem a base de municípios)
+    
+    Os limites municipais são opcionais: sem eles, só a sede mais próxima.
+    """
+    base = obter_base_municipios()
+    if base is None:
+        return None
+    try:
+        limites = np.load(ARQUIVO_LIMITES_MUNICIPIOS, mmap_mode='r')
+        vertices = np.load(ARQUIVO_VERTICES_LIMITES, mmap_mode='r')
+    except (OSError, ValueError):
+        limites = vertices = None
+    return GeocodificadorReverso(
+        base, limites, vertices,
+        passo=obter_config("GEOCODIFICACAO_REVERSA_PASSO", 0.25),
+        distancia_maxima_km=obter_config("GEOCODIFICACAO_REVERSA_DISTANCIA_KM", 30.0)
+    )
+
+def municipio_por_coordenadas(latitude, longitude):
+    """Município e UF de uma coordenada pelos limites municipais ou pela sede mais próxima, sem rede"""
+    geocodificador = obter_geocodificador_reverso()
+    if geocodificador is None:
+        return None
+    with medir("geocodificacao_reversa", "ibge") as etapa:
+        municipio = geocodificador.localizar(latitude, longitude)
+        if not municipio:
+            etapa["resultado"] = "nao_encontrado"
+        elif municipio["aproximado"]:
+            etapa["resultado"] = "sede"
+    return municipio
+
+def municipios_por_coordenadas(pontos):
+    """Município de cada (lat, lon) de uma vez, na ordem de `pontos` (None onde não houver)"""
+    geocodificador = obter_geocodificador_reverso()
+    if geocodificador is None or not pontos:
+        return [None] * len(pontos)
+    latitudes, longitudes = zip(*pontos)
+    with medir("geocodificacao_reversa_lote", "ibge"):
+        codigos, distancias = geocodificador.localizar_lote(latitudes, longitudes)
+    
+    por_codigo = {}
+    for codigo in set(codigos.tolist()) - {0}:
+        por_codigo[codigo] = geocodificador.base.por_codigo(codigo) or {
+            'codigo_ibge': codigo, 'nome': None, 'uf': UF_POR_CODIGO_IBGE.get(codigo // 100000, '')
+        }
+    return [
+        dict(por_codigo[codigo], aproximado=distancia > 0, distancia_km=round(distancia, 1)) if codigo else None
+        for codigo, distancia in zip(codigos.tolist(), distancias.tolist())
+    ]
+
+def nome_municipio(municipio):
+    """'Cidade - UF' (ou 'perto de Cidade - UF' quando só a sede mais próxima foi usada)"""
+    nome = " - ".join(parte for parte in (municipio.get('nome'), municipio.get('uf')) if parte)
+    return f"perto de {nome}" if municipio.get('aproximado') else nome
+
+# Cabeçalhos enviados em todas as requisições
+HEADERS_PADRAO = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+@st.cache_resource(show_spinner=False)
+def obter_sessao_http(verificar_ssl=True):
+    """Sessão HTTP compartilhada, com pool de conexões keep-alive por host
+    
+    As novas tentativas ficam a cargo do urllib3 e, com HTTP_BACKOFF = 0 (padrão),
+    acontecem imediatamente, sem dormir na thread do script.
+    """
+    tentativas = max(0, obter_config("HTTP_TENTATIVAS", 2) - 1)
+    retry = Retry(
+        total=tentativas,
+        connect=tentativas,
+        read=tentativas,
+        status=0,
+        backoff_factor=obter_config("HTTP_BACKOFF", 0.0),
+        raise_on_status=False
+    )
+    adaptador = HTTPAdapter(
+        pool_connections=obter_config("HTTP_POOL_HOSTS", 16),
+        pool_maxsize=obter_config("HTTP_POOL_TAMANHO", 32),
+        max_retries=retry
+    )
     
-    return len(working_urls) > 0, working_urls
+    sessao = requests.Session()
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    sessao.headers.update(HEADERS_PADRAO)
+    sessao.verify = verificar_ssl
+    # Sem cookies a sessão não guarda estado e pode ser usada por várias threads
+    sessao.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return sessao
 
-def safe_request(url, timeout=10, max_retries=2):
-    """Faz requisição HTTP com tratamento de erro"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+def timeout_padrao():
+    """Timeouts (conexão, leitura) configurados para as requisições"""
+    return (
+        obter_config("HTTP_TIMEOUT_CONEXAO", 3.05),
+        obter_config("HTTP_TIMEOUT_LEITURA", 10.0)
+    )
+
+def sondas_conectividade():
+    """(nome, url, cabeçalhos) das dependências externas do app: cada API de CEP, WeatherAPI e OpenAI
+    
+    Qualquer resposta HTTP mostra que há conexão; 4xx costuma indicar chave
+    ausente ou inválida e 5xx, o serviço fora do ar.
+    """
+    openai_key, weather_key = get_api_keys()
+    sondas = [(nome_provedor(api_url), api_url.format("01310100"), {}) for api_url in CEP_APIS]
+    sondas.append((
+        "weatherapi",
+        f"{WEATHERAPI_URL}/current.json?key={weather_key or ''}&q=-23.55,-46.63&aqi=no",
+        {}
+    ))
+    base_openai = (obter_config("OPENAI_BASE_URL", None) or "https://api.openai.com/v1").rstrip("/")
+    sondas.append((
+        "openai",
+        f"{base_openai}/models",
+        {"Authorization": f"Bearer {openai_key}"} if openai_key else {}
+    ))
+    return sondas
+
+def sondar(nome, url, cabecalhos, timeout):
+    """Uma requisição direta (sem disjuntor nem limitador), medindo a latência"""
+    inicio = time.perf_counter()
+    try:
+        response = obter_sessao_http().get(url, headers=cabecalhos, timeout=timeout)
+        status = response.status_code
+        estado = "ok" if status < 400 else "erro_http" if status < 500 else "indisponivel"
+    except requests.exceptions.Timeout:
+        estado, status = "timeout", None
+    except requests.exceptions.RequestException:
+        estado, status = "conexao", None
+    return {
+        "nome": nome,
+        "host": urlparse(url).hostname,
+        "estado": estado,
+        "status": status,
+        "latencia_ms": round((time.perf_counter() - inicio) * 1000, 1)
     }
+
+class DiagnosticoConectividade:
+    """Estado das dependências externas, compartilhado entre sessões com TTL curto
+    
+    Todas as sondas saem em paralelo e a verificação termina quando a última
+    responde ou quando o prazo acaba (as que não responderam contam como
+    timeout). Sessões simultâneas esperam a mesma verificação em vez de repeti-la.
+    Com `intervalo` > 0, uma thread de apoio refaz a verificação periodicamente.
+    """
+    
+    def __init__(self, ttl, timeout, intervalo=0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.intervalo = intervalo
+        self._estado = None
+        # Um lock para a verificação (pode levar até `timeout`) e outro só para iniciar a thread
+        self._lock = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self._thread = None
     
-    for attempt in range(max_retries):
+    def verificar(self):
+        """Sonda todas as dependências agora e guarda o resultado"""
+        sondas = sondas_conectividade()
+        inicio = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(sondas), thread_name_prefix="diagnostico")
         try:
-            response = requests.get(url, timeout=timeout, headers=headers)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.SSLError:
+            futuros = [executor.submit(sondar, nome, url, cabecalhos, self.timeout) for nome, url, cabecalhos in sondas]
+            feitos, _ = wait(futuros, timeout=self.timeout)
+        finally:
+            # As sondas atrasadas terminam sozinhas pelo timeout da requisição
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        resultados = []
+        for (nome, url, _), futuro in zip(sondas, futuros):
+            if futuro in feitos:
+                resultados.append(futuro.result())
+            else:
+                resultados.append({
+                    "nome": nome, "host": urlparse(url).hostname, "estado": "timeout",
+                    "status": None, "latencia_ms": round(self.timeout * 1000, 1)
+                })
+        estado = {
+            "conectado": any(r["status"] is not None for r in resultados),
+            "sondas": resultados,
+            "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "verificado_em": time.time()
+        }
+        self._estado = estado
+        return estado
+    
+    def obter(self, forcar=False):
+        """Último estado se ainda dentro do TTL; senão verifica (uma verificação por vez)"""
+        estado = self._estado
+        if not forcar and estado and time.time() - estado["verificado_em"] < self.ttl:
+            return estado
+        with self._lock:
+            # Outra sessão pode ter acabado de verificar enquanto esta esperava
+            estado = self._estado
+            if not forcar and estado and time.time() - estado["verificado_em"] < self.ttl:
+                return estado
+            with medir("diagnostico"):
+                return self.verificar()
+    
+    def _executar(self):
+        while True:
             try:
-                response = requests.get(url, timeout=timeout, headers=headers, verify=False)
-                response.raise_for_status()
-                return response
-            except:
-                continue
-        except requests.exceptions.ConnectionError:
-            if attempt < max_retries - 1:
-                st.warning(f"🔄 Tentativa {attempt + 1} falhou. Tentando novamente...")
-                time.sleep(2)
-                continue
+                self.obter(forcar=True)
+            except Exception:
+                pass
+            time.sleep(self.intervalo)
+    
+    def iniciar(self):
+        """Liga a atualização periódica (uma vez); chamado a cada execução do script, não espera verificações"""
+        if self._thread is not None or self.intervalo <= 0:
+            return self
+        with self._lock_thread:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name="diagnostico", daemon=True)
+                self._thread.start()
+        return self
+
+@st.cache_resource(show_spinner=False)
+def obter_diagnostico_conectividade():
+    """Diagnóstico de conectividade do processo (DIAGNOSTICO_INTERVALO > 0 liga a atualização em segundo plano)"""
+    return DiagnosticoConectividade(
+        ttl=obter_config("DIAGNOSTICO_TTL", 60),
+        timeout=obter_config("DIAGNOSTICO_TIMEOUT", 3.0),
+        intervalo=obter_config("DIAGNOSTICO_INTERVALO", 0)
+    )
+
+class LimitadorTaxa:
+    """Limita as requisições a um host a `por_segundo`, permitindo rajadas de até `rajada`"""
+    
+    def __init__(self, por_segundo, rajada=1):
+        self.intervalo = 1.0 / por_segundo
+        self.rajada = rajada
+        self._lock = threading.Lock()
+        self._proximo = time.monotonic()
+    
+    def aguardar(self, parar=None):
+        """Bloqueia a thread atual até haver vaga para a próxima requisição (ou até `parar`)"""
+        with self._lock:
+            agora = time.monotonic()
+            # O crédito acumulado em períodos ociosos não passa do tamanho da rajada
+            self._proximo = max(self._proximo, agora - (self.rajada - 1) * self.intervalo)
+            espera = self._proximo - agora
+            self._proximo += self.intervalo
+        if espera > 0:
+            if parar is not None:
+                parar.wait(espera)
             else:
-                st.error(f"🔌 Erro de conexão após {max_retries} tentativas")
-                return None
-        except requests.exceptions.Timeout:
-            if attempt < max_retries - 1:
-                st.warning(f"⏱️ Timeout na tentativa {attempt + 1}. Tentando novamente...")
-                time.sleep(1)
-                continue
+                time.sleep(espera)
+
+@st.cache_resource(show_spinner=False)
+def obter_limites_taxa():
+    """Limitadores por host (vazio por padrão; o modo em lote configura os seus)"""
+    return {}
+
+def definir_limite_taxa(host, por_segundo, rajada=1):
+    """Limita as requisições feitas por safe_request a um host"""
+    obter_limites_taxa()[host] = LimitadorTaxa(por_segundo, rajada)
+
+def nome_provedor(url):
+    """Identifica o provedor de uma URL (viacep, brasilapi, awesomeapi, weatherapi...) ou o host"""
+    for nome in ("viacep", "brasilapi", "awesomeapi", "weatherapi", "openai"):
+        if nome in url:
+            return nome
+    return urlparse(url).hostname or url
+
+class SaudeProvedor:
+    """Saúde de um provedor: latência e taxa de erro (EWMA) e disjuntor (circuit breaker)
+    
+    fechado: requisições normais. aberto: requisições puladas até passar o tempo de
+    espera. meio-aberto: uma única requisição de teste decide se o circuito fecha ou
+    volta a abrir.
+    """
+    
+    def __init__(self, nome, alfa=0.2, limite_falhas=5, limite_taxa_erro=0.5, tempo_aberto=30.0):
+        self.nome = nome
+        self.alfa = alfa
+        self.limite_falhas = limite_falhas
+        self.limite_taxa_erro = limite_taxa_erro
+        self.tempo_aberto = tempo_aberto
+        self.estado = "fechado"
+        self.latencia_ewma = None
+        self.taxa_erro_ewma = 0.0
+        self.falhas_consecutivas = 0
+        self.amostras = 0
+        self.latencias = deque(maxlen=200)
+        self._aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+    
+    def permitir(self):
+        """Indica se uma requisição pode ser feita agora"""
+        with self._lock:
+            if self.estado == "fechado":
+                return True
+            if self.estado == "aberto" and time.monotonic() - self._aberto_em >= self.tempo_aberto:
+                self.estado = "meio-aberto"
+            if self.estado == "meio-aberto" and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+    
+    def registrar(self, sucesso, latencia):
+        with self._lock:
+            self.amostras += 1
+            self.latencias.append(latencia)
+            if self.latencia_ewma is None:
+                self.latencia_ewma = latencia
             else:
-                st.error(f"⏱️ Timeout após {max_retries} tentativas")
+                self.latencia_ewma += self.alfa * (latencia - self.latencia_ewma)
+            self.taxa_erro_ewma += self.alfa * ((0.0 if sucesso else 1.0) - self.taxa_erro_ewma)
+            self._teste_em_andamento = False
+            
+            if sucesso:
+                self.falhas_consecutivas = 0
+                if self.estado == "meio-aberto":
+                    self.estado = "fechado"
+                    self.taxa_erro_ewma = 0.0
+                return
+            
+            self.falhas_consecutivas += 1
+            if (self.estado == "meio-aberto"
+                    or self.falhas_consecutivas >= self.limite_falhas
+                    or (self.amostras >= self.limite_falhas and self.taxa_erro_ewma >= self.limite_taxa_erro)):
+                self.estado = "aberto"
+                self._aberto_em = time.monotonic()
+    
+    def desistir(self):
+        """Libera a vaga de teste do meio-aberto quando a requisição é abandonada antes de sair"""
+        with self._lock:
+            self._teste_em_andamento = False
+    
+    def percentil(self, p):
+        """Percentil p (0-100) das latências recentes, em segundos (None sem amostras suficientes)"""
+        with self._lock:
+            if len(self.latencias) < 10:
                 return None
-        except requests.exceptions.RequestException as e:
-            st.error(f"❌ Erro na requisição: {str(e)}")
+            ordenadas = sorted(self.latencias)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+    
+    def timeout(self, padrao):
+        """Timeout (conexão, leitura) derivado do p95 observado, limitado pelo padrão configurado"""
+        p95 = self.percentil(95)
+        if p95 is None:
+            return padrao
+        leitura = max(obter_config("TIMEOUT_MINIMO", 1.0), p95 * obter_config("TIMEOUT_FATOR_P95", 3.0))
+        return padrao[0], min(padrao[1], leitura)
+    
+    def resumo(self):
+        return {
+            "provedor": self.nome,
+            "estado": self.estado,
+            "latencia_ms": round(self.latencia_ewma * 1000) if self.latencia_ewma is not None else None,
+            "taxa_erro": round(self.taxa_erro_ewma, 3),
+            "amostras": self.amostras
+        }
+
+class RegistroSaude:
+    """Saúde de todos os provedores, criada sob demanda"""
+    
+    def __init__(self):
+        self._provedores = {}
+        self._lock = threading.Lock()
+    
+    def obter(self, nome):
+        with self._lock:
+            if nome not in self._provedores:
+                self._provedores[nome] = SaudeProvedor(
+                    nome,
+                    limite_falhas=obter_config("CIRCUITO_FALHAS", 5),
+                    limite_taxa_erro=obter_config("CIRCUITO_TAXA_ERRO", 0.5),
+                    tempo_aberto=obter_config("CIRCUITO_ABERTO_S", 30.0)
+                )
+            return self._provedores[nome]
+    
+    def resumo(self):
+        with self._lock:
+            provedores = list(self._provedores.values())
+        return [provedor.resumo() for provedor in provedores]
+
+@st.cache_resource(show_spinner=False)
+def obter_saude_provedores():
+    """Registro de saúde dos provedores compartilhado pelo processo"""
+    return RegistroSaude()
+
+def ordenar_apis_cep(apis):
+    """Ordena as APIs de CEP: circuito fechado primeiro, depois a menor latência observada
+    
+    APIs ainda sem medição vêm antes das medidas, para que passem a ser medidas.
+    """
+    saude = obter_saude_provedores()
+    
+    def chave(item):
+        indice, api_url = item
+        provedor = saude.obter(nome_provedor(api_url))
+        return (provedor.estado != "fechado", provedor.latencia_ewma or 0.0, indice)
+    
+    return [api_url for _, api_url in sorted(enumerate(apis), key=chave)]
+
+def safe_request(url, timeout=None, silencioso=False, corpo=None, parar=None):
+    """Faz requisição HTTP com tratamento de erro
+    
+    Usa a sessão compartilhada, reaproveitando conexões já abertas com o host.
+    Provedores com o circuito aberto são pulados sem ir à rede.
+    Com silencioso=True não emite mensagens na interface (uso em threads de apoio).
+    Com `corpo`, envia um POST com o corpo em JSON.
+    Com `parar` (threading.Event) sinalizado, desiste antes de esperar o limitador
+    de taxa, de enviar a requisição ou de repeti-la sem SSL.
+    """
+    if parar is not None and parar.is_set():
+        return None
+    
+    provedor = obter_saude_provedores().obter(nome_provedor(url))
+    if not provedor.permitir():
+        obter_metricas().observar("http", 0.0, "circuito_aberto", provedor.nome)
+        if not silencioso:
+            notificar("warning", f"🚫 {provedor.nome} falhou repetidamente. Pulando por enquanto.")
+        return None
+    
+    timeout = timeout or provedor.timeout(timeout_padrao())
+    tentativas = obter_config("HTTP_TENTATIVAS", 2)
+    
+    limitador = obter_limites_taxa().get(urlparse(url).hostname)
+    if limitador:
+        limitador.aguardar(parar)
+    if parar is not None and parar.is_set():
+        provedor.desistir()
+        return None
+    
+    metodo = "GET" if corpo is None else "POST"
+    sucesso = False
+    resultado = "ok"
+    inicio = time.perf_counter()
+    try:
+        response = obter_sessao_http().request(metodo, url, json=corpo, timeout=timeout)
+        response.raise_for_status()
+        sucesso = True
+        return response
+    except requests.exceptions.SSLError:
+        if parar is not None and parar.is_set():
+            resultado = "interrompida"
             return None
-    return None
+        try:
+            response = obter_sessao_http(verificar_ssl=False).request(metodo, url, json=corpo, timeout=timeout)
+            response.raise_for_status()
+            sucesso = True
+            return response
+        except:
+            resultado = "erro"
+            return None
+    except requests.exceptions.ConnectionError:
+        resultado = "conexao"
+        if not silencioso:
+            notificar("error", f"🔌 Erro de conexão após {tentativas} tentativas")
+        return None
+    except requests.exceptions.Timeout:
+        resultado = "timeout"
+        if not silencioso:
+            notificar("error", f"⏱️ Timeout após {tentativas} tentativas")
+        return None
+    except requests.exceptions.RequestException as e:
+        # Respostas 4xx (ex.: CEP inexistente) mostram que o provedor está de pé
+        resposta = getattr(e, 'response', None)
+        sucesso = resposta is not None and resposta.status_code < 500 and resposta.status_code != 429
+        resultado = "erro_http"
+        if not silencioso:
+            notificar("error", f"❌ Erro na requisição: {str(e)}")
+        return None
+    finally:
+        duracao = time.perf_counter() - inicio
+        provedor.registrar(sucesso, duracao)
+        obter_metricas().observar("http", duracao, resultado, provedor.nome)
 
 def get_api_keys():
     """Obtém as chaves da API de forma segura"""
@@ -355,161 +1583,922 @@ def formatar_endereco(endereco_info):
     
     return " | ".join(endereco_parts)
 
+def consultar_api_cep(api_url, cep_clean, silencioso=False, parar=None):
+    """Consulta uma API de CEP e normaliza a resposta
+    
+    Retorna (endereco_info, aviso, nao_encontrado). endereco_info é None quando a
+    API falhou ou não trouxe cidade/UF; nao_encontrado indica que a API afirmou
+    que o CEP não existe. `parar` é repassado a safe_request.
+    """
+    url = api_url.format(cep_clean)
+    try:
+        response = safe_request(url, silencioso=silencioso, parar=parar)
+        if not response:
+            return None, None, False
+        
+        data = response.json()
+        endereco_info = {}
+        
+        # Processa resposta da ViaCEP
+        if 'viacep' in url:
+            if "erro" in data:
+                return None, "CEP não encontrado", True
+            endereco_info = {
+                'rua': data.get("logradouro", ""),
+                'bairro': data.get("bairro", ""),
+                'cidade': data.get("localidade", ""),
+                'uf': data.get("uf", ""),
+                'cep': data.get("cep", ""),
+                'complemento': data.get("complemento", ""),
+                'ddd': data.get("ddd", ""),
+                'ibge': data.get("ibge", "")
+            }
+        
+        # Processa resposta da BrasilAPI
+        elif 'brasilapi' in url:
+            if not data.get("city"):
+                return None, "Dados incompletos", False
+            endereco_info = {
+                'rua': data.get("street", ""),
+                'bairro': data.get("neighborhood", ""),
+                'cidade': data.get("city", ""),
+                'uf': data.get("state", ""),
+                'cep': cep_clean,
+                'complemento': "",
+                'ddd': ""
+            }
+        
+        # Processa resposta da AwesomeAPI
+        elif 'awesomeapi' in url:
+            if data.get("status") == 400:
+                return None, "CEP inválido", True
+            endereco_info = {
+                'rua': data.get("address", ""),
+                'bairro': data.get("district", ""),
+                'cidade': data.get("city", ""),
+                'uf': data.get("state", ""),
+                'cep': cep_clean,
+                'complemento': "",
+                'ddd': data.get("ddd", "")
+            }
+        
+        # Verifica se temos dados mínimos
+        if not endereco_info.get('cidade') or not endereco_info.get('uf'):
+            return None, "Dados incompletos (cidade/UF)", False
+        
+        return endereco_info, None, False
+    
+    except json.JSONDecodeError:
+        return None, "Erro ao processar resposta JSON", False
+    except Exception as e:
+        return None, f"Falhou: {str(e)}", False
+
+@st.cache_resource(show_spinner=False)
+def obter_executor_cep():
+    """Pool de threads compartilhado para as consultas concorrentes de CEP"""
+    return ThreadPoolExecutor(
+        max_workers=obter_config("CEP_HEDGE_WORKERS", 16),
+        thread_name_prefix="cep"
+    )
+
+def buscar_endereco_concorrente(cep_clean, apis, atraso_hedge):
+    """Dispara as APIs de CEP de forma escalonada e fica com a primeira resposta válida
+    
+    A API i começa quando a anterior passa do próprio p90 de latência (limitado a
+    atraso_hedge; sem medições, o próprio atraso_hedge), ou assim que a anterior
+    falhar. Com atraso_hedge = 0 todas são consultadas em paralelo. Retorna
+    (indice, endereco_info, tentativas), onde tentativas lista
+    (indice, aviso, nao_encontrado) das APIs que concluíram sem sucesso.
+    """
+    saude = obter_saude_provedores()
+    inicios = [0.0]
+    for api_url in apis[:-1]:
+        p90 = saude.obter(nome_provedor(api_url)).percentil(90)
+        inicios.append(inicios[-1] + (atraso_hedge if p90 is None else min(atraso_hedge, p90)))
+    
+    cancelado = threading.Event()
+    liberar = [threading.Event() for _ in apis]
+    
+    def tarefa(indice, api_url):
+        # Espera a vez desta API; acorda antes se a anterior falhar ou se já houver resposta
+        liberar[indice].wait(inicios[indice])
+        if cancelado.is_set():
+            return indice, None, None, False
+        # As perdedoras desistem antes de esperar o limitador ou repetir a requisição
+        resultado = consultar_api_cep(api_url, cep_clean, silencioso=True, parar=cancelado)
+        if not resultado[0] and indice + 1 < len(liberar):
+            liberar[indice + 1].set()
+        return (indice,) + resultado
+    
+    executor = obter_executor_cep()
+    futuros = [executor.submit(tarefa, i, api_url) for i, api_url in enumerate(apis)]
+    tentativas = []
+    try:
+        for futuro in as_completed(futuros):
+            indice, endereco_info, aviso, nao_encontrado = futuro.result()
+            if endereco_info:
+                return indice, endereco_info, tentativas
+            tentativas.append((indice, aviso, nao_encontrado))
+    finally:
+        # Interrompe as APIs que ainda não começaram
+        cancelado.set()
+        for evento in liberar:
+            evento.set()
+        for futuro in futuros:
+            futuro.cancel()
+    
+    return None, None, tentativas
+
+def endereco_por_faixa(cep_clean, municipio):
+    """Endereço (só cidade/UF) montado a partir da tabela offline de faixas de CEP"""
+    return {
+        'rua': "",
+        'bairro': "",
+        'cidade': municipio['nome'],
+        'uf': municipio['uf'],
+        'cep': cep_clean,
+        'complemento': "Cidade obtida da base offline de CEPs",
+        'ddd': "",
+        'ibge': str(municipio['codigo_ibge'])
+    }
+
 def buscar_cep_completo(cep):
-    """Busca dados completos do CEP usando múltiplas APIs"""
+    """Busca dados completos do CEP usando múltiplas APIs
+    
+    O CEP só entra no cache negativo quando todas as APIs responderam que ele não
+    existe. Um acerto negativo pula as APIs e segue direto para os fallbacks
+    offline (faixas de CEP e região), exatamente como a consulta que o gravou.
+    """
     cep_clean = validate_cep(cep)
     if not cep_clean:
         return None, None, None, "CEP inválido. Use formato: 12345678"
     
-    # Tenta cada API de CEP
-    for i, api_url in enumerate(CEP_APIS):
-        try:
-            url = api_url.format(cep_clean)
-            st.info(f"🔍 Tentando API {i+1}/3: {url.split('/')[2]}")
-            
-            response = safe_request(url)
-            if not response:
-                continue
-            
-            data = response.json()
-            endereco_info = {}
-            
-            # Processa resposta da ViaCEP
-            if 'viacep' in url:
-                if "erro" in data:
-                    st.warning(f"⚠️ API {i+1}: CEP não encontrado")
-                    continue
-                endereco_info = {
-                    'rua': data.get("logradouro", ""),
-                    'bairro': data.get("bairro", ""),
-                    'cidade': data.get("localidade", ""),
-                    'uf': data.get("uf", ""),
-                    'cep': data.get("cep", ""),
-                    'complemento': data.get("complemento", ""),
-                    'ddd': data.get("ddd", "")
-                }
-            
-            # Processa resposta da BrasilAPI
-            elif 'brasilapi' in url:
-                if not data.get("city"):
-                    st.warning(f"⚠️ API {i+1}: Dados incompletos")
-                    continue
-                endereco_info = {
-                    'rua': data.get("street", ""),
-                    'bairro': data.get("neighborhood", ""),
-                    'cidade': data.get("city", ""),
-                    'uf': data.get("state", ""),
-                    'cep': cep_clean,
-                    'complemento': "",
-                    'ddd': ""
-                }
-            
-            # Processa resposta da AwesomeAPI
-            elif 'awesomeapi' in url:
-                if data.get("status") == 400:
-                    st.warning(f"⚠️ API {i+1}: CEP inválido")
-                    continue
-                endereco_info = {
-                    'rua': data.get("address", ""),
-                    'bairro': data.get("district", ""),
-                    'cidade': data.get("city", ""),
-                    'uf': data.get("state", ""),
-                    'cep': cep_clean,
-                    'complemento': "",
-                    'ddd': data.get("ddd", "")
-                }
-            
-            # Verifica se temos dados mínimos
-            if not endereco_info.get('cidade') or not endereco_info.get('uf'):
-                st.warning(f"⚠️ API {i+1}: Dados incompletos (cidade/UF)")
-                continue
+    with medir("cep") as etapa:
+        # Consulta o cache persistente antes de ir à rede
+        cache = obter_cache_cep()
+        em_cache, cache_valor = cache.obter(cep_clean)
+        if em_cache and cache_valor:
+            notificar("success", "⚡ CEP encontrado no cache local")
+            etapa["resultado"] = "cache"
+            return cache_valor['lat'], cache_valor['lon'], cache_valor['endereco'], None
+        if em_cache:
+            notificar("info", "ℹ️ CEP marcado como inexistente recentemente. Pulando consulta às APIs.")
+        
+        # Cidade pela tabela offline de faixas de CEP; as APIs só acrescentam rua e bairro
+        municipio_faixa = localizar_municipio_por_cep(cep_clean)
+        if municipio_faixa and obter_config("CEP_SOMENTE_OFFLINE", False):
+            notificar("success", f"✅ CEP localizado offline: {municipio_faixa['nome']} - {municipio_faixa['uf']}")
+            etapa["resultado"] = "offline"
+            return municipio_faixa['lat'], municipio_faixa['lon'], endereco_por_faixa(cep_clean, municipio_faixa), None
+        
+        endereco_info = None
+        numero_api = None
+        respostas_nao_encontrado = 0
+        
+        # Mais rápida e saudável primeiro; os números das mensagens seguem CEP_APIS
+        apis = ordenar_apis_cep(CEP_APIS)
+        
+        # Consulta as APIs (nenhuma se o cache já sabe que o CEP não existe)
+        if em_cache:
+            pass
+        elif obter_config("CEP_MODO_BUSCA", "hedge") == "sequencial":
+            for api_url in apis:
+                numero = CEP_APIS.index(api_url) + 1
+                notificar("info", f"🔍 Tentando API {numero}/{len(CEP_APIS)}: {api_url.split('/')[2]}")
+                endereco_info, aviso, nao_encontrado = consultar_api_cep(api_url, cep_clean)
+                respostas_nao_encontrado += nao_encontrado
+                if endereco_info:
+                    numero_api = numero
+                    break
+                if aviso:
+                    notificar("warning", f"⚠️ API {numero}: {aviso}")
+        else:
+            # Teto do atraso do hedge; cada API usa o p90 da anterior abaixo dele
+            atraso_hedge = obter_config("CEP_HEDGE_ATRASO", 0.3)
             
+            notificar("info", f"🔍 Consultando {len(CEP_APIS)} APIs de CEP em paralelo")
+            indice_api, endereco_info, tentativas = buscar_endereco_concorrente(cep_clean, apis, atraso_hedge)
+            if endereco_info:
+                numero_api = CEP_APIS.index(apis[indice_api]) + 1
+            for i, aviso, nao_encontrado in sorted(tentativas):
+                respostas_nao_encontrado += nao_encontrado
+                notificar("warning", f"⚠️ API {CEP_APIS.index(apis[i]) + 1}: {aviso or 'Sem resposta'}")
+        
+        if endereco_info:
             # Sucesso! Busca coordenadas
-            st.success(f"✅ API {i+1} funcionou! Dados obtidos com sucesso.")
+            notificar("success", f"✅ API {numero_api} funcionou! Dados obtidos com sucesso.")
             
-            # Busca coordenadas usando a função robusta
-            coordenadas = buscar_coordenadas_por_nome(endereco_info['cidade'])
+            # Coordenadas reais do município pela base do IBGE (offline)
+            municipio = localizar_municipio(endereco_info['cidade'], endereco_info['uf'], endereco_info.get('ibge'))
+            if not municipio and municipio_faixa and municipio_faixa['uf'] == endereco_info['uf']:
+                municipio = municipio_faixa
+            if municipio:
+                notificar("success", f"✅ Município encontrado na base do IBGE: {municipio['nome']} - {municipio['uf']}")
+                coordenadas = (municipio['lat'], municipio['lon'])
+            else:
+                # Busca coordenadas usando a função robusta
+                coordenadas = buscar_coordenadas_por_nome(endereco_info['cidade'])
             
             if coordenadas:
+                etapa["resultado"] = "api"
+                cache.guardar(cep_clean, {'lat': coordenadas[0], 'lon': coordenadas[1], 'endereco': endereco_info})
                 return coordenadas[0], coordenadas[1], endereco_info, None
-            else:
-                # Fallback por estado
-                uf = endereco_info.get('uf', '')
-                if uf in COORDENADAS_ESTADOS:
-                    coords = COORDENADAS_ESTADOS[uf]
-                    st.warning(f"⚠️ Usando coordenadas da capital do estado {uf}")
-                    return coords[0], coords[1], endereco_info, None
-                else:
-                    st.warning(f"⚠️ Coordenadas não encontradas para {endereco_info['cidade']}")
-                    continue
-                    
-        except json.JSONDecodeError:
-            st.warning(f"⚠️ API {i+1}: Erro ao processar resposta JSON")
-            continue
-        except Exception as e:
-            st.warning(f"⚠️ API {i+1} falhou: {str(e)}")
+            
+            # Fallback por estado
+            uf = endereco_info.get('uf', '')
+            if uf in COORDENADAS_ESTADOS:
+                coords = COORDENADAS_ESTADOS[uf]
+                base = obter_base_municipios()
+                if base is not None and len(base) < TOTAL_MUNICIPIOS_IBGE:
+                    notificar("warning", f"⚠️ {endereco_info['cidade']} não está na base offline "
+                              f"({len(base)} de {TOTAL_MUNICIPIOS_IBGE} municípios; gere a completa com scripts/gerar_municipios.py)")
+                notificar("warning", f"⚠️ Usando coordenadas da capital do estado {uf}")
+                etapa["resultado"] = "capital"
+                # Coordenada provisória: TTL curto para tentar de novo quando a base de municípios crescer
+                cache.guardar(cep_clean, {'lat': coords[0], 'lon': coords[1], 'endereco': endereco_info},
+                              ttl=obter_config("CEP_CACHE_TTL_APROXIMADO", 3600))
+                return coords[0], coords[1], endereco_info, None
+            
+            notificar("warning", f"⚠️ Coordenadas não encontradas para {endereco_info['cidade']}")
+        
+        # Todas as APIs responderam e afirmaram que o CEP não existe: evita novas consultas
+        # por um tempo. Uma falha de rede ou resposta incompleta não basta para isso.
+        cep_inexistente = em_cache or respostas_nao_encontrado == len(apis)
+        if cep_inexistente and not em_cache:
+            cache.guardar_negativo(cep_clean)
+        
+        # Nenhuma API funcionou - cidade pela tabela offline de faixas de CEP
+        if municipio_faixa:
+            motivo = "CEP não reconhecido pelas APIs" if cep_inexistente else "APIs indisponíveis"
+            notificar("warning", f"⚠️ {motivo}. Cidade obtida da base offline de CEPs: {municipio_faixa['nome']} - {municipio_faixa['uf']}")
+            etapa["resultado"] = "faixa"
+            return municipio_faixa['lat'], municipio_faixa['lon'], endereco_por_faixa(cep_clean, municipio_faixa), None
+        
+        # Último recurso: fallback por região do CEP
+        if len(cep_clean) >= 2:
+            prefixo_cep = cep_clean[:2]
+            if prefixo_cep in CEP_PARA_ESTADO:
+                uf = CEP_PARA_ESTADO[prefixo_cep]
+                coords = COORDENADAS_ESTADOS.get(uf)
+                if coords:
+                    endereco_fallback = {
+                        'rua': f"Região do CEP {cep_clean[:5]}-{cep_clean[5:]}",
+                        'bairro': "Região aproximada",
+                        'cidade': "Localização aproximada",
+                        'uf': uf,
+                        'cep': cep_clean,
+                        'complemento': "Dados aproximados",
+                        'ddd': ""
+                    }
+                    base = obter_base_municipios()
+                    if base is not None and len(base) < TOTAL_MUNICIPIOS_IBGE:
+                        notificar("warning", "⚠️ CEP fora das faixas offline incluídas (só as cidades embutidas; "
+                                  "gere a tabela completa com scripts/gerar_faixas_cep.py)")
+                    notificar("warning", f"⚠️ Usando localização aproximada baseada no CEP (Estado: {uf})")
+                    etapa["resultado"] = "regiao"
+                    return coords[0], coords[1], endereco_fallback, None
+        
+        etapa["resultado"] = "nao_encontrado"
+        return None, None, None, "Não foi possível obter coordenadas do CEP usando nenhuma API"
+
+BASE32_GEOHASH = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash(latitude, longitude, precisao=5):
+    """Codifica coordenadas em geohash (célula de ~4,9 km com precisão 5)"""
+    faixa_lat, faixa_lon = [-90.0, 90.0], [-180.0, 180.0]
+    codigo = []
+    bits, valor, usar_lon = 0, 0, True
+    while len(codigo) < precisao:
+        faixa, coordenada = (faixa_lon, longitude) if usar_lon else (faixa_lat, latitude)
+        meio = (faixa[0] + faixa[1]) / 2
+        valor <<= 1
+        if coordenada >= meio:
+            valor |= 1
+            faixa[0] = meio
+        else:
+            faixa[1] = meio
+        usar_lon = not usar_lon
+        bits += 1
+        if bits == 5:
+            codigo.append(BASE32_GEOHASH[valor])
+            bits, valor = 0, 0
+    return "".join(codigo)
+
+def dimensoes_geohash(precisao):
+    """(altura, largura) em graus de uma célula geohash da precisão dada"""
+    bits = 5 * precisao
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+def geohash_vizinhos(latitude, longitude, precisao):
+    """Célula do ponto e as 8 vizinhas (sem repetições nos polos e no antimeridiano)"""
+    altura, largura = dimensoes_geohash(precisao)
+    # Centro da célula do ponto: os deslocamentos caem no meio das vizinhas
+    centro_lat = (math.floor((latitude + 90.0) / altura) + 0.5) * altura - 90.0
+    centro_lon = (math.floor((longitude + 180.0) / largura) + 0.5) * largura - 180.0
+    celulas = []
+    for d_lat in (0, -1, 1):
+        lat = centro_lat + d_lat * altura
+        if not -90.0 < lat < 90.0:
             continue
+        for d_lon in (0, -1, 1):
+            lon = (centro_lon + d_lon * largura + 180.0) % 360.0 - 180.0
+            celulas.append(geohash(lat, lon, precisao))
+    return list(dict.fromkeys(celulas))
+
+def tamanho_aproximado(valor):
+    """Bytes aproximados de um valor em cache: DataFrames pela memória ocupada, o resto pelo JSON"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    return len(json.dumps(valor, ensure_ascii=False, default=str))
+
+class CacheMemoria:
+    """Cache LRU em memória com TTL e contadores de acertos/faltas, seguro entre threads
+    
+    Remove as entradas menos usadas quando passa de max_entradas ou, se definido,
+    de max_bytes (soma dos tamanhos aproximados de cada valor).
+    """
+    
+    def __init__(self, ttl, max_entradas, max_bytes=None):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obter(self, chave):
+        """Retorna o valor armazenado ou None se ausente/expirado"""
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None or item[0] <= time.time():
+                if item is not None:
+                    del self._dados[chave]
+                    self.bytes -= item[2]
+                self.faltas += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return item[1]
     
-    # Se chegou aqui, nenhuma API funcionou - fallback por região do CEP
-    if len(cep_clean) >= 2:
-        prefixo_cep = cep_clean[:2]
-        if prefixo_cep in CEP_PARA_ESTADO:
-            uf = CEP_PARA_ESTADO[prefixo_cep]
-            coords = COORDENADAS_ESTADOS.get(uf)
-            if coords:
-                endereco_fallback = {
-                    'rua': f"Região do CEP {cep_clean[:5]}-{cep_clean[5:]}",
-                    'bairro': "Região aproximada",
-                    'cidade': "Localização aproximada",
-                    'uf': uf,
-                    'cep': cep_clean,
-                    'complemento': "Dados aproximados",
-                    'ddd': ""
-                }
-                st.warning(f"⚠️ Usando localização aproximada baseada no CEP (Estado: {uf})")
-                return coords[0], coords[1], endereco_fallback, None
-    
-    return None, None, None, "Não foi possível obter coordenadas do CEP usando nenhuma API"
+    def guardar(self, chave, valor, ttl=None):
+        tamanho = tamanho_aproximado(valor) if self.max_bytes else 0
+        with self._lock:
+            anterior = self._dados.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            self._dados[chave] = (time.time() + (ttl or self.ttl), valor, tamanho)
+            self.bytes += tamanho
+            # A entrada recém-gravada fica mesmo se sozinha passar do limite de bytes
+            while len(self._dados) > 1 and (
+                    len(self._dados) > self.max_entradas or (self.max_bytes and self.bytes > self.max_bytes)):
+                self.bytes -= self._dados.popitem(last=False)[1][2]
+    
+    def estatisticas(self):
+        """Resumo para diagnóstico: entradas, bytes aproximados, acertos, faltas e taxa de acerto"""
+        with self._lock:
+            total = self.acertos + self.faltas
+            return {
+                "entradas": len(self._dados),
+                "bytes": self.bytes,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": self.acertos / total if total else 0.0
+            }
 
-def get_weather_fallback(latitude, longitude):
-    """Obtém dados do clima usando múltiplas APIs"""
-    weather_key = get_api_keys()[1]
+class CacheClima(CacheMemoria):
+    """Cache de clima atual por célula geohash, compartilhado entre sessões"""
     
-    if weather_key:
+    def __init__(self, ttl, max_entradas, precisao, max_bytes=None):
+        super().__init__(ttl, max_entradas, max_bytes)
+        self.precisao = precisao
+    
+    def chave(self, latitude, longitude):
+        return geohash(latitude, longitude, self.precisao)
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_clima():
+    """Cache de clima do processo (TTL próximo ao intervalo de atualização da WeatherAPI)"""
+    return CacheClima(
+        ttl=obter_config("CLIMA_CACHE_TTL", 600),
+        max_entradas=obter_config("CLIMA_CACHE_MAX_ENTRADAS", 5000),
+        precisao=obter_config("CLIMA_CACHE_PRECISAO", 5),
+        max_bytes=int(obter_config("CLIMA_CACHE_MAX_MB", 8.0) * 1024 * 1024)
+    )
+
+class HistoricoObservacoes:
+    """Histórico local (só acrescenta) das observações reais de clima, em SQLite
+    
+    Cada observação fica com o geohash do ponto (precisão 7, ~150 m) e o horário
+    em que foi obtida. O índice (celula, obtido_em) atende as buscas por célula e
+    período como intervalos de prefixo, rápidas mesmo com milhões de linhas.
+    """
+    
+    PRECISAO = 7
+    CAMPOS = ("temperatura", "sensacao", "umidade", "vento_kmh", "descricao", "cidade", "pais")
+    
+    def __init__(self, caminho, retencao, precisao_busca=5):
+        self.retencao = retencao
+        self.precisao_busca = precisao_busca
+        self._lock = threading.Lock()
+        self._escritas = 0
         try:
-            url = f"http://api.weatherapi.com/v1/current.json?key={weather_key}&q={latitude},{longitude}&aqi=no"
-            response = safe_request(url)
+            if os.path.dirname(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            self._conn = self._conectar(caminho)
+        except (OSError, sqlite3.Error):
+            # Diretório sem permissão de escrita: mantém o histórico apenas em memória
+            self._conn = self._conectar(":memory:")
+    
+    def _conectar(self, caminho):
+        conn = sqlite3.connect(caminho, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS observacoes (
+            celula TEXT NOT NULL,
+            obtido_em REAL NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            temperatura REAL,
+            sensacao REAL,
+            umidade REAL,
+            vento_kmh REAL,
+            descricao TEXT,
+            cidade TEXT,
+            pais TEXT
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_observacoes_celula ON observacoes(celula, obtido_em)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_observacoes_tempo ON observacoes(obtido_em)")
+        return conn
+    
+    def registrar(self, observacoes):
+        """Acrescenta observações [(latitude, longitude, clima), ...] numa única transação"""
+        linhas = [
+            (geohash(latitude, longitude, self.PRECISAO), clima.get("obtido_em", time.time()), latitude, longitude)
+            + tuple(clima[campo] for campo in self.CAMPOS)
+            for latitude, longitude, clima in observacoes
+            if clima and not clima.get("fallback")
+        ]
+        if not linhas:
+            return
+        try:
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany(
+                        f"INSERT INTO observacoes (celula, obtido_em, latitude, longitude, {', '.join(self.CAMPOS)}) "
+                        f"VALUES ({', '.join('?' * (4 + len(self.CAMPOS)))})",
+                        linhas
+                    )
+                self._escritas += len(linhas)
+                if self._escritas >= 1000:
+                    self._escritas = 0
+                    self._conn.execute("DELETE FROM observacoes WHERE obtido_em < ?", (time.time() - self.retencao,))
+        except sqlite3.Error:
+            pass
+    
+    def mais_recente(self, latitude, longitude, idade_maxima=None):
+        """Observação real mais próxima (e, entre as do mesmo ponto, a mais recente); None se não houver
+        
+        Procura na célula do ponto e nas 8 vizinhas, ampliando a precisão se preciso
+        (~5 km, ~40 km e ~150 km com a precisão padrão). As candidatas são ordenadas
+        pela distância; a busca para assim que a mais próxima está dentro do raio que
+        a vizinhança daquela precisão cobre por inteiro.
+        """
+        limite = time.time() - (idade_maxima or self.retencao)
+        escala_lon = math.cos(math.radians(latitude))
+        
+        def distancia_km(linha):
+            return 111.2 * math.hypot(linha[0] - latitude, (linha[1] - longitude) * escala_lon)
+        
+        melhor = None
+        for precisao in range(self.precisao_busca, max(0, self.precisao_busca - 3), -1):
+            celulas = geohash_vizinhos(latitude, longitude, precisao)
+            try:
+                with self._lock:
+                    # Por célula, a linha do MAX(obtido_em) (colunas simples com MAX, no SQLite)
+                    linhas = self._conn.execute(
+                        f"SELECT latitude, longitude, MAX(obtido_em), {', '.join(self.CAMPOS)} FROM observacoes "
+                        f"WHERE ({' OR '.join(['(celula >= ? AND celula < ?)'] * len(celulas))}) "
+                        "AND obtido_em >= ? GROUP BY celula",
+                        [valor for celula in celulas for valor in (celula, celula + "~")] + [limite]
+                    ).fetchall()
+            except sqlite3.Error:
+                return None
+            if linhas:
+                melhor = min(linhas, key=lambda l: (distancia_km(l), -l[2]))
+                altura, largura = dimensoes_geohash(precisao)
+                if distancia_km(melhor) <= 111.2 * min(altura, largura * escala_lon):
+                    break
+        if melhor is None:
+            return None
+        clima = dict(zip(self.CAMPOS, melhor[3:]))
+        clima.update({
+            "obtido_em": melhor[2],
+            "timestamp": datetime.fromtimestamp(melhor[2]).strftime("%d/%m %H:%M"),
+            "distancia_km": round(distancia_km(melhor), 1),
+            "historico": True,
+            "fallback": True
+        })
+        return clima
+    
+    def estatisticas(self):
+        try:
+            with self._lock:
+                total = self._conn.execute("SELECT COUNT(*) FROM observacoes").fetchone()[0]
+        except sqlite3.Error:
+            total = 0
+        return {"observacoes": total}
+
+@st.cache_resource(show_spinner=False)
+def obter_historico_observacoes():
+    """Histórico de observações compartilhado por todas as sessões"""
+    return HistoricoObservacoes(
+        caminho=obter_config("HISTORICO_PATH", os.path.join(DIRETORIO_CACHE, "historico.sqlite3")),
+        retencao=obter_config("HISTORICO_RETENCAO_DIAS", 30) * 24 * 3600,
+        precisao_busca=obter_config("CLIMA_CACHE_PRECISAO", 5)
+    )
+
+def normalizar_clima_weatherapi(data):
+    """Converte a resposta da WeatherAPI (current) no dicionário de clima do app; None se incompleta"""
+    if "current" not in data or "location" not in data:
+        return None
+    return {
+        "temperatura": data["current"]["temp_c"],
+        "umidade": data["current"]["humidity"],
+        "vento_kmh": data["current"]["wind_kph"],
+        "descricao": data["current"]["condition"]["text"],
+        "cidade": data["location"]["name"],
+        "pais": data["location"]["country"],
+        "sensacao": data["current"]["feelslike_c"],
+        "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "obtido_em": time.time(),
+        "fallback": False
+    }
+
+def consultar_clima_atual(latitude, longitude, weather_key, silencioso=False):
+    """Clima atual de um ponto direto da WeatherAPI, sem caches (None se falhar)"""
+    url = f"{WEATHERAPI_URL}/current.json?key={weather_key}&q={latitude},{longitude}&aqi=no"
+    response = safe_request(url, silencioso=silencioso)
+    if response:
+        clima = normalizar_clima_weatherapi(response.json())
+        obter_historico_observacoes().registrar([(latitude, longitude, clima)])
+        return clima
+    return None
+
+def consultar_clima_lote(pontos, weather_key, silencioso=False, concorrencia=1):
+    """Clima atual de vários pontos com a consulta em lote da WeatherAPI (q=bulk)
+    
+    Os pontos (repetidos são consultados uma vez) vão em grupos de até
+    WEATHERAPI_LOTE_MAXIMO locais por requisição, e cada resultado volta ao seu
+    ponto pelo custom_id. Retorna uma lista na ordem de `pontos`, com None onde a
+    consulta falhou. Se o plano da WeatherAPI não aceitar lotes (ou com
+    WEATHERAPI_LOTE = false), ou se a resposta do lote vier malformada, o grupo é
+    consultado ponto a ponto; pontos que faltarem numa resposta válida também
+    (os que a API recusou com um erro próprio não são repetidos).
+    """
+    chaves = [(round(lat, 4), round(lon, 4)) for lat, lon in pontos]
+    unicos = list(dict.fromkeys(chaves))
+    tamanho = max(1, int(obter_config("WEATHERAPI_LOTE_MAXIMO", 50)))
+    grupos = [unicos[i:i + tamanho] for i in range(0, len(unicos), tamanho)]
+    usar_lote = obter_config("WEATHERAPI_LOTE", True)
+    
+    def consultar_ponto(ponto, silencioso):
+        try:
+            return consultar_clima_atual(ponto[0], ponto[1], weather_key, silencioso)
+        except (ValueError, KeyError, TypeError):
+            return None
+    
+    def ler_lote(response, grupo):
+        """(climas por ponto, pontos recusados pela API) da resposta; None se o corpo não for um lote"""
+        try:
+            itens = response.json().get("bulk")
+        except (ValueError, AttributeError):
+            return None
+        if not isinstance(itens, list):
+            return None
+        climas, recusados = {}, set()
+        for item in itens:
+            consulta = item.get("query") if isinstance(item, dict) else None
+            if not isinstance(consulta, dict):
+                continue
+            try:
+                indice = int(consulta.get("custom_id"))
+                clima = normalizar_clima_weatherapi(consulta)
+            except (TypeError, ValueError, KeyError):
+                continue
+            if not 0 <= indice < len(grupo):
+                continue
+            ponto = grupo[indice]
+            # custom_id repetido: vale o primeiro clima válido
+            if clima and not climas.get(ponto):
+                climas[ponto] = clima
+            elif "error" in consulta:
+                recusados.add(ponto)
+        return climas, recusados - set(climas)
+    
+    def consultar_grupo(grupo, silencioso):
+        with medir("clima_lote", "weatherapi") as etapa:
+            lote = None
+            if usar_lote and len(grupo) > 1:
+                corpo = {"locations": [
+                    {"q": f"{lat},{lon}", "custom_id": str(indice)} for indice, (lat, lon) in enumerate(grupo)
+                ]}
+                url = f"{WEATHERAPI_URL}/current.json?key={weather_key}&q=bulk&aqi=no"
+                response = safe_request(url, silencioso=silencioso, corpo=corpo)
+                if response is not None:
+                    lote = ler_lote(response, grupo)
+                    if lote is None and not silencioso:
+                        notificar("warning", "⚠️ Resposta em lote da WeatherAPI inválida. Consultando ponto a ponto.")
+            if lote is None:
+                etapa["resultado"] = "individual"
+                return {ponto: consultar_ponto(ponto, silencioso) for ponto in grupo}
             
-            if response:
-                data = response.json()
-                if "current" in data and "location" in data:
-                    return {
-                        "temperatura": data["current"]["temp_c"],
-                        "umidade": data["current"]["humidity"],
-                        "vento_kmh": data["current"]["wind_kph"],
-                        "descricao": data["current"]["condition"]["text"],
-                        "cidade": data["location"]["name"],
-                        "pais": data["location"]["country"],
-                        "sensacao": data["current"]["feelslike_c"],
-                        "timestamp": datetime.now().strftime("%H:%M:%S"),
-                        "fallback": False
-                    }
-        except Exception as e:
-            st.warning(f"⚠️ WeatherAPI falhou: {str(e)}")
+            climas, recusados = lote
+            obter_historico_observacoes().registrar([(lat, lon, clima) for (lat, lon), clima in climas.items()])
+            faltantes = [ponto for ponto in grupo if ponto not in climas and ponto not in recusados]
+            for ponto in faltantes:
+                climas[ponto] = consultar_ponto(ponto, silencioso)
+            etapa["resultado"] = "api" if all(climas.get(ponto) for ponto in grupo) else "parcial"
+            return climas
+    
+    def consultar_grupo_em_thread(grupo):
+        # Sem interface nas threads de apoio: as mensagens de status são descartadas.
+        # Uma falha inesperada perde só este grupo, não os demais do executor.map
+        with coletar_mensagens():
+            try:
+                return consultar_grupo(grupo, silencioso=True)
+            except Exception:
+                return {}
     
-    # Fallback com dados baseados em coordenadas
+    climas = {}
+    if concorrencia > 1 and len(grupos) > 1:
+        with ThreadPoolExecutor(max_workers=min(concorrencia, len(grupos)), thread_name_prefix="clima-lote") as executor:
+            for resultado in executor.map(consultar_grupo_em_thread, grupos):
+                climas.update(resultado)
+    else:
+        for grupo in grupos:
+            climas.update(consultar_grupo(grupo, silencioso))
+    # Pontos repetidos recebem cópias, para que um não altere o clima do outro
+    return [dict(climas[chave]) if climas.get(chave) else None for chave in chaves]
+
+class AquecedorClima:
+    """Mantém em memória o clima de pontos fixos, atualizado em segundo plano
+    
+    Cada rodada consulta todos os pontos com a consulta em lote da WeatherAPI,
+    com até `concorrencia` grupos simultâneos. O intervalo entre rodadas varia ±jitter (fração) para que várias
+    instâncias do app não consultem a API no mesmo instante.
+    """
+    
+    def __init__(self, pontos, intervalo, jitter, concorrencia, idade_maxima):
+        self.pontos = sorted(set(pontos))
+        self.intervalo = intervalo
+        self.jitter = jitter
+        self.concorrencia = concorrencia
+        self.idade_maxima = idade_maxima
+        self.rodadas = 0
+        self.ultima_rodada = None
+        self._climas = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def chave(latitude, longitude):
+        return round(latitude, 4), round(longitude, 4)
+    
+    def obter(self, latitude, longitude):
+        """Clima aquecido do ponto, ou None se o ponto não é conhecido ou o dado está velho demais"""
+        with self._lock:
+            clima = self._climas.get(self.chave(latitude, longitude))
+        if clima and time.time() - clima["obtido_em"] <= self.idade_maxima:
+            return dict(clima)
+        return None
+    
+    def atualizar(self):
+        """Executa uma rodada de atualização e retorna quantos pontos foram atualizados"""
+        weather_key = get_api_keys()[1]
+        if not weather_key:
+            return 0
+        
+        atualizados = 0
+        with medir("aquecimento", "weatherapi"):
+            # Sem interface nesta thread: as mensagens de status são descartadas
+            with coletar_mensagens():
+                climas = consultar_clima_lote(self.pontos, weather_key, silencioso=True, concorrencia=self.concorrencia)
+            for ponto, clima in zip(self.pontos, climas):
+                if clima:
+                    with self._lock:
+                        self._climas[self.chave(*ponto)] = clima
+                    atualizados += 1
+        self.rodadas += 1
+        self.ultima_rodada = time.time()
+        return atualizados
+    
+    def _executar(self, parar):
+        while not parar.is_set():
+            try:
+                self.atualizar()
+            except Exception:
+                pass
+            parar.wait(self.intervalo * (1 + random.uniform(-self.jitter, self.jitter)))
+    
+    def iniciar(self):
+        """Inicia as rodadas em segundo plano; depois de parar(), inicia de novo"""
+        with self._lock:
+            if self._thread is None or self._parar.is_set():
+                # Cada thread tem o próprio evento: uma anterior ainda no meio da rodada só termina
+                self._parar = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._executar, args=(self._parar,), name="aquecedor-clima", daemon=True
+                )
+                self._thread.start()
+        return self
+    
+    def parar(self):
+        with self._lock:
+            self._parar.set()
+    
+    def estatisticas(self):
+        with self._lock:
+            aquecidos = sum(time.time() - clima["obtido_em"] <= self.idade_maxima for clima in self._climas.values())
+        return {
+            "pontos": len(self.pontos),
+            "aquecidos": aquecidos,
+            "rodadas": self.rodadas,
+            "idade_rodada_s": time.time() - self.ultima_rodada if self.ultima_rodada else None
+        }
+
+@st.cache_resource(show_spinner=False)
+def obter_aquecedor_clima():
+    """Aquecedor do clima das cidades e capitais embutidas (só consulta a API depois de iniciado)"""
+    intervalo = obter_config("CLIMA_AQUECIMENTO_INTERVALO", 300.0)
+    return AquecedorClima(
+        pontos=list(COORDENADAS_CIDADES.values()) + list(COORDENADAS_ESTADOS.values()),
+        intervalo=intervalo,
+        jitter=obter_config("CLIMA_AQUECIMENTO_JITTER", 0.1),
+        concorrencia=obter_config("CLIMA_AQUECIMENTO_CONCORRENCIA", 4),
+        # Se as rodadas falharem, o dado aquecido deixa de ser servido depois disso
+        idade_maxima=obter_config("CLIMA_AQUECIMENTO_IDADE_MAXIMA", 3 * intervalo)
+    )
+
+def iniciar_aquecedor_clima():
+    """Inicia o aquecimento em segundo plano (uma vez por processo; CLIMA_AQUECIMENTO = false desativa)"""
+    if obter_config("CLIMA_AQUECIMENTO", True) and get_api_keys()[1]:
+        return obter_aquecedor_clima().iniciar()
+    return None
+
+def idade_dados(clima):
+    """Texto curto com a idade dos dados do clima (ex.: "há 4 min")"""
+    if "obtido_em" not in clima:
+        return ""
+    segundos = max(0, time.time() - clima["obtido_em"])
+    if segundos < 60:
+        return "agora"
+    if segundos < 3600:
+        return f"há {int(segundos // 60)} min"
+    return f"há {segundos / 3600:.1f} h"
+
+def get_weather_fallback(latitude, longitude):
+    """Obtém dados do clima usando múltiplas APIs"""
+    with medir("clima", "weatherapi") as etapa:
+        weather_key = get_api_keys()[1]
+        
+        if weather_key:
+            # Cidades e capitais embutidas já vêm atualizadas em segundo plano
+            clima_aquecido = obter_aquecedor_clima().obter(latitude, longitude)
+            if clima_aquecido:
+                etapa["resultado"] = "aquecido"
+                return clima_aquecido
+            
+            # Pontos próximos dentro da janela de validade são servidos da memória
+            cache = obter_cache_clima()
+            celula = cache.chave(latitude, longitude)
+            clima_cache = cache.obter(celula)
+            if clima_cache:
+                etapa["resultado"] = "cache"
+                return dict(clima_cache)
+            
+            try:
+                clima = consultar_clima_atual(latitude, longitude, weather_key)
+                if clima:
+                    cache.guardar(celula, dict(clima))
+                    etapa["resultado"] = "api"
+                    return clima
+            except Exception as e:
+                notificar("warning", f"⚠️ WeatherAPI falhou: {str(e)}")
+        
+        clima = clima_offline(latitude, longitude)
+        etapa["resultado"] = "historico" if clima.get("historico") else "climatologia" if clima.get("climatologia") else "fallback"
+        return clima
+
+def clima_offline(latitude, longitude):
+    """Clima sem a WeatherAPI: a última observação real próxima, se houver, ou a estimativa"""
+    historico = obter_historico_observacoes().mais_recente(
+        latitude, longitude, obter_config("HISTORICO_IDADE_MAXIMA", 48 * 3600)
+    )
+    return historico or clima_estimado(latitude, longitude)
+
+class ClimatologiaGrade:
+    """Normais climatológicas em grade regular (lat × lon × mês × horário × variável)
+    
+    A grade fica mapeada em memória (np.load com mmap_mode); cada estimativa lê
+    só os 4 pontos vizinhos do mês e interpola bilinearmente no espaço e
+    linearmente entre os horários da grade.
+    """
+    
+    def __init__(self, caminho_grade, caminho_meta):
+        self.grade = np.load(caminho_grade, mmap_mode='r')
+        with open(caminho_meta, encoding='utf-8') as arquivo:
+            meta = json.load(arquivo)
+        self.lat_inicial = float(meta["lat_inicial"])
+        self.lon_inicial = float(meta["lon_inicial"])
+        self.passo = float(meta["passo"])
+        self.horas = [float(hora) for hora in meta["horas"]]
+        if self.grade.ndim != 5 or self.grade.shape[2:] != (12, len(self.horas), len(VARIAVEIS_CLIMATOLOGIA)):
+            raise ValueError(f"Grade de climatologia com formato inesperado: {self.grade.shape}")
+        self.fonte = meta.get("fonte", "")
+        self.aproximada = bool(meta.get("aproximada", False))
+    
+    def _posicao(self, valor, inicial, tamanho):
+        """Índice da célula e fração dentro dela (None fora da grade)"""
+        posicao = (valor - inicial) / self.passo
+        if not 0 <= posicao <= tamanho - 1:
+            return None
+        indice = min(int(posicao), tamanho - 2)
+        return indice, posicao - indice
+    
+    def estimar(self, latitude, longitude, quando=None):
+        """Temperatura, umidade e vento normais no ponto e momento (None fora da grade)"""
+        linha = self._posicao(latitude, self.lat_inicial, self.grade.shape[0])
+        coluna = self._posicao(longitude, self.lon_inicial, self.grade.shape[1])
+        if linha is None or coluna is None:
+            return None
+        (i, fi), (j, fj) = linha, coluna
+        
+        # Hora solar local pela longitude, para não depender do fuso do servidor
+        quando = quando or datetime.now(timezone.utc)
+        hora = (quando.hour + quando.minute / 60 + longitude / 15) % 24
+        k = bisect_right(self.horas, hora) - 1
+        proxima = (k + 1) % len(self.horas)
+        intervalo = (self.horas[proxima] - self.horas[k]) % 24 or 24
+        fh = ((hora - self.horas[k]) % 24) / intervalo
+        
+        vizinhos = np.asarray(self.grade[i:i + 2, j:j + 2, quando.month - 1], dtype=np.float64)
+        valores = vizinhos[:, :, k] * (1 - fh) + vizinhos[:, :, proxima] * fh
+        valores = valores[0] * (1 - fi) + valores[1] * fi
+        temperatura, umidade, vento_kmh = (valores[0] * (1 - fj) + valores[1] * fj).tolist()
+        return {"temperatura": temperatura, "umidade": umidade, "vento_kmh": vento_kmh}
+
+@st.cache_resource(show_spinner=False)
+def obter_climatologia():
+    """Carrega a grade de normais no primeiro uso (None se os arquivos não existirem)"""
+    try:
+        return ClimatologiaGrade(ARQUIVO_CLIMATOLOGIA, ARQUIVO_META_CLIMATOLOGIA)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def sensacao_aparente(temperatura, umidade, vento_kmh):
+    """Temperatura aparente de Steadman (sombra), a partir de temperatura, umidade e vento"""
+    pressao_vapor = umidade / 100 * 6.105 * np.exp(17.27 * temperatura / (237.7 + temperatura))
+    return temperatura + 0.33 * pressao_vapor - 0.70 * vento_kmh / 3.6 - 4.0
+
+def clima_estimado(latitude, longitude):
+    """Fallback com dados baseados em coordenadas, quando a WeatherAPI não responde
+    
+    Usa a normal climatológica do ponto, mês e horário; fora da grade (ou sem o
+    arquivo), uma estimativa grosseira pela latitude.
+    """
+    municipio = municipio_por_coordenadas(latitude, longitude)
     weather_fallback = {
         "temperatura": 23.5,
         "umidade": 65,
         "vento_kmh": 15.2,
         "descricao": "Parcialmente nublado",
-        "cidade": f"Lat: {latitude:.2f}, Lon: {longitude:.2f}",
+        "cidade": nome_municipio(municipio) if municipio else f"Lat: {latitude:.2f}, Lon: {longitude:.2f}",
         "pais": "Brasil",
         "sensacao": 25.0,
         "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "obtido_em": time.time(),
         "fallback": True
     }
     
+    climatologia = obter_climatologia()
+    normal = climatologia.estimar(latitude, longitude) if climatologia else None
+    if normal:
+        temperatura, umidade, vento_kmh = normal["temperatura"], normal["umidade"], normal["vento_kmh"]
+        weather_fallback.update({
+            "temperatura": round(temperatura, 1),
+            "umidade": int(round(umidade)),
+            "vento_kmh": round(vento_kmh, 1),
+            "sensacao": round(float(sensacao_aparente(temperatura, umidade, vento_kmh)), 1),
+            "descricao": "Estimativa aproximada" if climatologia.aproximada else "Normal climatológica",
+            "climatologia": True,
+            "estimativa_aproximada": climatologia.aproximada,
+            "fonte_estimativa": climatologia.fonte
+        })
+        return weather_fallback
+    
     # Estimativa baseada em latitude
     if latitude < -30:
         weather_fallback.update({"temperatura": 18.0, "descricao": "Clima temperado"})
@@ -520,71 +2509,270 @@ def get_weather_fallback(latitude, longitude):
     
     return weather_fallback
 
-def interpretar_clima(weather_data):
-    """Gera recomendações usando OpenAI com fallback"""
-    openai_key = get_api_keys()[0]
+def get_weather_lote(pontos):
+    """Clima de vários pontos de uma vez, no mesmo formato de get_weather_fallback
     
-    # Fallback com recomendações baseadas em regras
-    def recomendacoes_fallback(temp, umidade, vento, descricao):
-        recomendacoes = f"""
-## 🧥 ROUPAS RECOMENDADAS
+    Pontos aquecidos ou no cache por célula são servidos da memória; os demais
+    vão à WeatherAPI em requisições em lote. Retorna uma lista na ordem de `pontos`.
+    """
+    climas = [None] * len(pontos)
+    weather_key = get_api_keys()[1]
+    
+    if weather_key:
+        aquecedor = obter_aquecedor_clima()
+        cache = obter_cache_clima()
+        faltantes = []
+        for indice, (latitude, longitude) in enumerate(pontos):
+            clima = aquecedor.obter(latitude, longitude) or cache.obter(cache.chave(latitude, longitude))
+            if clima:
+                climas[indice] = dict(clima)
+            else:
+                faltantes.append(indice)
+        
+        if faltantes:
+            try:
+                consultados = consultar_clima_lote([pontos[indice] for indice in faltantes], weather_key)
+            except Exception as e:
+                notificar("warning", f"⚠️ WeatherAPI (lote) falhou: {str(e)}")
+                consultados = [None] * len(faltantes)
+            for indice, clima in zip(faltantes, consultados):
+                if clima:
+                    cache.guardar(cache.chave(*pontos[indice]), dict(clima))
+                    climas[indice] = clima
+    
+    return [clima or clima_offline(latitude, longitude) for clima, (latitude, longitude) in zip(climas, pontos)]
 
-**Para {temp}°C:**
-"""
+@st.cache_resource(show_spinner=False)
+def obter_cache_previsao():
+    """Cache da previsão por hora do processo, por célula e número de dias"""
+    return CacheClima(
+        ttl=obter_config("PREVISAO_CACHE_TTL", 1800),
+        max_entradas=obter_config("PREVISAO_CACHE_MAX_ENTRADAS", 500),
+        precisao=obter_config("CLIMA_CACHE_PRECISAO", 5),
+        # ~25 KB por entrada (até 96 horas): o limite em bytes é o que vale na prática
+        max_bytes=int(obter_config("PREVISAO_CACHE_MAX_MB", 16.0) * 1024 * 1024)
+    )
+
+def normalizar_previsao_weatherapi(data):
+    """Converte a resposta da WeatherAPI (forecast) em um DataFrame com uma linha por hora; None se incompleta"""
+    try:
+        horas = [hora for dia in data["forecast"]["forecastday"] for hora in dia["hour"]]
+        previsao = pd.DataFrame({
+            "epoch": [hora["time_epoch"] for hora in horas],
+            "hora": pd.to_datetime([hora["time"] for hora in horas]),
+            "temperatura": [hora["temp_c"] for hora in horas],
+            "sensacao": [hora["feelslike_c"] for hora in horas],
+            "umidade": [hora["humidity"] for hora in horas],
+            "vento_kmh": [hora["wind_kph"] for hora in horas],
+            "chance_chuva": [hora.get("chance_of_rain", 0) for hora in horas],
+            "descricao": [hora["condition"]["text"] for hora in horas],
+        })
+    except (KeyError, TypeError):
+        return None
+    previsao.attrs["cidade"] = (data.get("location") or {}).get("name", "")
+    return previsao
+
+def get_previsao_horaria(latitude, longitude, horas=24):
+    """Previsão das próximas `horas` (24 a 72) numa única requisição, com cache por célula
+    
+    Retorna um DataFrame a partir da hora atual, ou None sem a WeatherAPI.
+    """
+    horas = max(24, min(72, int(horas)))
+    # A janela começa na hora atual e pode avançar sobre mais um dia, mas sem passar
+    # do limite do plano (3 dias no gratuito); o que faltar é avisado na interface
+    dias = min(math.ceil(horas / 24) + 1, obter_config("PREVISAO_DIAS_MAXIMO", 3))
+    with medir("previsao", "weatherapi") as etapa:
+        weather_key = get_api_keys()[1]
+        if not weather_key:
+            etapa["resultado"] = "fallback"
+            return None
         
-        if temp < 15:
-            recomendacoes += """
-- Casaco pesado ou jaqueta
-- Calça comprida
-- Sapatos fechados
-- Cachecol e gorro se necessário
-"""
-        elif temp < 22:
-            recomendacoes += """
-- Casaco leve ou blusa de manga longa
-- Calça ou bermuda
-- Sapatos fechados ou tênis
-"""
-        elif temp < 28:
-            recomendacoes += """
-- Camiseta ou blusa leve
-- Shorts ou calça leve
-- Sapatos abertos ou tênis
-"""
+        cache = obter_cache_previsao()
+        chave = f"{cache.chave(latitude, longitude)}|{dias}"
+        previsao = cache.obter(chave)
+        if previsao is not None:
+            etapa["resultado"] = "cache"
         else:
-            recomendacoes += """
-- Roupas leves e claras
-- Shorts e camiseta
-- Sandálias ou sapatos ventilados
-- Protetor solar
-"""
+            url = f"{WEATHERAPI_URL}/forecast.json?key={weather_key}&q={latitude},{longitude}&days={dias}&aqi=no&alerts=no"
+            response = safe_request(url)
+            previsao = None
+            if response:
+                try:
+                    previsao = normalizar_previsao_weatherapi(response.json())
+                except Exception as e:
+                    notificar("warning", f"⚠️ Previsão da WeatherAPI inválida: {str(e)}")
+            if previsao is None:
+                etapa["resultado"] = "fallback"
+                return None
+            cache.guardar(chave, previsao)
+            etapa["resultado"] = "api"
         
-        recomendacoes += f"""
+        futuras = previsao[previsao["epoch"] > time.time() - 3600].head(horas).reset_index(drop=True)
+        futuras.attrs = dict(previsao.attrs)
+        return futuras
+
+class CacheRecomendacoes(CachePersistente):
+    """Cache persistente de recomendações da OpenAI por faixa de condições do clima
+    
+    Climas que caem nas mesmas faixas (temperatura, sensação, umidade, vento e
+    descrição normalizada) compartilham a mesma recomendação.
+    """
+    
+    def __init__(self, caminho, ttl, max_entradas, balde_temperatura, balde_umidade, balde_vento):
+        super().__init__(caminho, "recomendacoes", ttl, max_entradas=max_entradas)
+        self.balde_temperatura = balde_temperatura
+        self.balde_umidade = balde_umidade
+        self.balde_vento = balde_vento
+    
+    def chave(self, weather_data):
+        return "|".join([
+            str(int(weather_data['temperatura'] // self.balde_temperatura)),
+            str(int(weather_data['sensacao'] // self.balde_temperatura)),
+            str(int(weather_data['umidade'] // self.balde_umidade)),
+            str(int(weather_data['vento_kmh'] // self.balde_vento)),
+            normalizar_texto(weather_data['descricao'])
+        ])
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_recomendacoes():
+    """Cache de recomendações compartilhado por todas as sessões"""
+    return CacheRecomendacoes(
+        caminho=obter_config("REC_CACHE_PATH", os.path.join(DIRETORIO_CACHE, "recomendacoes.sqlite3")),
+        ttl=obter_config("REC_CACHE_TTL", 12 * 3600),
+        max_entradas=obter_config("REC_CACHE_MAX_ENTRADAS", 20000),
+        balde_temperatura=obter_config("REC_CACHE_BALDE_TEMPERATURA", 1.0),
+        balde_umidade=obter_config("REC_CACHE_BALDE_UMIDADE", 5.0),
+        balde_vento=obter_config("REC_CACHE_BALDE_VENTO", 10.0)
+    )
+
+# Tabela de regras das recomendações offline (também usada na previsão por hora)
+# Faixas de temperatura: (limite superior exclusivo em °C, resumo, itens de roupa)
+FAIXAS_ROUPAS = [
+    (15, "Casaco pesado", [
+        "Casaco pesado ou jaqueta",
+        "Calça comprida",
+        "Sapatos fechados",
+        "Cachecol e gorro se necessário",
+    ]),
+    (22, "Casaco leve", [
+        "Casaco leve ou blusa de manga longa",
+        "Calça ou bermuda",
+        "Sapatos fechados ou tênis",
+    ]),
+    (28, "Camiseta", [
+        "Camiseta ou blusa leve",
+        "Shorts ou calça leve",
+        "Sapatos abertos ou tênis",
+    ]),
+    (float("inf"), "Roupas leves", [
+        "Roupas leves e claras",
+        "Shorts e camiseta",
+        "Sandálias ou sapatos ventilados",
+        "Protetor solar",
+    ]),
+]
+
+# Ar-condicionado: (graus abaixo da temperatura externa, mínimo, máximo) em °C
+REGRAS_AC = {
+    "ac_residencial": (2, 18, 26),
+    "ac_automotivo": (3, 18, 24),
+    "ac_bebes": (1, 20, 24),
+}
+
+UMIDADE_IDEAL = (50, 60)
+
+# Texto das recomendações; {roupas} é preenchido uma vez por faixa, o resto por observação
+MODELO_RECOMENDACOES = """
+## 🧥 ROUPAS RECOMENDADAS
+
+**Para {temp}°C:**
+
+{roupas}
 
 ## 🏠 AR-CONDICIONADO RESIDENCIAL
-- Temperatura recomendada: **{max(18, min(26, temp - 2))}°C**
-- Umidade atual: {umidade}% {"(ideal: 50-60%)" if umidade < 50 or umidade > 60 else "(ideal)"}
+- Temperatura recomendada: **{ac_residencial}°C**
+- Umidade atual: {umidade}% {nota_umidade}
 
 ## 🚗 AR-CONDICIONADO AUTOMOTIVO
-- Temperatura recomendada: **{max(18, min(24, temp - 3))}°C**
+- Temperatura recomendada: **{ac_automotivo}°C**
 - Use ar externo se a temperatura externa for agradável
 - Recirculação interno se muito quente ou frio
 
 ## 👶 CUIDADOS COM BEBÊS
 - Vista o bebê com uma camada a mais que você usaria
-- AC para bebês: **{max(20, min(24, temp - 1))}°C**
+- AC para bebês: **{ac_bebes}°C**
 - Mantenha umidade entre 40-60%
 - Evite correntes de ar diretas
 """
-        
-        return recomendacoes
+
+class MotorRegras:
+    """Avalia a tabela de regras para uma observação ou para vetores de observações
     
-    # Tenta usar OpenAI
-    if openai_key:
-        try:
-            client = OpenAI(api_key=openai_key)
-            
-            prompt = f"""Você é um assistente especialista em conforto térmico e saúde. Dê conselhos precisos e práticos.
+    Os textos de cada faixa de roupas são montados uma única vez. Uma observação
+    isolada usa busca binária nos limites (microssegundos, sem NumPy), e os
+    textos das observações mais recentes ficam em memória; vetores são avaliados
+    de uma vez com NumPy.
+    """
+    
+    def __init__(self, faixas_roupas, regras_ac, umidade_ideal, modelo):
+        self.limites = [limite for limite, _, _ in faixas_roupas]
+        self.resumos = np.array([resumo for _, resumo, _ in faixas_roupas])
+        self.regras_ac = list(regras_ac.items())
+        self.umidade_ideal = umidade_ideal
+        self.modelos = [
+            modelo.replace("{roupas}", "".join(f"- {item}\n" for item in itens))
+            for _, _, itens in faixas_roupas
+        ]
+        self._limites = np.array(self.limites, dtype=float)
+        self._ajustes_ac = np.array([ajuste for _, ajuste in self.regras_ac], dtype=float).T
+        # typed: 25 e 25.0 são formatados de jeitos diferentes e não podem compartilhar o texto
+        self.texto = lru_cache(maxsize=1024, typed=True)(self._texto)
+    
+    def _texto(self, temp, umidade):
+        """Recomendações em Markdown para uma observação"""
+        minima, maxima = self.umidade_ideal
+        return self.modelos[bisect_right(self.limites, temp)].format(
+            temp=temp,
+            umidade=umidade,
+            nota_umidade="(ideal)" if minima <= umidade <= maxima else "(ideal: 50-60%)",
+            # max/min do Python mantêm o tipo (int ou float) e a formatação das regras originais
+            **{coluna: max(minimo, min(maximo, temp - desconto)) for coluna, (desconto, minimo, maximo) in self.regras_ac}
+        )
+    
+    def avaliar(self, temperaturas, umidades):
+        """Avalia vetores de observações: dicionário de arrays com faixa, roupas, ACs e umidade_ideal"""
+        temperaturas = np.asarray(temperaturas, dtype=float)
+        umidades = np.asarray(umidades, dtype=float)
+        faixa = np.searchsorted(self._limites, temperaturas, side="right")
+        descontos, minimos, maximos = self._ajustes_ac
+        acs = np.clip(temperaturas[:, None] - descontos, minimos, maximos)
+        resultado = {"faixa": faixa, "roupas": self.resumos[faixa]}
+        for indice, (coluna, _) in enumerate(self.regras_ac):
+            resultado[coluna] = acs[:, indice]
+        resultado["umidade_ideal"] = (umidades >= self.umidade_ideal[0]) & (umidades <= self.umidade_ideal[1])
+        return resultado
+
+MOTOR_REGRAS = MotorRegras(FAIXAS_ROUPAS, REGRAS_AC, UMIDADE_IDEAL, MODELO_RECOMENDACOES)
+
+def recomendacoes_fallback(temp, umidade, vento, descricao):
+    """Recomendações baseadas em regras, usadas quando a OpenAI não está disponível"""
+    return MOTOR_REGRAS.texto(temp, umidade)
+
+def recomendacoes_por_hora(previsao):
+    """Recomendações das regras para cada hora da previsão, avaliadas de uma vez
+    
+    Devolve uma cópia da previsão com as colunas roupas, ac_residencial,
+    ac_automotivo, ac_bebes e umidade_ideal.
+    """
+    avaliacao = MOTOR_REGRAS.avaliar(previsao["temperatura"].to_numpy(), previsao["umidade"].to_numpy())
+    resultado = previsao.copy()
+    for coluna in ["roupas", *REGRAS_AC, "umidade_ideal"]:
+        resultado[coluna] = avaliacao[coluna]
+    return resultado
+
+def montar_prompt_clima(weather_data):
+    """Monta o prompt enviado à OpenAI a partir dos dados do clima"""
+    prompt = f"""Você é um assistente especialista em conforto térmico e saúde. Dê conselhos precisos e práticos.
 
 CLIMA ATUAL: {weather_data['temperatura']}°C, sensação térmica de {weather_data['sensacao']}°C. 
 Condição: {weather_data['descricao']}. Umidade: {weather_data['umidade']}%. Vento: {weather_data['vento_kmh']} km/h.
@@ -609,66 +2797,386 @@ FORNEÇA RECOMENDAÇÕES ESPECÍFICAS:
 - Cuidados específicos de ventilação e umidade
 
 Use linguagem clara e direta. Seja específico com temperaturas e instruções."""
+    return prompt
 
-            resposta = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.7
-            )
-            return resposta.choices[0].message.content.strip()
+def parametros_openai(weather_data):
+    """Parâmetros da chamada de chat da OpenAI para um clima"""
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": montar_prompt_clima(weather_data)}],
+        "max_tokens": 800,
+        "temperature": 0.7
+    }
+
+@st.cache_resource(show_spinner=False)
+def obter_cliente_openai(api_key):
+    """Cliente OpenAI compartilhado pelo processo (mantém o pool de conexões aberto)"""
+    return OpenAI(
+        api_key=api_key,
+        base_url=obter_config("OPENAI_BASE_URL", None),
+        timeout=obter_config("OPENAI_TIMEOUT", 30.0),
+        max_retries=obter_config("OPENAI_TENTATIVAS", 2)
+    )
+
+@st.cache_resource(show_spinner=False)
+def obter_cliente_openai_async(api_key):
+    """Versão assíncrona do cliente OpenAI compartilhado"""
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=obter_config("OPENAI_BASE_URL", None),
+        timeout=obter_config("OPENAI_TIMEOUT", 30.0),
+        max_retries=obter_config("OPENAI_TENTATIVAS", 2)
+    )
+
+class ChamadaUnica:
+    """Agrupa chamadas idênticas simultâneas em uma só (single-flight)
+    
+    O primeiro a pedir uma chave vira o líder e executa a chamada; os demais
+    recebem o mesmo Future e aguardam o resultado do líder.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+    
+    @staticmethod
+    def chave(parametros):
+        return hashlib.sha256(json.dumps(parametros, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    
+    def iniciar(self, chave):
+        """Retorna (futuro, lider); o líder deve chamar concluir() ao terminar"""
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            if futuro is not None:
+                return futuro, False
+            futuro = Future()
+            self._em_andamento[chave] = futuro
+            return futuro, True
+    
+    def concluir(self, chave, resultado=None, erro=None):
+        """Entrega o resultado (ou erro) aos que aguardam; chamadas repetidas são ignoradas"""
+        with self._lock:
+            futuro = self._em_andamento.pop(chave, None)
+        # Já resolvido (ou cancelado por quem aguardava): não há mais a quem entregar
+        if futuro is None or futuro.done():
+            return
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+
+@st.cache_resource(show_spinner=False)
+def obter_chamadas_openai():
+    """Registro de chamadas à OpenAI em andamento, compartilhado entre sessões"""
+    return ChamadaUnica()
+
+def gerar_recomendacoes(weather_data, usar_cache=True, streaming=True, metricas=None):
+    """Gera as recomendações em partes de texto, à medida que ficam prontas
+    
+    Com streaming=True os tokens da OpenAI são repassados assim que chegam. Se
+    metricas for um dicionário, recebe a origem da resposta ('cache', 'openai' ou
+    'regras'), o tempo até o primeiro token e o tempo total, em segundos.
+    """
+    metricas = metricas if metricas is not None else {}
+    with medir("llm", "openai") as etapa:
+        # Permanece assim se a geração for abandonada no meio
+        etapa["resultado"] = "interrompida"
+        yield from _gerar_recomendacoes(weather_data, usar_cache, streaming, metricas)
+        etapa["resultado"] = "compartilhada" if metricas.get("compartilhada") else metricas["origem"]
+    obter_metricas().observar("llm_primeiro_token", metricas["primeiro_token_s"], etapa["resultado"], "openai")
+
+def _gerar_recomendacoes(weather_data, usar_cache, streaming, metricas):
+    openai_key = get_api_keys()[0]
+    inicio = time.perf_counter()
+    
+    def registrar(origem):
+        if "primeiro_token_s" not in metricas:
+            metricas["primeiro_token_s"] = time.perf_counter() - inicio
+        metricas["origem"] = origem
+    
+    # Tenta usar OpenAI
+    if openai_key:
+        cache = obter_cache_recomendacoes()
+        chave_cache = cache.chave(weather_data)
+        if usar_cache:
+            _, recomendacao_cache = cache.obter(chave_cache)
+            if recomendacao_cache:
+                registrar("cache")
+                yield recomendacao_cache
+                metricas["total_s"] = time.perf_counter() - inicio
+                return
+        
+        parametros = parametros_openai(weather_data)
+        chamadas = obter_chamadas_openai()
+        chave_chamada = chamadas.chave(parametros)
+        futuro, lider = chamadas.iniciar(chave_chamada)
+        
+        partes = []
+        try:
+            if not lider:
+                # Prompt idêntico já em andamento em outra sessão: reaproveita o resultado
+                recomendacao = futuro.result(timeout=2 * obter_config("OPENAI_TIMEOUT", 30.0))
+                if recomendacao:
+                    registrar("openai")
+                    metricas["compartilhada"] = True
+                    yield recomendacao
+                    metricas["total_s"] = time.perf_counter() - inicio
+                    return
+                raise RuntimeError("resposta vazia")
+            
+            client = obter_cliente_openai(openai_key)
+            resposta = client.chat.completions.create(**parametros, stream=streaming)
+            
+            if streaming:
+                for evento in resposta:
+                    if not evento.choices:
+                        continue
+                    texto = evento.choices[0].delta.content
+                    if texto:
+                        registrar("openai")
+                        partes.append(texto)
+                        yield texto
+            else:
+                registrar("openai")
+                partes.append(resposta.choices[0].message.content.strip())
+                yield partes[0]
+            
+            recomendacao = "".join(partes).strip()
+            chamadas.concluir(chave_chamada, recomendacao)
+            if recomendacao:
+                cache.guardar(chave_cache, recomendacao)
+                metricas["total_s"] = time.perf_counter() - inicio
+                return
         
         except Exception as e:
-            st.warning(f"⚠️ OpenAI API falhou: {str(e)}. Usando recomendações baseadas em regras.")
+            if lider:
+                chamadas.concluir(chave_chamada, erro=e)
+            if partes:
+                # A resposta já começou a ser exibida: mantém o texto parcial
+                notificar("warning", f"⚠️ OpenAI API interrompida: {str(e)}")
+                metricas["total_s"] = time.perf_counter() - inicio
+                return
+            notificar("warning", f"⚠️ OpenAI API falhou: {str(e)}. Usando recomendações baseadas em regras.")
+        
+        finally:
+            # Geração abandonada no meio (ex.: nova execução do script) não pode travar quem aguarda
+            if lider:
+                chamadas.concluir(chave_chamada, erro=RuntimeError("Geração interrompida"))
     
     # Fallback para recomendações baseadas em regras
-    return recomendacoes_fallback(
+    registrar("regras")
+    yield recomendacoes_fallback(
         weather_data['temperatura'],
         weather_data['umidade'],
         weather_data['vento_kmh'],
         weather_data['descricao']
     )
+    metricas["total_s"] = time.perf_counter() - inicio
 
-def main():
-    # Header principal
-    st.markdown("""
-    <div class="main-header">
-        <h1>🌡️ Smart Clima</h1>
-        <p>Assistente Inteligente de Conforto Térmico</p>
-    </div>
-    """, unsafe_allow_html=True)
+def interpretar_clima(weather_data, usar_cache=True):
+    """Gera recomendações usando OpenAI com fallback
     
-    # Sidebar com diagnósticos
-    with st.sidebar:
-        st.markdown("### 🔧 Diagnósticos do Sistema")
-        
-        # Teste de conectividade
-        with st.expander("🔌 Teste de Conectividade"):
-            if st.button("Testar Conexão"):
-                is_connected, working_urls = test_connectivity()
-                if is_connected:
-                    st.success(f"✅ Conectado! URLs funcionando: {len(working_urls)}")
-                else:
-                    st.error("❌ Sem conexão com a internet")
-        
-        # Status das APIs
-        st.markdown("### 📊 Status das APIs")
-        openai_key, weather_key = get_api_keys()
-        st.markdown(f"**OpenAI:** {'✅ Configurada' if openai_key else '❌ Não configurada'}")
-        st.markdown(f"**Weather:** {'✅ Configurada' if weather_key else '❌ Não configurada'}")
-        
-        if not openai_key:
-            st.warning("⚠️ OpenAI não configurada. Usando recomendações baseadas em regras.")
+    Com usar_cache=False a recomendação é sempre gerada de novo (e o cache atualizado).
+    """
+    return "".join(gerar_recomendacoes(weather_data, usar_cache=usar_cache, streaming=False))
+
+async def interpretar_clima_async(weather_data, usar_cache=True):
+    """Versão assíncrona de interpretar_clima, com o mesmo cache e agrupamento de chamadas"""
+    with medir("llm", "openai") as etapa:
+        openai_key = get_api_keys()[0]
         
-        if not weather_key:
-            st.warning("⚠️ Weather API não configurada. Usando dados estimados.")
+        if openai_key:
+            cache = obter_cache_recomendacoes()
+            chave_cache = cache.chave(weather_data)
+            if usar_cache:
+                _, recomendacao_cache = cache.obter(chave_cache)
+                if recomendacao_cache:
+                    etapa["resultado"] = "cache"
+                    return recomendacao_cache
+            
+            parametros = parametros_openai(weather_data)
+            chamadas = obter_chamadas_openai()
+            chave_chamada = chamadas.chave(parametros)
+            futuro, lider = chamadas.iniciar(chave_chamada)
+            try:
+                if lider:
+                    client = obter_cliente_openai_async(openai_key)
+                    resposta = await client.chat.completions.create(**parametros)
+                    recomendacao = resposta.choices[0].message.content.strip()
+                    chamadas.concluir(chave_chamada, recomendacao)
+                    if recomendacao:
+                        cache.guardar(chave_cache, recomendacao)
+                else:
+                    # shield: cancelar quem aguarda (ou estourar o tempo) não pode cancelar o
+                    # Future compartilhado com o líder; o limite é o mesmo da versão síncrona
+                    recomendacao = await asyncio.wait_for(
+                        asyncio.shield(asyncio.wrap_future(futuro)),
+                        2 * obter_config("OPENAI_TIMEOUT", 30.0)
+                    )
+                if recomendacao:
+                    etapa["resultado"] = "openai" if lider else "compartilhada"
+                    return recomendacao
+            except Exception as e:
+                if lider:
+                    chamadas.concluir(chave_chamada, erro=e)
+                notificar("warning", f"⚠️ OpenAI API falhou: {str(e)}. Usando recomendações baseadas em regras.")
+            finally:
+                if lider:
+                    chamadas.concluir(chave_chamada, erro=RuntimeError("Geração interrompida"))
         
-        # Informações sobre cidades disponíveis
-        st.markdown("### 🏙️ Cidades Disponíveis")
-        st.markdown(f"**Total:** {len(COORDENADAS_CIDADES)} cidades")
-        st.markdown("**Todas funcionam offline!**")
+        # Fallback para recomendações baseadas em regras
+        etapa["resultado"] = "regras"
+        return recomendacoes_fallback(
+            weather_data['temperatura'],
+            weather_data['umidade'],
+            weather_data['vento_kmh'],
+            weather_data['descricao']
+        )
+
+def pedir_regeneracao():
+    """Callback dos botões que pedem recomendações novas, sem usar o cache"""
+    st.session_state.regenerar_recomendacoes = True
+
+def registrar_metricas_llm(metricas):
+    """Guarda na sessão o tempo até o primeiro token e o tempo total de cada geração"""
+    if not metricas:
+        return
+    historico = st.session_state.setdefault('metricas_llm', [])
+    historico.append({
+        "origem": metricas.get("origem", "regras"),
+        "primeiro_token_s": metricas.get("primeiro_token_s", 0.0),
+        "total_s": metricas.get("total_s", 0.0),
+        "momento": datetime.now().strftime("%H:%M:%S")
+    })
+    del historico[:-20]
+
+def configurar_pagina():
+    """Configuração da página e CSS (só executado quando a interface é renderizada)"""
+    st.set_page_config(
+        page_title="Smart Clima",
+        page_icon="🌡️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(CSS_APP, unsafe_allow_html=True)
+
+@st.cache_resource(show_spinner=False)
+def cidades_ordenadas():
+    """Lista de cidades em ordem alfabética (calculada uma vez por processo)"""
+    return sorted(COORDENADAS_CIDADES.keys())
+
+@st.cache_resource(show_spinner=False)
+def cidades_por_letra():
+    """Cidades agrupadas pela letra inicial, para a seção de ajuda"""
+    cidades_organizadas = {}
+    for cidade in cidades_ordenadas():
+        cidades_organizadas.setdefault(cidade[0].upper(), []).append(cidade)
+    return [(letra, ", ".join(cidades_organizadas[letra])) for letra in sorted(cidades_organizadas)]
+
+def salvar_clima(clima, coordenadas=None):
+    """Guarda o clima consultado (e as coordenadas, se houver) na sessão"""
+    st.session_state.clima = clima
+    if coordenadas:
+        st.session_state.coordenadas = coordenadas
+
+def usar_cep_exemplo():
+    st.session_state.cep_input = "01310100"
+
+def usar_coordenadas_exemplo():
+    st.session_state.lat_input = "-23.550520"
+    st.session_state.lon_input = "-46.633308"
+
+def testar_cidade(nome, latitude, longitude):
+    """Callback dos botões de teste rápido: só marca a cidade; secao_entrada faz a busca"""
+    st.session_state.cidade_teste = (nome, latitude, longitude)
+
+@st.fragment
+def secao_diagnosticos():
+    """Diagnósticos da barra lateral; o teste de conexão só reexecuta este trecho"""
+    st.markdown("### 🔧 Diagnósticos do Sistema")
     
-    # Seção de entrada
+    # Teste de conectividade
+    with st.expander("🔌 Teste de Conectividade"):
+        col1, col2 = st.columns(2)
+        testar = col1.button("Testar Conexão")
+        forcar = col2.button("Verificar agora")
+        if testar or forcar:
+            diagnostico = obter_diagnostico_conectividade().obter(forcar=forcar)
+            alcancaveis = sum(sonda["status"] is not None for sonda in diagnostico["sondas"])
+            if diagnostico["conectado"]:
+                st.success(f"✅ Conectado! Serviços respondendo: {alcancaveis}/{len(diagnostico['sondas'])}")
+            else:
+                st.error("❌ Nenhum serviço respondeu. Verifique a conexão com a internet")
+            icones = {"ok": "🟢", "erro_http": "🟡", "indisponivel": "🔴", "timeout": "🔴", "conexao": "🔴"}
+            for sonda in diagnostico["sondas"]:
+                detalhe = f"HTTP {sonda['status']}" if sonda["status"] else sonda["estado"]
+                st.markdown(
+                    f"{icones[sonda['estado']]} **{sonda['nome']}** · {sonda['latencia_ms']} ms · {detalhe}"
+                )
+            st.caption(
+                f"Verificado há {int(time.time() - diagnostico['verificado_em'])} s "
+                f"(verificação em {diagnostico['duracao_ms']} ms)"
+            )
+    
+    # Status das APIs
+    st.markdown("### 📊 Status das APIs")
+    openai_key, weather_key = get_api_keys()
+    st.markdown(f"**OpenAI:** {'✅ Configurada' if openai_key else '❌ Não configurada'}")
+    st.markdown(f"**Weather:** {'✅ Configurada' if weather_key else '❌ Não configurada'}")
+    
+    if not openai_key:
+        st.warning("⚠️ OpenAI não configurada. Usando recomendações baseadas em regras.")
+    
+    if not weather_key:
+        st.warning("⚠️ Weather API não configurada. Usando dados estimados.")
+    
+    saude_provedores = obter_saude_provedores().resumo()
+    if saude_provedores:
+        with st.expander("🩺 Saúde dos provedores"):
+            icones = {"fechado": "🟢", "meio-aberto": "🟡", "aberto": "🔴"}
+            for provedor in saude_provedores:
+                latencia = f"{provedor['latencia_ms']} ms" if provedor['latencia_ms'] is not None else "—"
+                st.markdown(
+                    f"{icones[provedor['estado']]} **{provedor['provedor']}** · {latencia} · "
+                    f"erros {provedor['taxa_erro']:.0%}"
+                )
+    
+    estatisticas_clima = obter_cache_clima().estatisticas()
+    st.caption(
+        f"🗄️ Cache de clima: {estatisticas_clima['entradas']} locais "
+        f"({estatisticas_clima['bytes'] // 1024} KB) · "
+        f"{estatisticas_clima['acertos']} acertos / {estatisticas_clima['faltas']} faltas"
+    )
+    
+    aquecimento = obter_aquecedor_clima().estatisticas()
+    if aquecimento["rodadas"]:
+        st.caption(
+            f"🔥 Clima pré-carregado: {aquecimento['aquecidos']}/{aquecimento['pontos']} cidades e capitais · "
+            f"última rodada há {int(aquecimento['idade_rodada_s'] // 60)} min"
+        )
+    
+    latencias = obter_metricas().resumo()
+    if latencias:
+        with st.expander("⏱️ Latência por etapa"):
+            for item in latencias:
+                st.markdown(
+                    f"**{item['etapa']}** · {item['total']}× · p50 {item['p50_ms']} ms · "
+                    f"p95 {item['p95_ms']} ms · p99 {item['p99_ms']} ms · "
+                    f"falhas/fallback {item['taxa_degradada']:.0%}"
+                )
+            servidor_metricas = iniciar_servidor_metricas()
+            if servidor_metricas:
+                host, porta = servidor_metricas.server_address[:2]
+                st.caption(f"Métricas Prometheus em http://{host}:{porta}/metrics")
+    
+    # Informações sobre cidades disponíveis
+    st.markdown("### 🏙️ Cidades Disponíveis")
+    st.markdown(f"**Total:** {len(COORDENADAS_CIDADES)} cidades")
+    st.markdown("**Todas funcionam offline!**")
+
+@st.fragment
+def secao_entrada():
+    """Entrada de localização; só uma busca bem-sucedida reexecuta a página inteira"""
     st.markdown('<div class="input-section">', unsafe_allow_html=True)
     st.markdown("### 📍 Informe sua localização")
     
@@ -683,9 +3191,7 @@ def main():
         with col1:
             search_cep = st.button("🔍 Buscar", key="search_cep", type="primary")
         with col2:
-            if st.button("📋 Usar CEP exemplo (São Paulo)", key="example_cep"):
-                st.session_state.cep_input = "01310100"
-                st.rerun()
+            st.button("📋 Usar CEP exemplo (São Paulo)", key="example_cep", on_click=usar_cep_exemplo)
     
     with tab2:
         st.markdown("**Digite as coordenadas:**")
@@ -699,15 +3205,18 @@ def main():
         with col1:
             search_coords = st.button("🔍 Buscar", key="search_coords", type="primary")
         with col2:
-            if st.button("📋 Usar coordenadas exemplo", key="example_coords"):
-                st.session_state.lat_input = "-23.550520"
-                st.session_state.lon_input = "-46.633308"
-                st.rerun()
+            st.button("📋 Usar coordenadas exemplo", key="example_coords", on_click=usar_coordenadas_exemplo)
     
     with tab3:
         st.markdown("**Selecione uma cidade:**")
-        cidades_disponiveis = list(COORDENADAS_CIDADES.keys())
-        cidades_disponiveis.sort()  # Ordena alfabeticamente
+        filtro_cidade = st.text_input("Filtrar", placeholder="Digite o início do nome, ex: sao", key="cidade_filtro")
+        
+        if filtro_cidade:
+            cidades_disponiveis = obter_indice_cidades().sugerir(filtro_cidade)
+            if not cidades_disponiveis:
+                st.caption(f"Nenhuma cidade começa com '{filtro_cidade}'")
+        else:
+            cidades_disponiveis = cidades_ordenadas()
         
         cidade = st.selectbox("Cidade", cidades_disponiveis, key="cidade_select")
         
@@ -761,8 +3270,7 @@ def main():
                         if endereco_info.get('cidade'):
                             clima["cidade"] = endereco_info['cidade']
                     
-                    st.session_state.clima = clima
-                    st.session_state.coordenadas = (lat, lon)
+                    salvar_clima(clima, (lat, lon))
                     st.rerun()
     
     # Processamento coordenadas
@@ -777,12 +3285,21 @@ def main():
             else:
                 with st.spinner("🌤️ Obtendo dados do clima..."):
                     clima = get_weather_fallback(lat, lon)
-                    st.session_state.clima = clima
-                    st.session_state.coordenadas = (lat, lon)
+                    salvar_clima(clima, (lat, lon))
                     st.rerun()
         except ValueError:
             st.markdown('<div class="error-message">❌ Coordenadas inválidas. Use formato numérico.</div>', unsafe_allow_html=True)
     
+    # Teste rápido (botões da ajuda): buscado aqui, e não no callback, para que os avisos
+    # apareçam na página; a execução é completa, então o clima já é exibido nela
+    cidade_teste = st.session_state.pop('cidade_teste', None)
+    if cidade_teste:
+        nome, lat, lon = cidade_teste
+        with st.spinner("🌤️ Obtendo dados do clima..."):
+            clima = get_weather_fallback(lat, lon)
+            clima["cidade"] = nome
+            salvar_clima(clima, (lat, lon))
+    
     # Processamento cidade
     if search_cidade and cidade:
         try:
@@ -797,8 +3314,7 @@ def main():
                 with st.spinner("🌤️ Obtendo dados do clima..."):
                     clima = get_weather_fallback(lat, lon)
                     clima["cidade"] = cidade  # Usa o nome selecionado
-                    st.session_state.clima = clima
-                    st.session_state.coordenadas = (lat, lon)
+                    salvar_clima(clima, (lat, lon))
                     st.rerun()
             else:
                 st.error(f"❌ Não foi possível encontrar coordenadas para {cidade}")
@@ -811,174 +3327,299 @@ def main():
             lat, lon = -23.5505, -46.6333
             clima = get_weather_fallback(lat, lon)
             clima["cidade"] = "São Paulo (fallback)"
-            st.session_state.clima = clima
-            st.session_state.coordenadas = (lat, lon)
+            salvar_clima(clima, (lat, lon))
             st.rerun()
+
+def secao_clima():
+    """Card e métricas do clima consultado"""
+    clima = st.session_state.clima
     
-    # Exibição dos dados do clima
-    if 'clima' in st.session_state:
-        clima = st.session_state.clima
-        
-        # Aviso se usando dados de fallback
-        if clima.get("fallback", False):
-            st.markdown("""
-            <div class="diagnostic-card">
-                <h4>⚠️ Modo Offline</h4>
-                <p>Usando dados estimados baseados na localização. Para dados precisos, verifique sua conexão e configure as APIs.</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Card do clima com endereço
-        clima_header = f"🌤️ Clima em {clima['cidade']}, {clima['pais']}"
+    # Aviso se usando dados de fallback
+    if clima.get("historico"):
+        st.markdown(f"""
+        <div class="diagnostic-card">
+            <h4>📼 Última observação real</h4>
+            <p>WeatherAPI indisponível. Mostrando o clima observado em {clima['timestamp']} ({idade_dados(clima)}), a {clima['distancia_km']} km deste local.</p>
+        </div>
+        """, unsafe_allow_html=True)
+    elif clima.get("estimativa_aproximada"):
+        st.markdown("""
+        <div class="diagnostic-card">
+            <h4>⚠️ Modo Offline</h4>
+            <p>WeatherAPI indisponível. Mostrando uma estimativa aproximada para o mês e o horário, interpolada de médias das capitais: não é uma observação e pode diferir bastante do tempo real.</p>
+        </div>
+        """, unsafe_allow_html=True)
+    elif clima.get("climatologia"):
+        st.markdown("""
+        <div class="diagnostic-card">
+            <h4>⚠️ Modo Offline</h4>
+            <p>WeatherAPI indisponível. Mostrando valores típicos deste local para o mês e o horário (normal climatológica), não uma observação.</p>
+        </div>
+        """, unsafe_allow_html=True)
+    elif clima.get("fallback", False):
+        st.markdown("""
+        <div class="diagnostic-card">
+            <h4>⚠️ Modo Offline</h4>
+            <p>Usando dados estimados baseados na localização. Para dados precisos, verifique sua conexão e configure as APIs.</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Card do clima com endereço
+    clima_header = f"🌤️ Clima em {clima['cidade']}, {clima['pais']}"
+    
+    # Se tiver endereço do CEP, exibe informações mais detalhadas
+    if clima.get('endereco'):
+        endereco_info = clima['endereco']
         
-        # Se tiver endereço do CEP, exibe informações mais detalhadas
-        if clima.get('endereco'):
-            endereco_info = clima['endereco']
-            
-            st.markdown(f"""
-            <div class="weather-card">
-                <h2>{clima_header}</h2>
-                <div style="background: rgba(255,255,255,0.1); padding: 1rem; border-radius: 8px; margin: 1rem 0;">
-                    <h4>📍 Endereço Completo:</h4>
-                    <p><strong>{clima.get('endereco_formatado', '')}</strong></p>
-                    {f"<p>🏠 <strong>Rua:</strong> {endereco_info.get('rua', 'Não disponível')}</p>" if endereco_info.get('rua') else ""}
-                    {f"<p>🏘️ <strong>Bairro:</strong> {endereco_info.get('bairro', 'Não disponível')}</p>" if endereco_info.get('bairro') else ""}
-                    {f"<p>📞 <strong>DDD:</strong> {endereco_info.get('ddd', 'Não disponível')}</p>" if endereco_info.get('ddd') else ""}
-                </div>
-                <p>Última atualização: {clima['timestamp']}</p>
+        st.markdown(f"""
+        <div class="weather-card">
+            <h2>{clima_header}</h2>
+            <div style="background: rgba(255,255,255,0.1); padding: 1rem; border-radius: 8px; margin: 1rem 0;">
+                <h4>📍 Endereço Completo:</h4>
+                <p><strong>{clima.get('endereco_formatado', '')}</strong></p>
+                {f"<p>🏠 <strong>Rua:</strong> {endereco_info.get('rua', 'Não disponível')}</p>" if endereco_info.get('rua') else ""}
+                {f"<p>🏘️ <strong>Bairro:</strong> {endereco_info.get('bairro', 'Não disponível')}</p>" if endereco_info.get('bairro') else ""}
+                {f"<p>📞 <strong>DDD:</strong> {endereco_info.get('ddd', 'Não disponível')}</p>" if endereco_info.get('ddd') else ""}
             </div>
-            """, unsafe_allow_html=True)
+            <p>Última atualização: {clima['timestamp']}{f" ({idade_dados(clima)})" if clima.get('obtido_em') else ""}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="weather-card">
+            <h2>{clima_header}</h2>
+            <p>Última atualização: {clima['timestamp']}{f" ({idade_dados(clima)})" if clima.get('obtido_em') else ""}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Métricas do clima
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("🌡️ Temperatura", f"{clima['temperatura']}°C", 
+                 delta=f"Sensação: {clima['sensacao']}°C")
+    
+    with col2:
+        st.metric("💧 Umidade", f"{clima['umidade']}%")
+    
+    with col3:
+        st.metric("💨 Vento", f"{clima['vento_kmh']} km/h")
+    
+    with col4:
+        st.metric("☁️ Condição", clima['descricao'])
+
+def grafico_previsao(previsao):
+    """Linha do tempo da previsão: temperatura, sensação e a faixa de roupas de cada hora"""
+    cores = dict(zip([resumo for _, resumo, _ in FAIXAS_ROUPAS], ["#3b82f6", "#22c55e", "#f59e0b", "#ef4444"]))
+    figura = go.Figure()
+    figura.add_trace(go.Bar(
+        x=previsao["hora"], y=previsao["chance_chuva"], name="Chance de chuva (%)",
+        yaxis="y2", marker_color="rgba(100, 149, 237, 0.25)"
+    ))
+    figura.add_trace(go.Scatter(
+        x=previsao["hora"], y=previsao["sensacao"], name="Sensação (°C)",
+        mode="lines", line={"dash": "dot", "color": "#764ba2"}
+    ))
+    figura.add_trace(go.Scatter(
+        x=previsao["hora"], y=previsao["temperatura"], name="Temperatura (°C)",
+        mode="lines+markers", line={"color": "#667eea"},
+        marker={"size": 8, "color": previsao["roupas"].map(cores).tolist()},
+        customdata=previsao[["roupas", "ac_residencial", "ac_automotivo", "ac_bebes"]].to_numpy(),
+        hovertemplate=(
+            "%{x|%d/%m %Hh}: %{y}°C<br>🧥 %{customdata[0]}<br>🏠 AC %{customdata[1]}°C · "
+            "🚗 AC %{customdata[2]}°C · 👶 AC %{customdata[3]}°C<extra></extra>"
+        )
+    ))
+    figura.update_layout(
+        height=360, margin={"l": 10, "r": 10, "t": 30, "b": 10}, hovermode="x unified",
+        legend={"orientation": "h", "y": 1.1},
+        yaxis={"title": "°C"},
+        yaxis2={"overlaying": "y", "side": "right", "range": [0, 100], "showgrid": False, "title": "%"}
+    )
+    return figura
+
+@st.fragment
+def secao_previsao():
+    """Previsão por hora: trocar o período reexecuta só este trecho"""
+    coordenadas = st.session_state.get('coordenadas')
+    if not coordenadas:
+        return
+    
+    if not st.toggle("📈 Previsão por hora", key="mostrar_previsao"):
+        return
+    
+    horas = st.radio("Período", [24, 48, 72], format_func=lambda h: f"{h} horas", horizontal=True, key="horas_previsao")
+    previsao = get_previsao_horaria(coordenadas[0], coordenadas[1], horas)
+    if previsao is None or previsao.empty:
+        st.info("ℹ️ Previsão por hora indisponível: configure a WeatherAPI para usá-la.")
+        return
+    
+    if len(previsao) < horas:
+        st.caption(f"ℹ️ A WeatherAPI retornou {len(previsao)} das {horas} horas pedidas (limite de dias do plano).")
+    
+    previsao = recomendacoes_por_hora(previsao)
+    st.plotly_chart(grafico_previsao(previsao))
+    
+    tabela = pd.DataFrame({
+        "Hora": previsao["hora"].dt.strftime("%d/%m %Hh"),
+        "🌡️ °C": previsao["temperatura"],
+        "💧 %": previsao["umidade"],
+        "💨 km/h": previsao["vento_kmh"],
+        "☁️ Condição": previsao["descricao"],
+        "🧥 Roupas": previsao["roupas"],
+        "🏠 AC": previsao["ac_residencial"],
+        "🚗 AC": previsao["ac_automotivo"],
+        "👶 AC": previsao["ac_bebes"],
+    })
+    st.dataframe(tabela, hide_index=True)
+
+@st.fragment
+def secao_recomendacoes():
+    """Recomendações: gerar, atualizar e dar feedback reexecutam só este trecho"""
+    clima = st.session_state.clima
+    
+    # Seção de recomendações
+    st.markdown("""
+    <div class="recommendation-card">
+        <h3>🤖 Recomendações Personalizadas</h3>
+        <p>Obtenha recomendações inteligentes baseadas no clima atual</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        generate_recommendations = st.button("🎯 Gerar Recomendações", type="primary")
+    
+    # "Atualizar" e "Gerar Novamente" ignoram o cache de recomendações
+    regenerar = st.session_state.pop('regenerar_recomendacoes', False)
+    if generate_recommendations or regenerar:
+        metricas = {}
+        # O texto parcial é substituído pela exibição final nesta mesma execução (sem rerun)
+        area_streaming = st.empty()
+        if obter_config("LLM_STREAMING", True):
+            with area_streaming.container():
+                st.markdown("### 📋 Suas Recomendações")
+                recomendacoes = st.write_stream(
+                    gerar_recomendacoes(clima, usar_cache=not regenerar, metricas=metricas)
+                )
         else:
-            st.markdown(f"""
-            <div class="weather-card">
-                <h2>{clima_header}</h2>
-                <p>Última atualização: {clima['timestamp']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Métricas do clima
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("🌡️ Temperatura", f"{clima['temperatura']}°C", 
-                     delta=f"Sensação: {clima['sensacao']}°C")
+            with st.spinner("🤖 Gerando recomendações..."):
+                recomendacoes = "".join(
+                    gerar_recomendacoes(clima, usar_cache=not regenerar, streaming=False, metricas=metricas)
+                )
+        area_streaming.empty()
+        st.session_state.recomendacoes = recomendacoes.strip()
+        registrar_metricas_llm(metricas)
+    
+    with col2:
+        if 'recomendacoes' in st.session_state:
+            st.button("🔄 Atualizar Recomendações", on_click=pedir_regeneracao)
+    
+    # Exibir recomendações
+    if 'recomendacoes' in st.session_state:
+        st.markdown("### 📋 Suas Recomendações")
+        st.markdown(st.session_state.recomendacoes)
         
-        with col2:
-            st.metric("💧 Umidade", f"{clima['umidade']}%")
+        if st.session_state.get('metricas_llm'):
+            ultima = st.session_state.metricas_llm[-1]
+            st.caption(
+                f"⚡ Primeiro token em {ultima['primeiro_token_s']:.2f} s · "
+                f"total {ultima['total_s']:.2f} s · origem: {ultima['origem']}"
+            )
         
-        with col3:
-            st.metric("💨 Vento", f"{clima['vento_kmh']} km/h")
+        # Botão para salvar recomendações
+        endereco_completo = ""
+        if clima.get('endereco_formatado'):
+            endereco_completo = f"**Endereço:** {clima['endereco_formatado']}\n"
         
-        with col4:
-            st.metric("☁️ Condição", clima['descricao'])
+        st.download_button(
+            label="💾 Salvar Recomendações",
+            data=f"# Recomendações Smart Clima\n\n**Local:** {clima['cidade']}, {clima['pais']}\n{endereco_completo}**Data:** {datetime.now().strftime('%d/%m/%Y %H:%M')}\n**Temperatura:** {clima['temperatura']}°C\n**Modo:** {'Offline' if clima.get('fallback', False) else 'Online'}\n\n{st.session_state.recomendacoes}",
+            file_name=f"recomendacoes_clima_{datetime.now().strftime('%Y%m%d_%H%M')}.md",
+            mime="text/markdown"
+        )
         
-        # Seção de recomendações
-        st.markdown("""
-        <div class="recommendation-card">
-            <h3>🤖 Recomendações Personalizadas</h3>
-            <p>Obtenha recomendações inteligentes baseadas no clima atual</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns([1, 3])
+        # Feedback do usuário
+        st.markdown("---")
+        st.markdown("### 📝 Feedback")
+        col1, col2, col3 = st.columns(3)
         with col1:
-            generate_recommendations = st.button("🎯 Gerar Recomendações", type="primary")
+            if st.button("👍 Útil"):
+                st.success("Obrigado pelo feedback!")
         with col2:
-            if 'recomendacoes' in st.session_state:
-                if st.button("🔄 Atualizar Recomendações"):
-                    del st.session_state.recomendacoes
-                    st.rerun()
-        
-        if generate_recommendations:
-            with st.spinner("🤖 Gerando recomendações..."):
-                recomendacoes = interpretar_clima(clima)
-                st.session_state.recomendacoes = recomendacoes
-                st.rerun()
-        
-        # Exibir recomendações
-        if 'recomendacoes' in st.session_state:
-            st.markdown("### 📋 Suas Recomendações")
-            st.markdown(st.session_state.recomendacoes)
-            
-            # Botão para salvar recomendações
-            endereco_completo = ""
-            if clima.get('endereco_formatado'):
-                endereco_completo = f"**Endereço:** {clima['endereco_formatado']}\n"
-            
-            st.download_button(
-                label="💾 Salvar Recomendações",
-                data=f"# Recomendações Smart Clima\n\n**Local:** {clima['cidade']}, {clima['pais']}\n{endereco_completo}**Data:** {datetime.now().strftime('%d/%m/%Y %H:%M')}\n**Temperatura:** {clima['temperatura']}°C\n**Modo:** {'Offline' if clima.get('fallback', False) else 'Online'}\n\n{st.session_state.recomendacoes}",
-                file_name=f"recomendacoes_clima_{datetime.now().strftime('%Y%m%d_%H%M')}.md",
-                mime="text/markdown"
-            )
-            
-            # Feedback do usuário
-            st.markdown("---")
-            st.markdown("### 📝 Feedback")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                if st.button("👍 Útil"):
-                    st.success("Obrigado pelo feedback!")
-            with col2:
-                if st.button("👎 Não útil"):
-                    st.info("Obrigado! Vamos melhorar.")
-            with col3:
-                if st.button("🔄 Gerar Novamente"):
-                    del st.session_state.recomendacoes
-                    st.rerun()
+            if st.button("👎 Não útil"):
+                st.info("Obrigado! Vamos melhorar.")
+        with col3:
+            st.button("🔄 Gerar Novamente", on_click=pedir_regeneracao)
+
+def secao_ajuda():
+    """Ajuda e testes rápidos, exibidos enquanto nenhum clima foi consultado"""
+    st.markdown("---")
+    st.markdown("### 🆘 Problemas de Conexão?")
     
-    # Seção de ajuda
-    if not st.session_state.get('clima'):
-        st.markdown("---")
-        st.markdown("### 🆘 Problemas de Conexão?")
+    with st.expander("🔧 Soluções para Problemas Comuns"):
+        st.markdown("""
+        **Se não conseguir conectar:**
         
-        with st.expander("🔧 Soluções para Problemas Comuns"):
-            st.markdown("""
-            **Se não conseguir conectar:**
-            
-            1. **Verifique sua internet** - Teste acessando outros sites
-            2. **Use coordenadas** - Mais confiável que CEP
-            3. **Selecione uma cidade** - Funciona offline
-            4. **Aguarde um momento** - Algumas redes são mais lentas
-            
-            **APIs não configuradas:**
-            - OpenAI: Configure `OPENAI_API_KEY` para recomendações avançadas
-            - Weather: Configure `WEATHER_API_KEY` para dados precisos
-            
-            **Mesmo sem APIs, o app funciona com:**
-            - Dados climáticos estimados
-            - Recomendações baseadas em regras
-            - Múltiplas cidades brasileiras
-            """)
+        1. **Verifique sua internet** - Teste acessando outros sites
+        2. **Use coordenadas** - Mais confiável que CEP
+        3. **Selecione uma cidade** - Funciona offline
+        4. **Aguarde um momento** - Algumas redes são mais lentas
         
-        st.markdown("### 🎯 Teste Rápido")
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🏙️ Testar com São Paulo", type="primary"):
-                clima = get_weather_fallback(-23.5505, -46.6333)
-                clima["cidade"] = "São Paulo"
-                st.session_state.clima = clima
-                st.rerun()
+        **APIs não configuradas:**
+        - OpenAI: Configure `OPENAI_API_KEY` para recomendações avançadas
+        - Weather: Configure `WEATHER_API_KEY` para dados precisos
         
-        with col2:
-            if st.button("🏖️ Testar com Rio de Janeiro", type="primary"):
-                clima = get_weather_fallback(-22.9068, -43.1729)
-                clima["cidade"] = "Rio de Janeiro"
-                st.session_state.clima = clima
-                st.rerun()
-        
-        # Mostrar cidades disponíveis
-        st.markdown("### 🏙️ Cidades Disponíveis")
-        with st.expander("Ver todas as cidades"):
-            cidades_organizadas = {}
-            for cidade in COORDENADAS_CIDADES.keys():
-                primeira_letra = cidade[0].upper()
-                if primeira_letra not in cidades_organizadas:
-                    cidades_organizadas[primeira_letra] = []
-                cidades_organizadas[primeira_letra].append(cidade)
-            
-            for letra in sorted(cidades_organizadas.keys()):
-                st.markdown(f"**{letra}:** {', '.join(sorted(cidades_organizadas[letra]))}")
+        **Mesmo sem APIs, o app funciona com:**
+        - Dados climáticos estimados
+        - Recomendações baseadas em regras
+        - Múltiplas cidades brasileiras
+        """)
+    
+    st.markdown("### 🎯 Teste Rápido")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("🏙️ Testar com São Paulo", type="primary",
+                  on_click=testar_cidade, args=("São Paulo", -23.5505, -46.6333))
+    
+    with col2:
+        st.button("🏖️ Testar com Rio de Janeiro", type="primary",
+                  on_click=testar_cidade, args=("Rio de Janeiro", -22.9068, -43.1729))
+    
+    # Mostrar cidades disponíveis
+    st.markdown("### 🏙️ Cidades Disponíveis")
+    with st.expander("Ver todas as cidades"):
+        for letra, cidades in cidades_por_letra():
+            st.markdown(f"**{letra}:** {cidades}")
+
+def main():
+    configurar_pagina()
+    iniciar_servidor_metricas()
+    iniciar_aquecedor_clima()
+    obter_diagnostico_conectividade().iniciar()
+    
+    # Header principal
+    st.markdown("""
+    <div class="main-header">
+        <h1>🌡️ Smart Clima</h1>
+        <p>Assistente Inteligente de Conforto Térmico</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Sidebar com diagnósticos
+    with st.sidebar:
+        secao_diagnosticos()
+    
+    secao_entrada()
+    
+    # Exibição dos dados do clima
+    if st.session_state.get('clima'):
+        secao_clima()
+        secao_previsao()
+        secao_recomendacoes()
+    else:
+        # Seção de ajuda
+        secao_ajuda()
 
 if __name__ == "__main__":
     main()
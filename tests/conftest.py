@@ -0,0 +1,23 @@
+"""Configuração comum dos testes: caches em diretório temporário e nenhuma chave de API"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_DIRETORIO = tempfile.mkdtemp(prefix="smart_clima_testes_")
+for variavel, arquivo in (
+    ("CEP_CACHE_PATH", "cep.sqlite3"),
+    ("REC_CACHE_PATH", "rec.sqlite3"),
+    ("HISTORICO_PATH", "historico.sqlite3"),
+):
+    os.environ[variavel] = os.path.join(_DIRETORIO, arquivo)
+os.environ["METRICAS_PORTA"] = "0"
+os.environ["CLIMA_AQUECIMENTO"] = "false"
+for variavel in ("OPENAI_API_KEY", "WEATHER_API_KEY"):
+    os.environ.pop(variavel, None)
+
+import streamlit.logger  # noqa: E402
+
+# Fora do `streamlit run` cada chamada avisaria que não há ScriptRunContext
+streamlit.logger.set_log_level("error")
@@ -0,0 +1,119 @@
+import pytest
+from starlette.testclient import TestClient
+
+import clima_api
+from streamlit_app import notificar
+
+CLIMA = {"temperatura": 21.5, "sensacao": 22.0, "umidade": 60, "vento_kmh": 8.0, "descricao": "Ensolarado"}
+
+
+@pytest.fixture(scope="module")
+def cliente():
+    # Sem o `with`, o ciclo de vida (aquecedor e diagnóstico em segundo plano) não é iniciado
+    return TestClient(clima_api.app)
+
+
+def test_recomendacoes_com_clima_no_corpo(cliente):
+    resposta = cliente.post("/recommendations", json=CLIMA)
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert corpo["clima"] == CLIMA
+    assert "ROUPAS" in corpo["recomendacoes"]
+
+
+@pytest.mark.parametrize("alteracao", [
+    {"temperatura": "abc"},
+    {"umidade": None},
+    {"vento_kmh": [1, 2]},
+    {"descricao": 42},
+])
+def test_recomendacoes_com_corpo_malformado(cliente, alteracao):
+    resposta = cliente.post("/recommendations", json={**CLIMA, **alteracao})
+    assert resposta.status_code == 400
+    assert "erro" in resposta.json()
+
+
+def test_recomendacoes_sem_campo_ou_sem_json(cliente):
+    corpo = dict(CLIMA)
+    del corpo["sensacao"]
+    assert cliente.post("/recommendations", json=corpo).status_code == 400
+    assert cliente.post("/recommendations", content=b"<html>").status_code == 400
+
+
+def test_coordenadas_invalidas(cliente):
+    assert cliente.get("/weather", params={"lat": "abc", "lon": "1"}).status_code == 400
+    assert cliente.get("/weather", params={"lat": "100", "lon": "1"}).status_code == 400
+    assert cliente.post("/weather", json={"pontos": [{"lat": 1}]}).status_code == 400
+
+
+def test_reverse_em_lote(cliente):
+    resposta = cliente.post("/reverse", json={"pontos": [{"lat": -23.6, "lon": -46.7}, {"lat": -5, "lon": -70}]})
+    assert resposta.status_code == 200
+    sao_paulo, nenhum = resposta.json()["municipios"]
+    assert (sao_paulo["nome"], sao_paulo["uf"]) == ("São Paulo", "SP")
+    assert nenhum is None
+
+
+def test_cep_com_diagnosticos(cliente, monkeypatch):
+    def buscar(cep):
+        # As mensagens de status viram o campo diagnosticos da resposta
+        notificar("success", "✅ API 1 funcionou!")
+        return -23.55, -46.63, {"cidade": "São Paulo", "uf": "SP"}, None
+
+    monkeypatch.setattr(clima_api, "buscar_cep_completo", buscar)
+    resposta = cliente.get("/cep/01001-000")
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert (corpo["lat"], corpo["lon"], corpo["endereco"]["uf"]) == (-23.55, -46.63, "SP")
+    assert corpo["diagnosticos"] == [{"nivel": "success", "mensagem": "✅ API 1 funcionou!"}]
+
+
+def test_cep_invalido_ou_nao_encontrado(cliente, monkeypatch):
+    monkeypatch.setattr(clima_api, "buscar_cep_completo", lambda cep: (None, None, None, "Não encontrado"))
+    assert cliente.get("/cep/123").status_code == 400
+    resposta = cliente.get("/cep/99999999")
+    assert resposta.status_code == 404
+    assert resposta.json()["erro"] == "Não encontrado"
+
+
+def test_clima_de_um_ponto_e_em_lote(cliente, monkeypatch):
+    monkeypatch.setattr(clima_api, "get_weather_fallback", lambda lat, lon: dict(CLIMA, cidade=f"{lat},{lon}"))
+    monkeypatch.setattr(clima_api, "get_weather_lote",
+                        lambda pontos: [dict(CLIMA, cidade=f"{lat},{lon}") for lat, lon in pontos])
+
+    resposta = cliente.get("/weather", params={"lat": "-23.5", "lon": "-46.6"})
+    assert resposta.json()["clima"]["cidade"] == "-23.5,-46.6"
+
+    resposta = cliente.post("/weather", json={"pontos": [{"lat": 1, "lon": 2}, {"lat": "3", "lon": "4"}]})
+    assert [clima["cidade"] for clima in resposta.json()["climas"]] == ["1.0,2.0", "3.0,4.0"]
+
+
+def test_recomendacoes_por_coordenadas_e_regeneracao(cliente, monkeypatch):
+    chamadas = []
+
+    async def interpretar(clima, usar_cache=True):
+        chamadas.append(usar_cache)
+        return "Leve guarda-chuva"
+
+    monkeypatch.setattr(clima_api, "get_weather_fallback", lambda lat, lon: dict(CLIMA))
+    monkeypatch.setattr(clima_api, "interpretar_clima_async", interpretar)
+    resposta = cliente.get("/recommendations", params={"lat": "-23.5", "lon": "-46.6"})
+    assert resposta.json()["recomendacoes"] == "Leve guarda-chuva"
+    cliente.get("/recommendations", params={"lat": "-23.5", "lon": "-46.6", "regenerar": "1"})
+    assert chamadas == [True, False]
+
+
+def test_saude_e_metricas(cliente, monkeypatch):
+    assert cliente.get("/health").json() == {"status": "ok"}
+
+    class Diagnostico:
+        def obter(self):
+            return {"conectado": False, "servicos": []}
+
+    monkeypatch.setattr(clima_api, "obter_diagnostico_conectividade", Diagnostico)
+    assert cliente.get("/health", params={"dependencias": "1"}).json()["status"] == "degradado"
+
+    resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("text/plain")
+    assert "# TYPE smart_clima_etapa_segundos histogram" in resposta.text
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+import streamlit_app
+from streamlit_app import AquecedorClima
+
+PONTOS = [(-23.5505, -46.6333), (-22.9068, -43.1729), (-15.7939, -47.8828)]
+
+
+class ConsultaFalsa:
+    """Substitui consultar_clima_lote: conta as rodadas e deixa de responder pontos escolhidos"""
+
+    def __init__(self):
+        self.rodadas = 0
+        self.sem_resposta = set()
+        self.rodou = threading.Event()
+
+    def __call__(self, pontos, weather_key, silencioso=False, concorrencia=1):
+        self.rodadas += 1
+        self.rodou.set()
+        return [
+            None if ponto in self.sem_resposta
+            else {"temperatura": 20.0 + self.rodadas, "cidade": f"{ponto}", "obtido_em": time.time()}
+            for ponto in pontos
+        ]
+
+
+@pytest.fixture
+def consulta(monkeypatch):
+    consulta = ConsultaFalsa()
+    monkeypatch.setattr(streamlit_app, "consultar_clima_lote", consulta)
+    monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: (None, "chave-teste"))
+    return consulta
+
+
+def aquecedor(intervalo=60.0, idade_maxima=60.0):
+    return AquecedorClima(PONTOS, intervalo=intervalo, jitter=0.1, concorrencia=2, idade_maxima=idade_maxima)
+
+
+def esperar(condicao, limite=2.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "condição não atingida a tempo"
+        time.sleep(0.005)
+
+
+def test_rodada_guarda_os_pontos_respondidos(consulta):
+    consulta.sem_resposta.add(PONTOS[2])
+    instancia = aquecedor()
+    assert instancia.atualizar() == 2
+    assert instancia.obter(*PONTOS[0])["temperatura"] == 21.0
+    assert instancia.obter(*PONTOS[2]) is None
+    assert instancia.obter(0.0, 0.0) is None
+    estatisticas = instancia.estatisticas()
+    assert (estatisticas["pontos"], estatisticas["aquecidos"], estatisticas["rodadas"]) == (3, 2, 1)
+
+
+def test_obter_devolve_copia(consulta):
+    instancia = aquecedor()
+    instancia.atualizar()
+    instancia.obter(*PONTOS[0])["temperatura"] = -99
+    assert instancia.obter(*PONTOS[0])["temperatura"] == 21.0
+
+
+def test_ponto_velho_deixa_de_ser_servido(consulta, monkeypatch):
+    instancia = aquecedor(idade_maxima=30.0)
+    instancia.atualizar()
+    # Rodadas seguintes falham para este ponto: o dado antigo fica, mas não é servido
+    consulta.sem_resposta.add(PONTOS[0])
+    instancia.atualizar()
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 31)
+    assert instancia.obter(*PONTOS[0]) is None
+    assert instancia.estatisticas()["aquecidos"] == 0
+
+
+def test_sem_chave_nao_consulta(consulta, monkeypatch):
+    monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: (None, None))
+    assert aquecedor().atualizar() == 0
+    assert consulta.rodadas == 0
+
+
+def test_laco_atualiza_para_e_reinicia(consulta):
+    instancia = aquecedor(intervalo=0.01)
+    instancia.iniciar()
+    try:
+        esperar(lambda: instancia.rodadas >= 3)
+        assert instancia.obter(*PONTOS[1])["temperatura"] > 21.0
+
+        instancia.parar()
+        time.sleep(0.05)
+        parado = instancia.rodadas
+        time.sleep(0.05)
+        assert instancia.rodadas == parado
+
+        instancia.iniciar()
+        esperar(lambda: instancia.rodadas >= parado + 2)
+    finally:
+        instancia.parar()
+
+
+def test_iniciar_duas_vezes_mantem_uma_thread(consulta):
+    instancia = aquecedor(intervalo=60.0)
+    try:
+        instancia.iniciar()
+        thread = instancia._thread
+        instancia.iniciar()
+        assert instancia._thread is thread
+        assert consulta.rodou.wait(2.0)
+    finally:
+        instancia.parar()
+
+
+def test_erro_na_rodada_nao_derruba_o_laco(consulta, monkeypatch):
+    falhas = iter([RuntimeError("rede")])
+
+    def consulta_instavel(*args, **kwargs):
+        erro = next(falhas, None)
+        if erro:
+            raise erro
+        return consulta(*args, **kwargs)
+
+    monkeypatch.setattr(streamlit_app, "consultar_clima_lote", consulta_instavel)
+    instancia = aquecedor(intervalo=0.01)
+    instancia.iniciar()
+    try:
+        esperar(lambda: instancia.obter(*PONTOS[0]) is not None)
+    finally:
+        instancia.parar()
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import executar  # noqa: E402
+from servidor_stub import ConfiguracaoStub, configuracao_app, iniciar_servidor  # noqa: E402
+
+import streamlit_app  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def stub():
+    servidor = iniciar_servidor(ConfiguracaoStub("normal", semente=1, atraso_timeout=0.5))
+    servidor.base = "http://{}:{}".format(*servidor.server_address[:2])
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture(autouse=True)
+def perfil_normal(stub):
+    stub.configuracao.perfil = {"fator_latencia": 0.01, "taxa_erro": 0.0, "taxa_timeout": 0.0}
+    streamlit_app.obter_saude_provedores.clear()
+    yield
+    streamlit_app.obter_saude_provedores.clear()
+
+
+def requisitar(url, corpo=None):
+    dados = json.dumps(corpo).encode() if corpo is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=dados), timeout=5) as resposta:
+            return resposta.status, json.loads(resposta.read())
+    except urllib.error.HTTPError as erro:
+        return erro.code, json.loads(erro.read())
+
+
+def test_percentil_interpolado():
+    assert executar.percentil([], 0.5) == 0.0
+    assert executar.percentil([4, 1, 3, 2], 0.5) == 2.5
+    assert executar.percentil([10, 20], 0.95) == pytest.approx(19.5)
+    assert executar.percentil([7], 0.99) == 7
+
+
+def resultados(p95, vazao):
+    return {"cenarios": {"cep_frio": {"8": {"p95_ms": p95, "vazao_rps": vazao}}}}
+
+
+@pytest.mark.parametrize("atual, regressoes", [
+    (resultados(120, 100), 0),  # dentro da tolerância
+    (resultados(200, 100), 1),  # p95 piorou
+    (resultados(100, 50), 1),   # vazão caiu
+    (resultados(200, 50), 2),
+])
+def test_comparar_com_a_linha_de_base(atual, regressoes):
+    assert len(executar.comparar(atual, resultados(100, 100), 0.3)) == regressoes
+
+
+def test_piso_de_ruido_ignora_cenarios_rapidos():
+    # 1 -> 4 ms é 4x pior, mas abaixo do piso de ruído e sem contar a vazão
+    assert executar.comparar(resultados(4, 10), resultados(1, 100), 0.3) == []
+
+
+def test_cenario_medido_conta_falhas():
+    sucessos = iter([True, False, True, True])
+    medida = executar.medir_cenario(lambda: (next(sucessos), 0.01), concorrencia=1, requisicoes=4)
+    assert medida["falhas"] == 1
+    assert medida["primeiro_token_p50_ms"] == 10.0
+    assert set(medida) >= {"p50_ms", "p95_ms", "p99_ms", "vazao_rps"}
+
+
+def test_sorteio_reproduzivel_pela_semente():
+    primeira = [ConfiguracaoStub("instavel", semente=3).sortear("viacep") for _ in range(5)]
+    segunda = [ConfiguracaoStub("instavel", semente=3).sortear("viacep") for _ in range(5)]
+    assert primeira == segunda
+
+
+def test_cep_no_formato_de_cada_api(stub):
+    for api_url in configuracao_app(stub)["CEP_APIS"].split(","):
+        endereco, aviso, nao_encontrado = streamlit_app.consultar_api_cep(api_url, "01310100", silencioso=True)
+        assert endereco["cidade"] and endereco["uf"], api_url
+        assert (aviso, nao_encontrado) == (None, False)
+
+
+def test_cep_inexistente(stub):
+    status, corpo = requisitar(f"{stub.base}/viacep/ws/00012345/json/")
+    assert status == 200 and "erro" in corpo
+    assert requisitar(f"{stub.base}/brasilapi/api/cep/v1/00012345")[0] == 404
+
+
+def test_clima_em_lote_devolve_os_custom_ids(stub):
+    locais = [{"q": "-23.5,-46.6", "custom_id": "a"}, {"q": "invalido", "custom_id": "b"}]
+    status, corpo = requisitar(f"{stub.base}/weatherapi/v1/current.json?q=bulk", {"locations": locais})
+    assert status == 200
+    primeiro, segundo = (item["query"] for item in corpo["bulk"])
+    assert primeiro["custom_id"] == "a" and "current" in primeiro
+    assert segundo["custom_id"] == "b" and "error" in segundo
+
+    excesso = [{"q": "0,0", "custom_id": str(i)} for i in range(51)]
+    assert requisitar(f"{stub.base}/weatherapi/v1/current.json?q=bulk", {"locations": excesso})[0] == 400
+
+
+def test_perfil_de_falhas(stub):
+    stub.configuracao.perfil = {"fator_latencia": 0.01, "taxa_erro": 1.0, "taxa_timeout": 0.0}
+    assert requisitar(f"{stub.base}/weatherapi/v1/current.json?q=1,2")[0] == 503
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+import streamlit_app
+from streamlit_app import CachePersistente, buscar_cep_completo, coletar_mensagens
+
+CEP_INEXISTENTE = "99999999"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = CachePersistente(str(tmp_path / "cep.sqlite3"), "cep", ttl=600, ttl_negativo=60)
+    monkeypatch.setattr(streamlit_app, "obter_cache_cep", lambda: cache)
+    return cache
+
+
+@pytest.fixture(params=["sequencial", "hedge"])
+def modo(request, monkeypatch):
+    monkeypatch.setenv("CEP_MODO_BUSCA", request.param)
+    monkeypatch.setenv("CEP_HEDGE_ATRASO", "0")
+    return request.param
+
+
+def responder(monkeypatch, respostas):
+    """Substitui as APIs de CEP: provedor -> (endereco_info, aviso, nao_encontrado)"""
+    chamadas = []
+
+    def consultar(api_url, cep_clean, silencioso=False, parar=None):
+        provedor = streamlit_app.nome_provedor(api_url)
+        chamadas.append(provedor)
+        return respostas[provedor]
+
+    monkeypatch.setattr(streamlit_app, "consultar_api_cep", consultar)
+    return chamadas
+
+
+NAO_ENCONTRADO = (None, "CEP não encontrado", True)
+SEM_RESPOSTA = (None, None, False)
+
+
+def test_cep_inexistente_em_todas_as_apis_vai_para_o_cache_negativo(cache, modo, monkeypatch):
+    responder(monkeypatch, {"viacep": NAO_ENCONTRADO, "brasilapi": NAO_ENCONTRADO, "awesomeapi": NAO_ENCONTRADO})
+    with coletar_mensagens():
+        buscar_cep_completo(CEP_INEXISTENTE)
+    assert cache.obter(CEP_INEXISTENTE) == (True, None)
+
+
+def test_falha_de_rede_impede_o_cache_negativo(cache, modo, monkeypatch):
+    # Uma API diz que o CEP não existe, outra estoura o tempo: nada é gravado
+    responder(monkeypatch, {"viacep": NAO_ENCONTRADO, "brasilapi": SEM_RESPOSTA, "awesomeapi": NAO_ENCONTRADO})
+    with coletar_mensagens():
+        buscar_cep_completo(CEP_INEXISTENTE)
+    assert cache.obter(CEP_INEXISTENTE) == (False, None)
+
+
+def test_acerto_negativo_pula_as_apis_e_repete_os_fallbacks(cache, modo, monkeypatch):
+    chamadas = responder(monkeypatch, {"viacep": NAO_ENCONTRADO, "brasilapi": NAO_ENCONTRADO, "awesomeapi": NAO_ENCONTRADO})
+    with coletar_mensagens():
+        primeira = buscar_cep_completo(CEP_INEXISTENTE)
+    consultas = len(chamadas)
+    with coletar_mensagens() as mensagens:
+        segunda = buscar_cep_completo(CEP_INEXISTENTE)
+    assert len(chamadas) == consultas
+    assert segunda == primeira
+    assert any("inexistente recentemente" in m["mensagem"] for m in mensagens)
+
+
+def test_capital_do_estado_fica_pouco_tempo_no_cache(cache, monkeypatch):
+    monkeypatch.setenv("CEP_MODO_BUSCA", "sequencial")
+    endereco = {'rua': "", 'bairro': "", 'cidade': "Cidade Fora da Base", 'uf': "SP", 'cep': "19999000",
+                'complemento': "", 'ddd': ""}
+    responder(monkeypatch, {"viacep": (endereco, None, False), "brasilapi": SEM_RESPOSTA, "awesomeapi": SEM_RESPOSTA})
+    monkeypatch.setattr(streamlit_app, "buscar_coordenadas_por_nome", lambda cidade: None)
+    monkeypatch.setenv("CEP_CACHE_TTL_APROXIMADO", "5")
+
+    with coletar_mensagens():
+        lat, lon, _, erro = buscar_cep_completo("19999000")
+    assert erro is None
+    assert (lat, lon) == streamlit_app.COORDENADAS_ESTADOS["SP"]
+    assert cache.obter("19999000")[0]
+
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 6)
+    assert cache.obter("19999000") == (False, None)
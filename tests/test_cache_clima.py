@@ -0,0 +1,81 @@
+import time
+
+import pandas as pd
+import pytest
+
+from streamlit_app import CacheClima, CacheMemoria, geohash, tamanho_aproximado
+
+
+def test_geohash_de_referencia():
+    # Exemplo clássico do geohash (Jutland, Dinamarca) e um ponto em São Paulo
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash(-23.5505, -46.6333, 5) == "6gyf4"
+
+
+def test_pontos_proximos_compartilham_a_celula():
+    cache = CacheClima(ttl=60, max_entradas=10, precisao=5)
+    assert cache.chave(-23.5505, -46.6333) == cache.chave(-23.5510, -46.6340)
+    assert cache.chave(-23.5505, -46.6333) != cache.chave(-22.9068, -43.1729)
+
+
+def test_entrada_expira_com_o_ttl(monkeypatch):
+    cache = CacheMemoria(ttl=60, max_entradas=10)
+    cache.guardar("a", {"temperatura": 25})
+    assert cache.obter("a") == {"temperatura": 25}
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 61)
+    assert cache.obter("a") is None
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_ttl_por_entrada(monkeypatch):
+    cache = CacheMemoria(ttl=60, max_entradas=10)
+    cache.guardar("curta", 1, ttl=5)
+    cache.guardar("longa", 2)
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 10)
+    assert cache.obter("curta") is None
+    assert cache.obter("longa") == 2
+
+
+def test_lru_remove_a_menos_usada():
+    cache = CacheMemoria(ttl=60, max_entradas=2)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.obter("a")
+    cache.guardar("c", 3)
+    assert cache.obter("b") is None
+    assert cache.obter("a") == 1
+    assert cache.obter("c") == 3
+
+
+def test_limite_em_bytes():
+    valor = {"texto": "x" * 1000}
+    tamanho = tamanho_aproximado(valor)
+    cache = CacheMemoria(ttl=60, max_entradas=100, max_bytes=tamanho * 3)
+    for i in range(10):
+        cache.guardar(i, valor)
+    estatisticas = cache.estatisticas()
+    assert estatisticas["entradas"] == 3
+    assert estatisticas["bytes"] == tamanho * 3
+    assert cache.obter(9) == valor
+    assert cache.obter(6) is None
+
+
+def test_regravar_nao_conta_bytes_em_dobro():
+    cache = CacheMemoria(ttl=60, max_entradas=10, max_bytes=10_000)
+    cache.guardar("a", "x" * 100)
+    cache.guardar("a", "x" * 200)
+    assert cache.estatisticas()["bytes"] == tamanho_aproximado("x" * 200)
+
+
+def test_tamanho_de_dataframe_pela_memoria():
+    previsao = pd.DataFrame({"epoch": range(96), "temperatura": [20.0] * 96, "descricao": ["Sol"] * 96})
+    assert tamanho_aproximado(previsao) == previsao.memory_usage(deep=True).sum()
+
+
+@pytest.mark.parametrize("max_bytes", [1, None])
+def test_entrada_maior_que_o_limite_continua_acessivel(max_bytes):
+    cache = CacheMemoria(ttl=60, max_entradas=10, max_bytes=max_bytes)
+    cache.guardar("grande", "x" * 100)
+    assert cache.obter("grande") == "x" * 100
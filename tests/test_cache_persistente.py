@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from streamlit_app import CachePersistente
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CachePersistente(str(tmp_path / "cache.sqlite3"), "teste", ttl=60, ttl_negativo=10, max_entradas=100)
+
+
+def test_guarda_e_obtem_valor(cache):
+    cache.guardar("01310100", {"cidade": "São Paulo"})
+    assert cache.obter("01310100") == (True, {"cidade": "São Paulo"})
+    assert cache.obter("99999999") == (False, None)
+    assert cache.estatisticas()["acertos"] == 1
+    assert cache.estatisticas()["faltas"] == 1
+
+
+def test_entrada_expirada_e_removida(cache, monkeypatch):
+    cache.guardar("01310100", {"cidade": "São Paulo"})
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 61)
+    assert cache.obter("01310100") == (False, None)
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_cache_negativo_tem_ttl_proprio(cache, monkeypatch):
+    cache.guardar_negativo("00000000")
+    assert cache.obter("00000000") == (True, None)
+    agora = time.time()
+    monkeypatch.setattr(time, "time", lambda: agora + 11)
+    assert cache.obter("00000000") == (False, None)
+
+
+def test_cache_negativo_desativado_sem_ttl(tmp_path):
+    cache = CachePersistente(str(tmp_path / "cache.sqlite3"), "teste", ttl=60)
+    cache.guardar_negativo("00000000")
+    assert cache.obter("00000000") == (False, None)
+
+
+def test_persiste_entre_instancias(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite3")
+    CachePersistente(caminho, "teste", ttl=60).guardar("chave", [1, 2])
+    assert CachePersistente(caminho, "teste", ttl=60).obter("chave") == (True, [1, 2])
+
+
+def test_poda_mantem_limite_de_entradas(tmp_path):
+    cache = CachePersistente(str(tmp_path / "cache.sqlite3"), "teste", ttl=60, max_entradas=50)
+    for i in range(200):
+        cache.guardar(f"chave{i}", i)
+    assert cache.estatisticas()["entradas"] <= 50
+    # As mais recentes sobrevivem à poda (LRU pelo horário de acesso)
+    assert cache.obter("chave199") == (True, 199)
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+import streamlit_app
+from streamlit_app import CacheRecomendacoes, interpretar_clima
+
+CLIMA = {
+    "temperatura": 25.2, "sensacao": 26.4, "umidade": 61, "vento_kmh": 12.0,
+    "descricao": "Céu limpo", "cidade": "Teste", "pais": "Brasil"
+}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = CacheRecomendacoes(str(tmp_path / "rec.sqlite3"), ttl=600, max_entradas=100,
+                               balde_temperatura=1.0, balde_umidade=5.0, balde_vento=10.0)
+    monkeypatch.setattr(streamlit_app, "obter_cache_recomendacoes", lambda: cache)
+    return cache
+
+
+def test_climas_na_mesma_faixa_compartilham_a_chave(cache):
+    parecido = dict(CLIMA, temperatura=25.9, sensacao=26.0, umidade=64, vento_kmh=19.9, descricao="CEU LIMPO ")
+    assert cache.chave(parecido) == cache.chave(CLIMA)
+
+
+@pytest.mark.parametrize("campo, valor", [
+    ("temperatura", 26.0),
+    ("temperatura", 24.99),
+    ("sensacao", 27.0),
+    ("umidade", 65),
+    ("vento_kmh", 20.0),
+    ("descricao", "Nublado"),
+])
+def test_mudanca_de_faixa_troca_a_chave(cache, campo, valor):
+    assert cache.chave(dict(CLIMA, **{campo: valor})) != cache.chave(CLIMA)
+
+
+def test_temperaturas_negativas_nao_se_misturam_com_zero(cache):
+    assert cache.chave(dict(CLIMA, temperatura=-0.5)) != cache.chave(dict(CLIMA, temperatura=0.5))
+
+
+def test_tamanho_das_faixas_configuravel(tmp_path):
+    cache = CacheRecomendacoes(str(tmp_path / "rec.sqlite3"), ttl=600, max_entradas=100,
+                               balde_temperatura=5.0, balde_umidade=5.0, balde_vento=10.0)
+    assert cache.chave(dict(CLIMA, temperatura=29.9, sensacao=29.0)) == cache.chave(CLIMA)
+
+
+class ClienteContador:
+    """Cliente OpenAI falso (sem streaming) que conta as chamadas"""
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.chamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    def _criar(self, **parametros):
+        self.chamadas += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.texto))])
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    cliente = ClienteContador("Use protetor solar")
+    monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: ("sk-teste", None))
+    monkeypatch.setattr(streamlit_app, "obter_cliente_openai", lambda chave: cliente)
+    return cliente
+
+
+def test_clima_parecido_reaproveita_a_recomendacao(cache, cliente):
+    assert interpretar_clima(CLIMA) == "Use protetor solar"
+    assert interpretar_clima(dict(CLIMA, temperatura=25.7)) == "Use protetor solar"
+    assert cliente.chamadas == 1
+
+
+def test_regenerar_ignora_e_atualiza_o_cache(cache, cliente):
+    interpretar_clima(CLIMA)
+    cliente.texto = "Leve um chapéu"
+    assert interpretar_clima(CLIMA, usar_cache=False) == "Leve um chapéu"
+    assert cliente.chamadas == 2
+    assert cache.obter(cache.chave(CLIMA)) == (True, "Leve um chapéu")
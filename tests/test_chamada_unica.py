@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import streamlit_app
+from streamlit_app import ChamadaUnica, interpretar_clima_async
+
+CLIMA = {
+    "temperatura": 21.3, "sensacao": 22.0, "umidade": 61, "vento_kmh": 9.0,
+    "descricao": "Parcialmente nublado", "cidade": "Teste", "pais": "Brasil"
+}
+
+
+def test_concluir_ignora_futuro_ja_cancelado():
+    chamadas = ChamadaUnica()
+    futuro, lider = chamadas.iniciar("chave")
+    assert lider
+    assert chamadas.iniciar("chave") == (futuro, False)
+    futuro.cancel()
+    chamadas.concluir("chave", "resultado")
+    chamadas.concluir("chave", erro=RuntimeError("repetida"))
+
+
+class ClienteLento:
+    """Cliente OpenAI falso que só responde quando `liberar` é acionado"""
+
+    def __init__(self):
+        self.iniciou = asyncio.Event()
+        self.liberar = asyncio.Event()
+        self.chamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    async def _criar(self, **parametros):
+        self.chamadas += 1
+        self.iniciou.set()
+        await self.liberar.wait()
+        mensagem = SimpleNamespace(content=" Recomendação gerada ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=mensagem)])
+
+
+def test_cancelar_um_aguardante_nao_afeta_lider_nem_demais(monkeypatch):
+    async def cenario():
+        cliente = ClienteLento()
+        monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: ("sk-teste", None))
+        monkeypatch.setattr(streamlit_app, "obter_cliente_openai_async", lambda chave: cliente)
+
+        lider = asyncio.create_task(interpretar_clima_async(CLIMA, usar_cache=False))
+        await cliente.iniciou.wait()
+        cancelado = asyncio.create_task(interpretar_clima_async(CLIMA, usar_cache=False))
+        aguardando = asyncio.create_task(interpretar_clima_async(CLIMA, usar_cache=False))
+        await asyncio.sleep(0.01)
+
+        cancelado.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelado
+
+        cliente.liberar.set()
+        assert await lider == "Recomendação gerada"
+        assert await aguardando == "Recomendação gerada"
+        assert cliente.chamadas == 1
+
+        # O resultado do líder também foi para o cache
+        cache = streamlit_app.obter_cache_recomendacoes()
+        assert cache.obter(cache.chave(CLIMA)) == (True, "Recomendação gerada")
+
+    asyncio.run(cenario())
+
+
+def test_aguardante_desiste_no_tempo_limite_e_usa_as_regras(monkeypatch):
+    async def cenario():
+        cliente = ClienteLento()
+        monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: ("sk-teste", None))
+        monkeypatch.setattr(streamlit_app, "obter_cliente_openai_async", lambda chave: cliente)
+        monkeypatch.setenv("OPENAI_TIMEOUT", "0.05")
+
+        lider = asyncio.create_task(interpretar_clima_async(CLIMA, usar_cache=False))
+        await cliente.iniciou.wait()
+        with streamlit_app.coletar_mensagens() as mensagens:
+            recomendacao = await asyncio.wait_for(interpretar_clima_async(CLIMA, usar_cache=False), 1.0)
+        assert recomendacao == streamlit_app.recomendacoes_fallback(21.3, 61, 9.0, "Parcialmente nublado")
+        assert any("OpenAI API falhou" in m["mensagem"] for m in mensagens)
+
+        # O líder continua e conclui normalmente
+        assert not lider.done()
+        cliente.liberar.set()
+        assert await lider == "Recomendação gerada"
+
+    asyncio.run(cenario())
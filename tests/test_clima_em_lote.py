@@ -0,0 +1,126 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import streamlit_app
+from streamlit_app import consultar_clima_lote
+
+PONTOS = [(-23.55, -46.63), (-22.91, -43.17), (-15.79, -47.88), (-3.72, -38.54)]
+
+
+class Resposta:
+    def __init__(self, corpo=None, erro=None):
+        self.corpo, self.erro = corpo, erro
+
+    def __bool__(self):
+        return True
+
+    def json(self):
+        if self.erro:
+            raise self.erro
+        return self.corpo
+
+
+def consulta(custom_id, lat, lon):
+    """Item do lote no formato da WeatherAPI; a temperatura identifica o ponto"""
+    return {"query": {
+        "custom_id": custom_id, "q": f"{lat},{lon}",
+        "location": {"name": f"{lat},{lon}", "country": "Brasil", "lat": lat, "lon": lon},
+        "current": {"temp_c": lat, "feelslike_c": lon, "humidity": 50, "wind_kph": 10.0,
+                    "condition": {"text": "Ensolarado"}},
+    }}
+
+
+@pytest.fixture
+def weatherapi(monkeypatch, tmp_path):
+    """safe_request falso: `lote(grupo)` monta a resposta do lote; os pontos avulsos sempre respondem"""
+    estado = SimpleNamespace(lote=None, lotes=0, avulsos=[])
+
+    def safe_request(url, silencioso=False, corpo=None, **_):
+        if corpo is not None:
+            estado.lotes += 1
+            grupo = [tuple(float(v) for v in local["q"].split(",")) for local in corpo["locations"]]
+            return estado.lote(grupo)
+        lat, lon = (float(v) for v in re.search(r"q=([^&]+)", url).group(1).split(","))
+        estado.avulsos.append((lat, lon))
+        return Resposta(consulta("0", lat, lon)["query"])
+
+    monkeypatch.setattr(streamlit_app, "safe_request", safe_request)
+    monkeypatch.setenv("HISTORICO_PATH", str(tmp_path / "historico.sqlite3"))
+    streamlit_app.obter_historico_observacoes.clear()
+    yield estado
+    streamlit_app.obter_historico_observacoes.clear()
+
+
+def temperaturas(climas):
+    return [clima["temperatura"] if clima else None for clima in climas]
+
+
+def test_custom_id_fora_de_ordem_volta_ao_ponto_certo(weatherapi):
+    weatherapi.lote = lambda grupo: Resposta({"bulk": [consulta(str(i), *grupo[i]) for i in (3, 1, 0, 2)]})
+    climas = consultar_clima_lote(PONTOS, "chave")
+    assert temperaturas(climas) == [lat for lat, _ in PONTOS]
+    assert weatherapi.avulsos == []
+
+
+def test_custom_id_repetido_ou_invalido_e_ignorado(weatherapi):
+    def lote(grupo):
+        return Resposta({"bulk": [
+            consulta("0", *grupo[0]),
+            consulta("0", 99.0, 99.0),     # repetido: vale o primeiro
+            consulta("-1", 88.0, 88.0),    # não pode virar o último ponto
+            consulta("7", 77.0, 77.0),     # fora do grupo
+            consulta("abc", 66.0, 66.0),
+            consulta("1", *grupo[1]),
+            consulta("2", *grupo[2]),
+            consulta("3", *grupo[3]),
+        ]})
+
+    weatherapi.lote = lote
+    assert temperaturas(consultar_clima_lote(PONTOS, "chave")) == [lat for lat, _ in PONTOS]
+
+
+@pytest.mark.parametrize("resposta", [
+    Resposta(erro=ValueError("HTML no lugar de JSON")),
+    Resposta(["lista", "inesperada"]),
+    Resposta({"bulk": "texto"}),
+    Resposta({"error": {"code": 2009, "message": "Bulk not available on this plan."}}),
+])
+def test_corpo_malformado_consulta_ponto_a_ponto(weatherapi, resposta):
+    weatherapi.lote = lambda grupo: resposta
+    assert temperaturas(consultar_clima_lote(PONTOS, "chave")) == [lat for lat, _ in PONTOS]
+    assert sorted(weatherapi.avulsos) == sorted(PONTOS)
+
+
+def test_resposta_parcial_completa_os_pontos_que_faltaram(weatherapi):
+    def lote(grupo):
+        recusado = {"query": {"custom_id": "2", "q": "x", "error": {"code": 1006, "message": "No matching location"}}}
+        return Resposta({"bulk": [consulta("0", *grupo[0]), {"query": {"custom_id": "1"}}, recusado, "lixo"]})
+
+    weatherapi.lote = lote
+    climas = consultar_clima_lote(PONTOS, "chave")
+    # O ponto 1 veio incompleto e o 3 não veio: ambos são repetidos; o 2 foi recusado pela API
+    assert temperaturas(climas) == [PONTOS[0][0], PONTOS[1][0], None, PONTOS[3][0]]
+    assert sorted(weatherapi.avulsos) == sorted([PONTOS[1], PONTOS[3]])
+
+
+def test_grupo_malformado_nao_derruba_os_demais_em_paralelo(weatherapi, monkeypatch):
+    monkeypatch.setenv("WEATHERAPI_LOTE_MAXIMO", "2")
+    ruim = PONTOS[2]
+
+    def lote(grupo):
+        if ruim in grupo:
+            return Resposta(erro=ValueError("corpo truncado"))
+        return Resposta({"bulk": [consulta(str(i), *ponto) for i, ponto in enumerate(grupo)]})
+
+    weatherapi.lote = lote
+    climas = consultar_clima_lote(PONTOS, "chave", concorrencia=4)
+    assert temperaturas(climas) == [lat for lat, _ in PONTOS]
+    assert weatherapi.lotes == 2
+
+
+def test_pontos_repetidos_recebem_copias(weatherapi):
+    weatherapi.lote = lambda grupo: Resposta({"bulk": [consulta(str(i), *p) for i, p in enumerate(grupo)]})
+    climas = consultar_clima_lote([PONTOS[0], PONTOS[1], PONTOS[0]], "chave")
+    assert climas[0] == climas[2] and climas[0] is not climas[2]
@@ -0,0 +1,120 @@
+import csv
+import json
+import random
+import sys
+import time
+
+import pytest
+
+import clima_lote
+from clima_lote import executar_lote
+
+
+def clima_falso(latitude, longitude):
+    return {
+        "temperatura": round(latitude, 2), "sensacao": round(longitude, 2), "umidade": 50, "vento_kmh": 10.0,
+        "descricao": "Ensolarado", "cidade": "Cidade Clima", "pais": "Brasil", "fallback": False
+    }
+
+
+@pytest.fixture(autouse=True)
+def provedores(monkeypatch):
+    """CEP e clima falsos, com atrasos aleatórios para embaralhar a conclusão das linhas"""
+    aleatorio = random.Random(7)
+
+    def buscar_cep(cep):
+        time.sleep(aleatorio.random() * 0.005)
+        if cep == "00000000":
+            return None, None, None, "CEP não encontrado"
+        numero = int(cep[-3:])
+        return -numero / 100, -40.0, {"cidade": f"Cidade {numero}", "uf": "SP", "rua": "Rua A", "bairro": ""}, None
+
+    def consultar_lote(pontos):
+        time.sleep(aleatorio.random() * 0.01)
+        return [clima_falso(latitude, longitude) for latitude, longitude in pontos]
+
+    monkeypatch.setattr(clima_lote, "buscar_cep_completo", buscar_cep)
+    monkeypatch.setattr(clima_lote, "get_weather_lote", consultar_lote)
+
+
+def gravar_jsonl(caminho, linhas):
+    caminho.write_text("".join(linha if isinstance(linha, str) else json.dumps(linha) + "\n" for linha in linhas),
+                       encoding="utf-8")
+    return str(caminho)
+
+
+def ler_saida(caminho, formato):
+    if formato == "csv":
+        with open(caminho, encoding="utf-8", newline="") as arquivo:
+            return list(csv.DictReader(arquivo))
+    if formato == "jsonl":
+        with open(caminho, encoding="utf-8") as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+    import pyarrow.parquet as pq
+    return pq.read_table(caminho).to_pylist()
+
+
+@pytest.mark.parametrize("formato", ["csv", "jsonl", "parquet"])
+def test_ida_e_volta_em_cada_formato(tmp_path, formato):
+    if formato == "parquet":
+        pytest.importorskip("pyarrow")
+    entrada = gravar_jsonl(tmp_path / "entrada.jsonl", [{"cep": "01001010"}, {"lat": -22.5, "lon": -43.2}])
+    saida = str(tmp_path / f"saida.{formato}")
+    assert executar_lote(entrada, saida, formato, concorrencia=2) == (2, 0)
+
+    linhas = ler_saida(saida, formato)
+    assert [str(linha["linha"]) for linha in linhas] == ["1", "2"]
+    assert linhas[0]["cidade"] == "Cidade 10"
+    assert linhas[0]["endereco"] == "Rua A"
+    assert float(linhas[1]["temperatura"]) == -22.5
+    assert linhas[1]["cidade"] == "Cidade Clima"
+    assert linhas[0]["recomendacoes"]
+
+
+def test_entrada_csv(tmp_path):
+    entrada = tmp_path / "entrada.csv"
+    entrada.write_text("cep,lat,lon\n01001005,,\n,-10.5,-50.25\n", encoding="utf-8")
+    saida = str(tmp_path / "saida.jsonl")
+    assert executar_lote(str(entrada), saida, "jsonl", concorrencia=2) == (2, 0)
+    linhas = ler_saida(saida, "jsonl")
+    assert (linhas[0]["lat"], linhas[1]["lon"]) == (-0.05, -50.25)
+
+
+def test_erros_ficam_em_cada_linha(tmp_path):
+    entrada = gravar_jsonl(tmp_path / "entrada.jsonl", [
+        {"cep": "00000000"},
+        {"lat": 95, "lon": 0},
+        {"nome": "sem localização"},
+        "{isto não é json\n",
+        "[1, 2]\n",
+        {"cep": "01001001"},
+    ])
+    saida = str(tmp_path / "saida.jsonl")
+    assert executar_lote(entrada, saida, "jsonl", concorrencia=3) == (6, 5)
+
+    erros = [linha["erro"] for linha in ler_saida(saida, "jsonl")]
+    assert erros[0] == "CEP não encontrado"
+    assert erros[1] == "Coordenadas inválidas"
+    assert erros[2] == "Linha sem CEP nem coordenadas numéricas"
+    assert erros[3].startswith("JSON inválido")
+    assert erros[4] == "Linha JSON não é um objeto"
+    assert erros[5] == ""
+
+
+def test_ordem_original_entre_blocos(tmp_path):
+    entrada = gravar_jsonl(tmp_path / "entrada.jsonl", [{"cep": f"01001{i:03d}"} for i in range(1, 101)])
+    saida = str(tmp_path / "saida.jsonl")
+    assert executar_lote(entrada, saida, "jsonl", concorrencia=8, tamanho_bloco=7) == (100, 0)
+    linhas = ler_saida(saida, "jsonl")
+    assert [linha["linha"] for linha in linhas] == list(range(1, 101))
+    assert [linha["cidade"] for linha in linhas] == [f"Cidade {i}" for i in range(1, 101)]
+
+
+@pytest.mark.parametrize("opcao", ["--concorrencia", "--bloco"])
+@pytest.mark.parametrize("valor", ["0", "-2", "dois"])
+def test_opcoes_numericas_validadas(tmp_path, monkeypatch, capsys, opcao, valor):
+    monkeypatch.setattr(sys, "argv", ["clima_lote.py", "entrada.csv", str(tmp_path / "saida.csv"), opcao, valor])
+    with pytest.raises(SystemExit) as saida:
+        clima_lote.main()
+    assert saida.value.code == 2
+    assert opcao in capsys.readouterr().err
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from streamlit_app import clima_estimado, obter_climatologia
+
+
+@pytest.fixture(scope="module")
+def climatologia():
+    grade = obter_climatologia()
+    assert grade is not None
+    return grade
+
+
+def test_no_ponto_da_grade_devolve_o_valor_armazenado(climatologia):
+    # No nó (i, j) não há interpolação espacial, só entre os horários vizinhos da grade
+    i, j, mes = 5, 12, 7
+    latitude = climatologia.lat_inicial + i * climatologia.passo
+    longitude = climatologia.lon_inicial + j * climatologia.passo
+    quando = datetime(2026, mes, 10, 12, 0, tzinfo=timezone.utc)
+    hora = (12 + longitude / 15) % 24
+    k = int(hora // 3)
+    fracao = (hora - climatologia.horas[k]) / 3
+    valores = np.asarray(climatologia.grade[i, j, mes - 1], dtype=float)
+    esperado = valores[k] * (1 - fracao) + valores[k + 1] * fracao
+    estimativa = climatologia.estimar(latitude, longitude, quando)
+    assert [estimativa[v] for v in ("temperatura", "umidade", "vento_kmh")] == pytest.approx(esperado.tolist())
+
+
+def test_fora_da_grade(climatologia):
+    assert climatologia.estimar(40.0, 0.0) is None
+
+
+def test_semente_e_apresentada_como_estimativa_aproximada(climatologia):
+    clima = clima_estimado(-23.55, -46.63)
+    assert clima["fallback"] and clima["climatologia"]
+    assert clima["estimativa_aproximada"] == climatologia.aproximada
+    if climatologia.aproximada:
+        assert clima["descricao"] == "Estimativa aproximada"
+
+
+def test_fora_da_grade_usa_estimativa_por_latitude():
+    clima = clima_estimado(-45.0, -60.0)
+    assert "climatologia" not in clima
+    assert clima["descricao"] == "Clima temperado"
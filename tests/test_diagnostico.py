@@ -0,0 +1,51 @@
+import threading
+import time
+
+from streamlit_app import DiagnosticoConectividade
+
+
+def diagnostico_lento(intervalo):
+    """Diagnóstico cuja verificação fica presa até o teste liberar"""
+    diagnostico = DiagnosticoConectividade(ttl=60, timeout=3.0, intervalo=intervalo)
+    diagnostico.liberar = threading.Event()
+    diagnostico.verificacoes = 0
+
+    def verificar():
+        diagnostico.verificacoes += 1
+        diagnostico.liberar.wait(5)
+        diagnostico._estado = {"conectado": True, "sondas": [], "duracao_ms": 0.0, "verificado_em": time.time()}
+        return diagnostico._estado
+
+    diagnostico.verificar = verificar
+    return diagnostico
+
+
+def test_iniciar_nao_espera_verificacao_em_andamento():
+    for intervalo in (0, 3600):
+        diagnostico = diagnostico_lento(intervalo)
+        verificacao = threading.Thread(target=diagnostico.obter, kwargs={"forcar": True})
+        verificacao.start()
+        while diagnostico.verificacoes == 0:
+            time.sleep(0.001)
+
+        inicio = time.perf_counter()
+        assert diagnostico.iniciar() is diagnostico
+        assert diagnostico.iniciar() is diagnostico
+        assert time.perf_counter() - inicio < 0.5
+        assert (diagnostico._thread is not None) == (intervalo > 0)
+
+        diagnostico.liberar.set()
+        verificacao.join(5)
+
+
+def test_sessoes_simultaneas_compartilham_uma_verificacao():
+    diagnostico = diagnostico_lento(0)
+    threads = [threading.Thread(target=diagnostico.obter) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    diagnostico.liberar.set()
+    for thread in threads:
+        thread.join(5)
+    assert diagnostico.verificacoes == 1
+    assert diagnostico.obter()["conectado"]
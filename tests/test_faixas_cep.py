@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import streamlit_app
+from streamlit_app import DTYPE_FAIXAS_CEP, IndiceFaixasCep, localizar_municipio_por_cep
+
+# Duas faixas com um intervalo entre elas (02000000-02999999 fica de fora)
+FAIXAS = [
+    (1000000, 1999999, 3550308),
+    (3000000, 3099999, 3304557),
+]
+
+
+@pytest.fixture
+def indice(tmp_path):
+    caminho = tmp_path / "faixas.npy"
+    np.save(caminho, np.array(FAIXAS, dtype=DTYPE_FAIXAS_CEP))
+    return IndiceFaixasCep(str(caminho))
+
+
+@pytest.mark.parametrize("cep, codigo", [
+    ("01000000", 3550308),
+    ("01999999", 3550308),
+    ("01500000", 3550308),
+    ("03000000", 3304557),
+    ("03099999", 3304557),
+])
+def test_cep_dentro_e_nos_limites_da_faixa(indice, cep, codigo):
+    assert indice.codigo_ibge(cep) == codigo
+
+
+@pytest.mark.parametrize("cep", [
+    "02000000",  # logo após o fim da primeira faixa
+    "02999999",  # logo antes do início da segunda
+    "00999999",  # abaixo da primeira faixa
+    "00000000",
+    "03100000",  # acima da última faixa
+    "99999999",
+])
+def test_cep_fora_das_faixas(indice, cep):
+    assert indice.codigo_ibge(cep) is None
+
+
+def test_tabela_embutida_ordenada_e_sem_sobreposicao():
+    faixas = np.load(streamlit_app.ARQUIVO_FAIXAS_CEP)
+    assert faixas.dtype == DTYPE_FAIXAS_CEP
+    assert (faixas["inicio"] <= faixas["fim"]).all()
+    assert (faixas["inicio"][1:] > faixas["fim"][:-1]).all()
+
+
+def test_municipio_pela_tabela_embutida():
+    municipio = localizar_municipio_por_cep("01310100")
+    assert (municipio["nome"], municipio["uf"]) == ("São Paulo", "SP")
+    assert localizar_municipio_por_cep("99999999") is None
@@ -0,0 +1,152 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from gerar_limites_municipios import fechar_anel, gravar_limites  # noqa: E402
+
+import streamlit_app  # noqa: E402
+from streamlit_app import (  # noqa: E402
+    GeocodificadorReverso, municipios_por_coordenadas, nome_municipio, obter_base_municipios, pontos_no_anel
+)
+
+SAO_PAULO = 3550308
+GUARULHOS = 3518800
+SANTO_ANDRE = 3547809
+OSASCO = 3534401
+
+
+def retangulo(lon_min, lat_min, lon_max, lat_max):
+    return fechar_anel([(lon_min, lat_max), (lon_max, lat_max), (lon_max, lat_min), (lon_min, lat_min)])
+
+
+@pytest.fixture(scope="module")
+def com_limites(tmp_path_factory):
+    """São Paulo com um buraco e Guarulhos logo ao norte, com a borda comum em -23,40"""
+    pasta = tmp_path_factory.mktemp("limites")
+    aneis = [
+        (GUARULHOS, retangulo(-46.70, -23.40, -46.50, -23.30)),
+        (SAO_PAULO, retangulo(-46.70, -23.70, -46.50, -23.40)),
+        (SAO_PAULO, retangulo(-46.60, -23.62, -46.56, -23.58)),  # buraco
+    ]
+    limites, vertices = str(pasta / "limites.npy"), str(pasta / "vertices.npy")
+    gravar_limites(aneis, limites, vertices)
+    return GeocodificadorReverso(
+        obter_base_municipios(), np.load(limites, mmap_mode='r'), np.load(vertices, mmap_mode='r'),
+        passo=0.25, distancia_maxima_km=30.0
+    )
+
+
+@pytest.fixture(scope="module")
+def geocodificador():
+    return GeocodificadorReverso(obter_base_municipios(), passo=0.25, distancia_maxima_km=30.0)
+
+
+def forca_bruta(base, latitude, longitude, distancia_maxima_km=30.0):
+    lat = np.asarray(base.registros['lat'], dtype=float)
+    lon = np.asarray(base.registros['lon'], dtype=float)
+    distancias = 111.2 * np.hypot(lat - latitude, (lon - longitude) * np.cos(np.radians(latitude)))
+    linha = int(distancias.argmin())
+    return int(base.codigos[linha]) if distancias[linha] <= distancia_maxima_km else 0
+
+
+def test_sede_mais_proxima(geocodificador):
+    municipio = geocodificador.localizar(-23.6, -46.7)
+    assert (municipio['codigo_ibge'], municipio['uf']) == (SAO_PAULO, 'SP')
+    assert municipio['distancia_km'] == pytest.approx(8.7, abs=0.1)
+    assert municipio['aproximado']
+    assert nome_municipio(municipio) == "perto de São Paulo - SP"
+
+
+def test_sem_sede_dentro_da_distancia(geocodificador):
+    assert geocodificador.localizar(-5.0, -70.0) is None
+    assert geocodificador.localizar(40.0, 0.0) is None
+
+
+def test_lote_coincide_com_forca_bruta_e_com_consultas_unitarias(geocodificador):
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-31, -1, 2000)
+    longitudes = rng.uniform(-60, -34, 2000)
+    codigos, distancias = geocodificador.localizar_lote(latitudes, longitudes)
+    base = geocodificador.base
+    assert (codigos != 0).sum() > 0
+    for latitude, longitude, codigo, distancia in zip(latitudes, longitudes, codigos, distancias):
+        assert codigo == forca_bruta(base, latitude, longitude)
+        unitario = geocodificador.localizar(latitude, longitude)
+        assert (unitario['codigo_ibge'] if unitario else 0) == codigo
+        assert np.isnan(distancia) == (codigo == 0)
+
+
+def test_lote_na_ordem_dos_pontos():
+    municipios = municipios_por_coordenadas([(-5.0, -70.0), (-23.6, -46.7)])
+    assert municipios[0] is None
+    assert municipios[1]['codigo_ibge'] == SAO_PAULO
+    assert municipios_por_coordenadas([]) == []
+
+
+def test_ponto_no_anel():
+    quadrado = retangulo(0.0, 0.0, 1.0, 1.0)
+    assert pontos_no_anel(quadrado, [0.5, 1.5, 0.999, -0.001], [0.5, 0.5, 0.001, 0.5]).tolist() == [True, False, True, False]
+
+
+def test_ponto_dentro_do_poligono(com_limites):
+    municipio = com_limites.localizar(-23.65, -46.68)
+    assert municipio['codigo_ibge'] == SAO_PAULO
+    assert (municipio['aproximado'], municipio['distancia_km']) == (False, 0.0)
+    assert nome_municipio(municipio) == "São Paulo - SP"
+
+
+@pytest.mark.parametrize("latitude, codigo", [
+    (-23.4001, SAO_PAULO),
+    (-23.3999, GUARULHOS),
+])
+def test_ponto_perto_da_borda(com_limites, latitude, codigo):
+    municipio = com_limites.localizar(latitude, -46.60)
+    assert (municipio['codigo_ibge'], municipio['aproximado']) == (codigo, False)
+
+
+def test_buraco_nao_pertence_ao_municipio(com_limites):
+    # Dentro do buraco: São Paulo tem limites, então vale a sede mais próxima entre as demais
+    municipio = com_limites.localizar(-23.60, -46.58)
+    assert (municipio['codigo_ibge'], municipio['aproximado']) == (SANTO_ANDRE, True)
+
+
+def test_fora_de_todos_os_poligonos(com_limites):
+    # Sem polígono e sem sede de município sem limites a até 30 km (São Paulo e Guarulhos têm limites)
+    assert com_limites.localizar(-24.30, -46.80) is None
+    # Osasco não está no arquivo de limites: a sede continua valendo, como aproximação
+    osasco = com_limites.localizar(-23.53, -46.80)
+    assert (osasco['codigo_ibge'], osasco['aproximado']) == (OSASCO, True)
+
+
+def test_lote_com_limites_coincide_com_consultas_unitarias(com_limites):
+    rng = np.random.default_rng(1)
+    latitudes = rng.uniform(-24.0, -23.2, 3000)
+    longitudes = rng.uniform(-47.0, -46.3, 3000)
+    codigos, distancias = com_limites.localizar_lote(latitudes, longitudes)
+    assert {SAO_PAULO, GUARULHOS, OSASCO} <= set(codigos.tolist())
+    for latitude, longitude, codigo, distancia in zip(latitudes, longitudes, codigos, distancias):
+        unitario = com_limites.localizar(latitude, longitude)
+        assert (unitario['codigo_ibge'] if unitario else 0) == codigo
+        if unitario:
+            assert unitario['aproximado'] == (distancia > 0)
+
+
+def test_limites_semente():
+    limites = np.load(streamlit_app.ARQUIVO_LIMITES_MUNICIPIOS)
+    vertices = np.load(streamlit_app.ARQUIVO_VERTICES_LIMITES)
+    assert limites.dtype == streamlit_app.DTYPE_LIMITES_MUNICIPIOS
+    assert limites['fim'][-1] == len(vertices)
+    for anel in limites:
+        pontos = vertices[anel['inicio']:anel['fim']]
+        assert (pontos[0] == pontos[-1]).all()
+        assert pontos[:, 0].min() == anel['lon_min'] and pontos[:, 1].max() == anel['lat_max']
+
+    # Cada sede com contorno cai no próprio polígono
+    municipios = municipios_por_coordenadas([(-23.5505, -46.6333), (-22.9068, -43.1729), (-15.7801, -47.9292)])
+    assert [(m['nome'], m['aproximado']) for m in municipios] == [
+        ("São Paulo", False), ("Rio de Janeiro", False), ("Brasília", False)
+    ]
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import streamlit_app
+from streamlit_app import buscar_endereco_concorrente, safe_request
+
+ENDERECO = {'rua': "Praça da Sé", 'bairro': "Sé", 'cidade': "São Paulo", 'uf': "SP", 'cep': "01001000",
+            'complemento': "", 'ddd': "11"}
+
+
+@pytest.fixture(autouse=True)
+def saude_limpa():
+    streamlit_app.obter_saude_provedores.clear()
+    yield
+    streamlit_app.obter_saude_provedores.clear()
+
+
+@pytest.fixture
+def provedores(monkeypatch):
+    """APIs falsas: host -> segundos até responder; registra início e o evento de parada"""
+    atrasos = {}
+    chamadas = {}
+
+    def consultar(api_url, cep_clean, silencioso=False, parar=None):
+        host = api_url.split("/")[2]
+        chamadas[host] = (time.perf_counter(), parar)
+        time.sleep(atrasos[host])
+        return ENDERECO, None, False
+
+    monkeypatch.setattr(streamlit_app, "consultar_api_cep", consultar)
+    return atrasos, chamadas
+
+
+def test_rapida_vence_a_lenta_dentro_da_janela_do_hedge(provedores):
+    atrasos, chamadas = provedores
+    atrasos.update({"lenta": 2.0, "rapida": 0.0})
+    inicio = time.perf_counter()
+    indice, endereco, _ = buscar_endereco_concorrente("01001000", ["http://lenta/{}", "http://rapida/{}"], 0.1)
+    decorrido = time.perf_counter() - inicio
+    assert (indice, endereco) == (1, ENDERECO)
+    assert 0.1 <= decorrido < 0.5
+    # A lenta perdeu: o evento compartilhado avisa que ela deve desistir
+    assert chamadas["lenta"][1].is_set()
+
+
+def test_atraso_segue_o_p90_da_api_coberta(provedores):
+    atrasos, chamadas = provedores
+    atrasos.update({"lenta": 2.0, "rapida": 0.0})
+    saude = streamlit_app.obter_saude_provedores()
+    for _ in range(20):
+        saude.obter("lenta").registrar(True, 0.05)
+    inicio = time.perf_counter()
+    indice, _, _ = buscar_endereco_concorrente("01001000", ["http://lenta/{}", "http://rapida/{}"], 1.0)
+    assert indice == 1
+    # O p90 da lenta (50 ms) antecipa o hedge em vez do teto de 1 s
+    assert chamadas["rapida"][0] - inicio < 0.5
+
+
+def test_api_que_nao_comecou_nao_e_consultada(provedores):
+    atrasos, chamadas = provedores
+    atrasos.update({"rapida": 0.0, "reserva": 0.0})
+    indice, _, _ = buscar_endereco_concorrente("01001000", ["http://rapida/{}", "http://reserva/{}"], 0.3)
+    assert indice == 0
+    time.sleep(0.4)
+    assert "reserva" not in chamadas
+
+
+def test_safe_request_desiste_com_parada_sinalizada():
+    parar = threading.Event()
+    parar.set()
+    assert safe_request("http://127.0.0.1:9/nunca", parar=parar) is None
+    assert streamlit_app.obter_saude_provedores().obter("127.0.0.1").amostras == 0
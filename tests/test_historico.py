@@ -0,0 +1,97 @@
+import math
+import time
+
+import pytest
+
+from streamlit_app import HistoricoObservacoes, dimensoes_geohash, geohash, geohash_vizinhos
+
+SAO_PAULO = (-23.5505, -46.6333)
+
+
+def clima(temperatura, obtido_em=None):
+    return {"temperatura": temperatura, "sensacao": temperatura, "umidade": 60, "vento_kmh": 8.0,
+            "descricao": "Nublado", "cidade": "São Paulo", "pais": "Brasil", "fallback": False,
+            "obtido_em": obtido_em or time.time()}
+
+
+@pytest.fixture
+def historico(tmp_path):
+    return HistoricoObservacoes(str(tmp_path / "historico.sqlite3"), retencao=30 * 24 * 3600)
+
+
+def canto_da_celula(latitude, longitude, precisao=5):
+    """Canto sudoeste da célula geohash do ponto"""
+    altura, largura = dimensoes_geohash(precisao)
+    return (math.floor((latitude + 90) / altura) * altura - 90,
+            math.floor((longitude + 180) / largura) * largura - 180)
+
+
+def test_registra_e_recupera(historico):
+    historico.registrar([(*SAO_PAULO, clima(21.0, time.time() - 600)), (*SAO_PAULO, clima(24.0))])
+    recuperado = historico.mais_recente(*SAO_PAULO)
+    assert recuperado["temperatura"] == 24.0
+    assert recuperado["distancia_km"] == 0.0
+    assert recuperado["historico"] and recuperado["fallback"]
+    assert historico.estatisticas() == {"observacoes": 2}
+
+
+def test_fallbacks_nao_sao_registrados(historico):
+    historico.registrar([(*SAO_PAULO, dict(clima(30.0), fallback=True)), (*SAO_PAULO, None)])
+    assert historico.mais_recente(*SAO_PAULO) is None
+
+
+def test_vizinhas_cobrem_a_celula_e_o_entorno():
+    vizinhas = geohash_vizinhos(*SAO_PAULO, 5)
+    assert vizinhas[0] == geohash(*SAO_PAULO, 5) == "6gyf4"
+    assert len(set(vizinhas)) == 9
+    altura, largura = dimensoes_geohash(5)
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            assert geohash(SAO_PAULO[0] + d_lat * altura, SAO_PAULO[1] + d_lon * largura, 5) in vizinhas
+
+
+def test_vizinha_do_outro_lado_da_borda_vence_a_da_mesma_celula(historico):
+    lat0, lon0 = canto_da_celula(*SAO_PAULO)
+    consulta = (lat0 + 1e-4, lon0 + 1e-4)
+    vizinha = (lat0 - 2e-4, lon0 - 2e-4)     # ~40 m, na célula diagonal
+    mesma_celula = (lat0 + 0.04, lon0 + 0.04)  # ~6 km, na célula da consulta
+    assert geohash(*vizinha, 5) != geohash(*consulta, 5) == geohash(*mesma_celula, 5)
+
+    historico.registrar([(*vizinha, clima(18.0)), (*mesma_celula, clima(25.0))])
+    recuperado = historico.mais_recente(*consulta)
+    assert recuperado["temperatura"] == 18.0
+    assert recuperado["distancia_km"] < 0.1
+
+
+def test_vizinha_sem_prefixo_em_comum(historico):
+    # Na linha do equador e no meridiano de Greenwich os geohashes vizinhos não têm prefixo comum
+    assert geohash(-1e-4, -1e-4, 5)[0] != geohash(1e-4, 1e-4, 5)[0]
+    historico.registrar([(-1e-4, -1e-4, clima(27.0))])
+    assert historico.mais_recente(1e-4, 1e-4)["temperatura"] == 27.0
+
+
+def test_amplia_a_busca_quando_a_vizinhanca_esta_vazia(historico):
+    campinas = (-22.9056, -47.0608)  # ~85 km
+    historico.registrar([(*campinas, clima(23.0))])
+    recuperado = historico.mais_recente(*SAO_PAULO)
+    assert recuperado["temperatura"] == 23.0
+    assert 70 < recuperado["distancia_km"] < 100
+    assert historico.mais_recente(-3.72, -38.54) is None  # Fortaleza: longe demais
+
+
+def test_janela_de_tempo(historico):
+    agora = time.time()
+    historico.registrar([(*SAO_PAULO, clima(20.0, agora - 3 * 3600))])
+    assert historico.mais_recente(*SAO_PAULO, idade_maxima=3600) is None
+    assert historico.mais_recente(*SAO_PAULO, idade_maxima=4 * 3600)["temperatura"] == 20.0
+
+    historico.registrar([(*SAO_PAULO, clima(22.0, agora - 40 * 24 * 3600))])  # fora da retenção
+    assert historico.mais_recente(*SAO_PAULO)["temperatura"] == 20.0
+
+
+def test_observacao_recente_mais_distante_fica_atras_da_proxima_antiga(historico):
+    agora = time.time()
+    perto = (SAO_PAULO[0] + 0.001, SAO_PAULO[1])
+    longe = (SAO_PAULO[0] + 0.02, SAO_PAULO[1])
+    historico.registrar([(*perto, clima(19.0, agora - 1800)), (*longe, clima(26.0, agora))])
+    assert historico.mais_recente(*SAO_PAULO)["temperatura"] == 19.0
@@ -0,0 +1,41 @@
+from streamlit_app import COORDENADAS_CIDADES, IndiceCidades
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def indice():
+    return IndiceCidades(COORDENADAS_CIDADES)
+
+
+def test_busca_exata_e_sem_acentos(indice):
+    assert indice.localizar("São Paulo")[2] == "exata"
+    cidade, coordenadas, tipo = indice.localizar("sao paulo")
+    assert (cidade, tipo) == ("São Paulo", "sem acentos")
+    assert coordenadas == COORDENADAS_CIDADES["São Paulo"]
+
+
+def test_prefixo_de_palavra(indice):
+    assert indice.localizar("paul")[0] == "São Paulo"
+
+
+def test_substring_no_meio_da_palavra(indice):
+    # A busca original aceitava qualquer trecho do nome, não só o início das palavras
+    cidade, _, tipo = indice.localizar("aulo")
+    assert (cidade, tipo) == ("São Paulo", "substring")
+
+
+def test_busca_reversa(indice):
+    assert indice.localizar("Centro de Curitiba")[:3:2] == ("Curitiba", "reversa")
+
+
+def test_nao_encontrada(indice):
+    assert indice.localizar("xyzxyz") is None
+    assert indice.localizar("") is None
+
+
+def test_sugestoes_por_prefixo(indice):
+    sugestoes = indice.sugerir("sao")
+    assert "São Paulo" in sugestoes
+    assert all("sao" in cidade.lower().replace("ã", "a") for cidade in sugestoes)
+    assert indice.sugerir("") == []
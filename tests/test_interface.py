@@ -0,0 +1,34 @@
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import streamlit_app
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # WeatherAPI configurada, mas inalcançável: a busca gera avisos e cai no modo offline
+    monkeypatch.setenv("WEATHER_API_KEY", "chave-teste")
+    monkeypatch.setenv("WEATHERAPI_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("HTTP_TENTATIVAS", "1")
+    return AppTest.from_file(streamlit_app.__file__, default_timeout=30).run()
+
+
+def em_ordem(no):
+    """Elementos da página na ordem em que aparecem"""
+    for filho in getattr(no, "children", {}).values():
+        yield filho
+        yield from em_ordem(filho)
+
+
+def test_teste_rapido_mostra_os_avisos_da_busca(app):
+    botao = next(botao for botao in app.button if "Testar com São Paulo" in botao.label)
+    botao.click().run()
+    assert not app.exception
+    assert app.session_state["clima"]["cidade"] == "São Paulo"
+    assert "cidade_teste" not in app.session_state
+    # As mensagens de get_weather_fallback ficam na seção de entrada, abaixo do cabeçalho,
+    # e não no topo efêmero que o Streamlit reserva à saída dos callbacks
+    elementos = list(em_ordem(app.main))
+    cabecalho = next(i for i, el in enumerate(elementos) if "main-header" in str(getattr(el, "value", "")))
+    avisos = [i for i, el in enumerate(elementos) if type(el).__name__ in ("Error", "Warning")]
+    assert avisos and min(avisos) > cabecalho
@@ -0,0 +1,143 @@
+import re
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+import streamlit_app
+from streamlit_app import RegistroMetricas, iniciar_servidor_metricas, medir
+
+# nome{rotulo="valor",...} número, com valores que podem conter \\, \" e \n escapados
+AMOSTRA = re.compile(r'^([a-z_]+)(?:\{(.*)\})? (\S+)$')
+ROTULO = re.compile(r'([a-z_]+)="((?:[^"\\]|\\.)*)"')
+
+
+def desescapar(valor):
+    return re.sub(r'\\(.)', lambda m: {"n": "\n"}.get(m.group(1), m.group(1)), valor)
+
+
+def ler_exposicao(texto):
+    """Interpreta o formato texto do Prometheus: ({metrica: (help, tipo)}, [(nome, rótulos, valor)])"""
+    metadados, amostras = {}, []
+    for linha in texto.splitlines():
+        if linha.startswith("# HELP "):
+            nome, ajuda = linha[7:].split(" ", 1)
+            metadados.setdefault(nome, [None, None])[0] = ajuda
+        elif linha.startswith("# TYPE "):
+            nome, tipo = linha[7:].split(" ", 1)
+            metadados.setdefault(nome, [None, None])[1] = tipo
+        else:
+            nome, rotulos, valor = AMOSTRA.match(linha).groups()
+            assert ROTULO.sub("", rotulos or "").strip(",") == ""
+            amostras.append((nome, {k: desescapar(v) for k, v in ROTULO.findall(rotulos or "")}, float(valor)))
+    return metadados, amostras
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    registro = RegistroMetricas()
+    monkeypatch.setattr(streamlit_app, "obter_metricas", lambda: registro)
+    return registro
+
+
+def test_histograma_com_help_type_e_baldes_acumulados(registro):
+    for segundos in (0.004, 0.02, 0.02, 0.3, 50.0):
+        registro.observar("cep", segundos, "api", "viacep")
+    metadados, amostras = ler_exposicao(registro.exportar())
+
+    assert metadados["smart_clima_etapa_segundos"][1] == "histogram"
+    assert metadados["smart_clima_etapa_segundos"][0]
+    baldes = [(rotulos["le"], valor) for nome, rotulos, valor in amostras if nome.endswith("_bucket")]
+    assert baldes[0] == ("0.005", 1)
+    assert dict(baldes)["0.025"] == 3
+    assert dict(baldes)["0.5"] == 4
+    assert baldes[-1] == ("+Inf", 5)
+    assert [valor for _, valor in baldes] == sorted(valor for _, valor in baldes)
+
+    totais = {nome: (rotulos, valor) for nome, rotulos, valor in amostras if not nome.endswith("_bucket")}
+    assert totais["smart_clima_etapa_segundos_count"][1] == 5
+    assert totais["smart_clima_etapa_segundos_sum"][1] == pytest.approx(50.344)
+    assert totais["smart_clima_etapa_segundos_count"][0] == {"etapa": "cep", "resultado": "api", "provedor": "viacep"}
+
+
+def test_quantis_interpolados_dentro_do_balde():
+    registro = RegistroMetricas(limites=(0.1, 0.2, 0.4))
+    for _ in range(50):
+        registro.observar("clima", 0.05)
+    for _ in range(50):
+        registro.observar("clima", 0.15, "fallback")
+    resumo, = registro.resumo()
+    # p50 fecha o 1º balde; p95 fica a 90% do 2º (0,1 + 0,1 * 45/50)
+    assert resumo["p50_ms"] == pytest.approx(100.0)
+    assert resumo["p95_ms"] == pytest.approx(190.0)
+    assert resumo["taxa_degradada"] == 0.5
+
+
+def test_valores_acima_do_ultimo_limite_ficam_no_limite():
+    registro = RegistroMetricas(limites=(0.1,))
+    registro.observar("llm", 5.0)
+    assert registro.resumo()[0]["p99_ms"] == pytest.approx(100.0)
+
+
+def test_rotulos_escapados(registro):
+    provedor = 'host "estranho"\\com\nquebra'
+    registro.observar("http", 0.01, "erro", provedor)
+    _, amostras = ler_exposicao(registro.exportar({'cache"x': {"acertos": 1, "faltas": 0, "taxa_acerto": 1.0}}))
+    assert {rotulos.get("provedor") for _, rotulos, _ in amostras} >= {provedor}
+    assert {rotulos.get("cache") for _, rotulos, _ in amostras} >= {'cache"x'}
+
+
+def test_caches_exportados_como_contador_e_gauge(registro):
+    metadados, amostras = ler_exposicao(registro.exportar({"clima": {"acertos": 3, "faltas": 1, "taxa_acerto": 0.75}}))
+    assert metadados["smart_clima_cache_consultas_total"][1] == "counter"
+    assert metadados["smart_clima_cache_taxa_acerto"][1] == "gauge"
+    assert ("smart_clima_cache_consultas_total", {"cache": "clima", "resultado": "falta"}, 1.0) in amostras
+    assert ("smart_clima_cache_taxa_acerto", {"cache": "clima"}, 0.75) in amostras
+
+
+def test_medir_registra_o_resultado_escolhido_e_erros(registro):
+    with medir("cep", "viacep") as etapa:
+        etapa["resultado"] = "cache"
+    with pytest.raises(ValueError):
+        with medir("cep", "viacep"):
+            raise ValueError("falhou")
+    with medir("geocodificacao"):
+        pass
+    _, amostras = ler_exposicao(registro.exportar())
+    series = {(r["etapa"], r["resultado"], r.get("provedor")) for nome, r, _ in amostras if nome.endswith("_count")}
+    assert series == {("cep", "cache", "viacep"), ("cep", "erro", "viacep"), ("geocodificacao", "ok", None)}
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_servidor_de_metricas(registro, monkeypatch):
+    monkeypatch.setenv("METRICAS_PORTA", str(porta_livre()))
+    iniciar_servidor_metricas.clear()
+    servidor = iniciar_servidor_metricas()
+    try:
+        assert iniciar_servidor_metricas() is servidor
+        registro.observar("clima", 0.01, "api", "weatherapi")
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as resposta:
+            assert resposta.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            metadados, _ = ler_exposicao(resposta.read().decode("utf-8"))
+        assert "smart_clima_cache_taxa_acerto" in metadados
+        with pytest.raises(urllib.error.HTTPError) as erro:
+            urllib.request.urlopen(f"{url}/outra", timeout=5)
+        assert erro.value.code == 404
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+        iniciar_servidor_metricas.clear()
+
+
+def test_porta_zero_desativa_o_servidor(monkeypatch):
+    monkeypatch.setenv("METRICAS_PORTA", "0")
+    iniciar_servidor_metricas.clear()
+    assert iniciar_servidor_metricas() is None
+    iniciar_servidor_metricas.clear()
@@ -0,0 +1,88 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from streamlit_app import MOTOR_REGRAS, recomendacoes_fallback
+
+TEMPERATURAS = [-5, 0, 10, 14, 14.9, 15, 15.0, 16, 21.9, 22, 25, 27.99, 28, 30, 35.5, 40, 1e-9, -0.0]
+UMIDADES = [0, 49, 49.5, 50, 55, 60, 60.1, 61, 100]
+
+
+def recomendacoes_originais(temp, umidade, vento, descricao):
+    """Implementação com if/else anterior à tabela de regras, como referência"""
+    recomendacoes = f"""
+## 🧥 ROUPAS RECOMENDADAS
+
+**Para {temp}°C:**
+"""
+
+    if temp < 15:
+        recomendacoes += """
+- Casaco pesado ou jaqueta
+- Calça comprida
+- Sapatos fechados
+- Cachecol e gorro se necessário
+"""
+    elif temp < 22:
+        recomendacoes += """
+- Casaco leve ou blusa de manga longa
+- Calça ou bermuda
+- Sapatos fechados ou tênis
+"""
+    elif temp < 28:
+        recomendacoes += """
+- Camiseta ou blusa leve
+- Shorts ou calça leve
+- Sapatos abertos ou tênis
+"""
+    else:
+        recomendacoes += """
+- Roupas leves e claras
+- Shorts e camiseta
+- Sandálias ou sapatos ventilados
+- Protetor solar
+"""
+
+    recomendacoes += f"""
+
+## 🏠 AR-CONDICIONADO RESIDENCIAL
+- Temperatura recomendada: **{max(18, min(26, temp - 2))}°C**
+- Umidade atual: {umidade}% {"(ideal: 50-60%)" if umidade < 50 or umidade > 60 else "(ideal)"}
+
+## 🚗 AR-CONDICIONADO AUTOMOTIVO
+- Temperatura recomendada: **{max(18, min(24, temp - 3))}°C**
+- Use ar externo se a temperatura externa for agradável
+- Recirculação interno se muito quente ou frio
+
+## 👶 CUIDADOS COM BEBÊS
+- Vista o bebê com uma camada a mais que você usaria
+- AC para bebês: **{max(20, min(24, temp - 1))}°C**
+- Mantenha umidade entre 40-60%
+- Evite correntes de ar diretas
+"""
+
+    return recomendacoes
+
+
+@pytest.mark.parametrize("temp, umidade, vento, descricao", list(itertools.product(
+    TEMPERATURAS, UMIDADES, [0, 10.5], ["Sol", "Parcialmente nublado"]
+)))
+def test_texto_identico_ao_original(temp, umidade, vento, descricao):
+    assert recomendacoes_fallback(temp, umidade, vento, descricao) == recomendacoes_originais(temp, umidade, vento, descricao)
+
+
+def test_cache_distingue_int_de_float():
+    # 15 e 15.0 geram textos diferentes ("15°C" e "15.0°C"): o cache é tipado
+    assert recomendacoes_fallback(15, 55, 0, "Sol") != recomendacoes_fallback(15.0, 55, 0, "Sol")
+
+
+def test_avaliacao_vetorial_coincide_com_as_regras():
+    temperaturas, umidades = map(np.ravel, np.meshgrid(np.array(TEMPERATURAS, dtype=float), UMIDADES))
+    resultado = MOTOR_REGRAS.avaliar(temperaturas, umidades)
+    for i, (temp, umidade) in enumerate(zip(temperaturas, umidades)):
+        assert resultado["ac_residencial"][i] == max(18, min(26, temp - 2))
+        assert resultado["ac_automotivo"][i] == max(18, min(24, temp - 3))
+        assert resultado["ac_bebes"][i] == max(20, min(24, temp - 1))
+        assert resultado["umidade_ideal"][i] == (50 <= umidade <= 60)
+        assert resultado["faixa"][i] == sum(temp >= limite for limite in (15, 22, 28))
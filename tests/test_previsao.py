@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+import streamlit_app
+
+
+class Resposta:
+    def __init__(self, corpo=None, erro=None):
+        self.corpo, self.erro = corpo, erro
+
+    def __bool__(self):
+        return True
+
+    def json(self):
+        if self.erro:
+            raise self.erro
+        return self.corpo
+
+
+@pytest.fixture
+def weatherapi(monkeypatch):
+    """safe_request falso: guarda as URLs pedidas e devolve a resposta configurada"""
+    estado = SimpleNamespace(urls=[], resposta=None)
+    monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: (None, "chave"))
+    monkeypatch.setattr(streamlit_app, "safe_request", lambda url, **_: estado.urls.append(url) or estado.resposta)
+    streamlit_app.obter_cache_previsao.clear()
+    return estado
+
+
+@pytest.mark.parametrize("horas, dias", [(24, 2), (48, 3), (72, 3)])
+def test_dias_pedidos_nao_passam_do_limite_do_plano(weatherapi, horas, dias):
+    weatherapi.resposta = Resposta({"forecast": {"forecastday": []}})
+    streamlit_app.get_previsao_horaria(-23.55, -46.63, horas)
+    assert f"&days={dias}&" in weatherapi.urls[-1]
+
+
+@pytest.mark.parametrize("resposta", [
+    Resposta(erro=ValueError("HTML no lugar de JSON")),
+    Resposta({"error": {"code": 1006, "message": "No matching location found."}}),
+    Resposta(["lista", "inesperada"]),
+])
+def test_resposta_invalida_vira_fallback(weatherapi, resposta):
+    weatherapi.resposta = resposta
+    assert streamlit_app.get_previsao_horaria(-23.55, -46.63, 24) is None
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from streamlit_app import SaudeProvedor
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """time.monotonic controlado pelo teste"""
+    agora = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: agora[0])
+    return agora
+
+
+def test_ewma_de_latencia_e_taxa_de_erro():
+    saude = SaudeProvedor("api", alfa=0.5)
+    saude.registrar(True, 0.1)
+    assert saude.latencia_ewma == pytest.approx(0.1)
+    saude.registrar(False, 0.3)
+    assert saude.latencia_ewma == pytest.approx(0.2)
+    assert saude.taxa_erro_ewma == pytest.approx(0.5)
+    saude.registrar(True, 0.2)
+    assert saude.taxa_erro_ewma == pytest.approx(0.25)
+    assert saude.resumo() == {"provedor": "api", "estado": "fechado", "latencia_ms": 200, "taxa_erro": 0.25, "amostras": 3}
+
+
+def test_abre_apos_falhas_consecutivas(relogio):
+    saude = SaudeProvedor("api", limite_falhas=3, tempo_aberto=30.0)
+    for _ in range(2):
+        saude.registrar(False, 0.1)
+    assert saude.estado == "fechado" and saude.permitir()
+    saude.registrar(False, 0.1)
+    assert saude.estado == "aberto"
+    assert not saude.permitir()
+
+
+def test_abre_por_taxa_de_erro_sem_falhas_consecutivas(relogio):
+    saude = SaudeProvedor("api", alfa=0.5, limite_falhas=4, limite_taxa_erro=0.5)
+    for sucesso in (False, True, False, True, False):
+        saude.registrar(sucesso, 0.1)
+    assert saude.falhas_consecutivas == 1
+    assert saude.estado == "aberto"
+
+
+def test_meio_aberto_permite_um_unico_teste_e_fecha_no_sucesso(relogio):
+    saude = SaudeProvedor("api", limite_falhas=1, tempo_aberto=30.0)
+    saude.registrar(False, 0.1)
+    relogio[0] += 29
+    assert not saude.permitir()
+    relogio[0] += 1
+    assert saude.permitir()
+    assert saude.estado == "meio-aberto"
+    # Enquanto o teste está em andamento, as demais requisições são puladas
+    assert not saude.permitir()
+    saude.registrar(True, 0.1)
+    assert saude.estado == "fechado"
+    assert saude.taxa_erro_ewma == 0.0
+    assert saude.permitir()
+
+
+def test_meio_aberto_reabre_na_falha(relogio):
+    saude = SaudeProvedor("api", limite_falhas=1, tempo_aberto=30.0)
+    saude.registrar(False, 0.1)
+    relogio[0] += 30
+    assert saude.permitir()
+    saude.registrar(False, 0.1)
+    assert saude.estado == "aberto"
+    assert not saude.permitir()
+    relogio[0] += 30
+    assert saude.permitir()
+
+
+def test_timeout_pelo_p95(monkeypatch):
+    saude = SaudeProvedor("api")
+    assert saude.timeout((3.0, 10.0)) == (3.0, 10.0)
+    for _ in range(20):
+        saude.registrar(True, 0.5)
+    assert saude.percentil(95) == 0.5
+    # max(TIMEOUT_MINIMO=1.0, 0.5 * TIMEOUT_FATOR_P95=3.0), limitado pelo padrão
+    assert saude.timeout((3.0, 10.0)) == (3.0, 1.5)
+    assert saude.timeout((3.0, 1.0)) == (3.0, 1.0)
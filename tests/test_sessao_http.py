@@ -0,0 +1,71 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import streamlit_app
+from streamlit_app import obter_sessao_http, safe_request
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.clientes.add(self.client_address)
+        corpo = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("Set-Cookie", "sessao=abc; Path=/")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+    servidor.clientes = set()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    servidor.url = f"http://127.0.0.1:{servidor.server_port}"
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture(autouse=True)
+def sessao_nova(monkeypatch):
+    monkeypatch.setenv("HTTP_TENTATIVAS", "3")
+    monkeypatch.setenv("HTTP_POOL_TAMANHO", "7")
+    obter_sessao_http.clear()
+    streamlit_app.obter_saude_provedores.clear()
+    yield
+    obter_sessao_http.clear()
+    streamlit_app.obter_saude_provedores.clear()
+
+
+def test_sessao_compartilhada_por_modo_de_ssl():
+    assert obter_sessao_http() is obter_sessao_http()
+    assert obter_sessao_http(verificar_ssl=False) is not obter_sessao_http()
+    assert obter_sessao_http(verificar_ssl=False).verify is False
+
+
+def test_adaptador_configurado_pelas_variaveis():
+    adaptador = obter_sessao_http().get_adapter("https://viacep.com.br")
+    assert adaptador.max_retries.total == 2
+    assert adaptador.max_retries.backoff_factor == 0.0
+    assert adaptador._pool_maxsize == 7
+
+
+def test_requisicoes_reaproveitam_a_conexao(servidor):
+    for _ in range(5):
+        assert safe_request(f"{servidor.url}/dados", silencioso=True).json() == {"ok": True}
+    # Keep-alive: as cinco requisições saem pela mesma porta local
+    assert len(servidor.clientes) == 1
+
+
+def test_sessao_nao_guarda_cookies(servidor):
+    safe_request(f"{servidor.url}/dados", silencioso=True)
+    assert len(obter_sessao_http().cookies) == 0
@@ -0,0 +1,116 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import streamlit_app
+from streamlit_app import CacheRecomendacoes, RegistroMetricas, coletar_mensagens, gerar_recomendacoes
+
+CLIMA = {
+    "temperatura": 18.4, "sensacao": 17.9, "umidade": 80, "vento_kmh": 22.0,
+    "descricao": "Chuva fraca", "cidade": "Teste", "pais": "Brasil"
+}
+
+
+def evento(texto):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=texto))])
+
+
+class ClienteStreaming:
+    """Cliente OpenAI falso que devolve os pedaços com um intervalo entre eles"""
+
+    def __init__(self, pedacos, intervalo=0.02, falha_apos=None):
+        self.pedacos = pedacos
+        self.intervalo = intervalo
+        self.falha_apos = falha_apos
+        self.parametros = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    def _criar(self, **parametros):
+        self.parametros = parametros
+        return self._eventos()
+
+    def _eventos(self):
+        yield SimpleNamespace(choices=[])
+        for i, pedaco in enumerate(self.pedacos):
+            if i == self.falha_apos:
+                raise ConnectionError("conexão perdida")
+            time.sleep(self.intervalo)
+            yield evento(pedaco)
+
+
+@pytest.fixture(autouse=True)
+def ambiente(tmp_path, monkeypatch):
+    cache = CacheRecomendacoes(str(tmp_path / "rec.sqlite3"), ttl=600, max_entradas=100,
+                               balde_temperatura=1.0, balde_umidade=5.0, balde_vento=10.0)
+    metricas = RegistroMetricas()
+    monkeypatch.setattr(streamlit_app, "obter_cache_recomendacoes", lambda: cache)
+    monkeypatch.setattr(streamlit_app, "obter_metricas", lambda: metricas)
+    monkeypatch.setattr(streamlit_app, "get_api_keys", lambda: ("sk-teste", None))
+    return cache, metricas
+
+
+def usar_cliente(monkeypatch, cliente):
+    monkeypatch.setattr(streamlit_app, "obter_cliente_openai", lambda chave: cliente)
+    return cliente
+
+
+def test_pedacos_repassados_assim_que_chegam(monkeypatch, ambiente):
+    cliente = usar_cliente(monkeypatch, ClienteStreaming(["Leve ", "guarda-", "chuva"]))
+    metricas = {}
+    partes = list(gerar_recomendacoes(CLIMA, metricas=metricas))
+    assert partes == ["Leve ", "guarda-", "chuva"]
+    assert cliente.parametros["stream"] is True
+    assert metricas["origem"] == "openai"
+    assert 0 < metricas["primeiro_token_s"] < metricas["total_s"]
+    # O texto completo vai para o cache
+    cache, _ = ambiente
+    assert cache.obter(cache.chave(CLIMA)) == (True, "Leve guarda-chuva")
+
+
+def test_primeiro_token_vira_metrica(monkeypatch, ambiente):
+    usar_cliente(monkeypatch, ClienteStreaming(["Leve ", "casaco"]))
+    list(gerar_recomendacoes(CLIMA))
+    _, metricas = ambiente
+    assert ("llm_primeiro_token", "openai", "openai") in metricas._copiar()
+    assert ("llm", "openai", "openai") in metricas._copiar()
+
+
+def test_acerto_no_cache_registra_origem(monkeypatch, ambiente):
+    cache, _ = ambiente
+    cache.guardar(cache.chave(CLIMA), "Recomendação guardada")
+    usar_cliente(monkeypatch, None)
+    metricas = {}
+    assert list(gerar_recomendacoes(CLIMA, metricas=metricas)) == ["Recomendação guardada"]
+    assert metricas["origem"] == "cache"
+
+
+def test_falha_no_meio_mantem_o_texto_parcial(monkeypatch, ambiente):
+    usar_cliente(monkeypatch, ClienteStreaming(["Leve ", "casaco"], falha_apos=1))
+    metricas = {}
+    with coletar_mensagens() as mensagens:
+        partes = list(gerar_recomendacoes(CLIMA, metricas=metricas))
+    assert partes == ["Leve "]
+    assert metricas["origem"] == "openai"
+    assert any("interrompida" in m["mensagem"] for m in mensagens)
+    # Texto incompleto não vai para o cache
+    cache, _ = ambiente
+    assert cache.obter(cache.chave(CLIMA)) == (False, None)
+
+
+def test_falha_antes_do_primeiro_token_usa_as_regras(monkeypatch, ambiente):
+    usar_cliente(monkeypatch, ClienteStreaming(["Leve "], falha_apos=0))
+    metricas = {}
+    with coletar_mensagens():
+        texto = "".join(gerar_recomendacoes(CLIMA, metricas=metricas))
+    assert metricas["origem"] == "regras"
+    assert texto == streamlit_app.recomendacoes_fallback(18.4, 80, 22.0, "Chuva fraca")
+
+
+def test_geracao_abandonada_fica_como_interrompida(monkeypatch, ambiente):
+    usar_cliente(monkeypatch, ClienteStreaming(["Leve ", "casaco"]))
+    gerador = gerar_recomendacoes(CLIMA)
+    next(gerador)
+    gerador.close()
+    _, metricas = ambiente
+    assert any(chave[:2] == ("llm", "interrompida") for chave in metricas._copiar())